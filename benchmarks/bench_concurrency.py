@@ -0,0 +1,201 @@
+"""Concurrency benchmark: read throughput of the stats queries while readings are ingested.
+
+Each storage profile runs in a subprocess, as the engines are configured at import:
+"baseline" uses SQLite's rollback journal and default cache, "tuned" the defaults of
+Settings (WAL journal, tuned PRAGMAs, a single writer connection and pooled readers).
+
+    python -m benchmarks.bench_concurrency --rows 200000 --seconds 10 --readers 8 [--json results.json]
+"""
+# pylint: disable=missing-function-docstring,wrong-import-position,import-outside-toplevel
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROFILES = dict(
+    baseline=dict(
+        DB_JOURNAL_MODE="DELETE",
+        DB_SYNCHRONOUS="FULL",
+        DB_CACHE_SIZE_KB="2000",
+        DB_MMAP_SIZE="0",
+    ),
+    tuned=dict(),
+)
+
+
+async def populate(rows: int, chunk_size: int = 100_000):
+    """Create the tables with `rows` readings, the last one now, and their rollups."""
+    from sqlalchemy import insert
+
+    from moon_leasing.db.config import Base, async_session, engine
+    from moon_leasing.db.crud import SatelliteDB
+    from moon_leasing.db.models.satellite import SatelliteStatusTable
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    start = datetime.utcnow() - timedelta(seconds=15 * rows)
+    for offset in range(0, rows, chunk_size):
+        chunk = [
+            dict(
+                last_updated=start + timedelta(seconds=15 * idx),
+                altitude=200 + 50 * ((idx * 7919) % 101) / 100,
+                retrieved=start,
+            )
+            for idx in range(offset, min(offset + chunk_size, rows))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(insert(SatelliteStatusTable), chunk)
+    async with async_session() as session:
+        async with session.begin():
+            await SatelliteDB(db_session=session).backfill_rollups()
+
+
+async def ingest(stop: asyncio.Event, batch: int) -> dict:
+    """Write batches of new readings, as the write-behind queue does, until `stop`."""
+    from moon_leasing.cache import Reading
+    from moon_leasing.db.config import async_session
+    from moon_leasing.db.crud import SatelliteDB
+
+    written, errors, last_updated = 0, 0, datetime.utcnow()
+    while not stop.is_set():
+        readings = []
+        for _ in range(batch):
+            last_updated += timedelta(milliseconds=1)
+            readings.append(Reading(last_updated, 200.0))
+        try:
+            async with async_session() as session:
+                async with session.begin():
+                    await SatelliteDB(db_session=session).insert_many(readings)
+            written += batch
+        except Exception:  # pylint: disable=broad-except
+            errors += 1
+        await asyncio.sleep(0)
+    return dict(written=written, write_errors=errors)
+
+
+async def read(stop: asyncio.Event) -> dict:
+    """Run the /stats and /health queries until `stop`."""
+    from moon_leasing.db.config import read_session
+    from moon_leasing.db.crud import SatelliteDB
+
+    timings, errors = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            async with read_session() as session:
+                db = SatelliteDB(db_session=session)
+                await db.get_stats(since=datetime.utcnow() - timedelta(minutes=60))
+                await db.any_below(160, since=datetime.utcnow() - timedelta(minutes=2))
+            timings.append((time.perf_counter() - started) * 1000)
+        except Exception:  # pylint: disable=broad-except
+            errors += 1
+    return dict(timings=timings, read_errors=errors)
+
+
+async def run_profile(rows: int, seconds: float, readers: int, batch: int) -> dict:
+    from moon_leasing.db.config import dispose_engines, engine, read_engine
+
+    engine.sync_engine.echo = read_engine.sync_engine.echo = False
+    await populate(rows)
+
+    stop = asyncio.Event()
+    tasks = [asyncio.ensure_future(ingest(stop, batch))] + [
+        asyncio.ensure_future(read(stop)) for _ in range(readers)
+    ]
+    await asyncio.sleep(seconds)
+    stop.set()
+    write_result, *read_results = await asyncio.gather(*tasks)
+    await dispose_engines()
+
+    timings = sorted(t for result in read_results for t in result["timings"])
+    return dict(
+        reads_per_second=len(timings) / seconds,
+        read_p50_ms=statistics.median(timings) if timings else None,
+        read_p95_ms=timings[int(len(timings) * 0.95)] if timings else None,
+        read_errors=sum(result["read_errors"] for result in read_results),
+        writes_per_second=write_result["written"] / seconds,
+        write_errors=write_result["write_errors"],
+    )
+
+
+def spawn_profile(name: str, args) -> dict:
+    """Run one profile in a subprocess with its own temporary DB."""
+    tmp_dir = tempfile.mkdtemp(prefix="bench_concurrency_")
+    env = dict(
+        os.environ,
+        TEST="true",
+        TEST_DATABASE_URL=f"sqlite+aiosqlite:///{tmp_dir}/bench.db",
+        TEST_SATELLITE_REALTIME_URL="http://127.0.0.1:9042/api/satellite/data",
+        **PROFILES[name],
+    )
+    try:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_concurrency", "--profile", name]
+            + [
+                f"--{key}={getattr(args, key)}"
+                for key in ("rows", "seconds", "readers", "batch")
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    results = []
+    print(
+        f"{'profile':<10}{'reads/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'read err':>10}{'writes/s':>10}{'write err':>10}"
+    )
+    for name in PROFILES:
+        result = dict(profile=name, **spawn_profile(name, args))
+        results.append(result)
+        print(
+            f"{name:<10}{result['reads_per_second']:>10.1f}"
+            f"{result['read_p50_ms'] or 0:>10.2f}{result['read_p95_ms'] or 0:>10.2f}"
+            f"{result['read_errors']:>10}{result['writes_per_second']:>10.1f}"
+            f"{result['write_errors']:>10}"
+        )
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(dict(vars(args), results=results), indent=2)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument(
+        "--batch", type=int, default=100, help="Readings per write transaction"
+    )
+    parser.add_argument(
+        "--json", default="", help="Also write the results to this file"
+    )
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.profile:
+        print(
+            json.dumps(
+                asyncio.run(
+                    run_profile(
+                        parsed.rows, parsed.seconds, parsed.readers, parsed.batch
+                    )
+                )
+            )
+        )
+    else:
+        main(parsed)
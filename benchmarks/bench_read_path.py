@@ -0,0 +1,150 @@
+"""Micro-benchmark of the DB read paths: ORM entities vs column projections and SQL aggregates.
+
+Fills a temporary SQLite DB with `--rows` readings (one every 15 seconds, up to now) and
+times each read path for several window lengths.
+
+    python -m benchmarks.bench_read_path --rows 1000000 --repeat 3 [--json results.json]
+"""
+# pylint: disable=missing-function-docstring,wrong-import-position
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_tmp_dir = tempfile.mkdtemp(prefix="bench_read_path_")
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST="true",
+        TEST_DATABASE_URL=f"sqlite+aiosqlite:///{_tmp_dir}/bench.db",
+        TEST_SATELLITE_REALTIME_URL="http://127.0.0.1:9042/api/satellite/data",
+    )
+)
+
+from sqlalchemy import insert
+
+from moon_leasing.db.config import Base, async_session, engine
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.models.satellite import SatelliteStatusTable
+
+CRITICAL_ALTITUDE = 160
+
+
+async def populate(rows: int, chunk_size: int = 100_000):
+    """Create the table with `rows` readings, the last one now."""
+    engine.sync_engine.echo = False
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    start = datetime.utcnow() - timedelta(seconds=15 * rows)
+    for offset in range(0, rows, chunk_size):
+        chunk = [
+            dict(
+                last_updated=start + timedelta(seconds=15 * idx),
+                altitude=200 + 50 * ((idx * 7919) % 101) / 100,
+                retrieved=start,
+            )
+            for idx in range(offset, min(offset + chunk_size, rows))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(insert(SatelliteStatusTable), chunk)
+
+
+def python_stats(altitudes):
+    """What /stats used to compute per request."""
+    return (
+        min(altitudes),
+        max(altitudes),
+        sum(altitudes) / len(altitudes),
+        len(altitudes),
+    )
+
+
+async def orm_stats(db: SatelliteDB, minutes):
+    records = await db.get_latest(minutes=minutes)
+    return python_stats([float(item.altitude) for item in records])
+
+
+async def projection_stats(db: SatelliteDB, minutes):
+    readings = await db.get_latest_readings(minutes=minutes)
+    return python_stats([item.altitude for item in readings])
+
+
+async def sql_stats(db: SatelliteDB, minutes):
+    since = datetime.utcnow() - timedelta(minutes=minutes) if minutes else datetime.min
+    return await db.get_raw_stats(since=since)
+
+
+async def orm_below(db: SatelliteDB, minutes):
+    return await db.get_last_below(threshold=CRITICAL_ALTITUDE, minutes=minutes)
+
+
+async def sql_below(db: SatelliteDB, minutes):
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    return await db.any_below(threshold=CRITICAL_ALTITUDE, since=since)
+
+
+async def time_it(func, minutes, repeat: int) -> dict:
+    """Run `func` `repeat` times, each in a new session, and return timings in ms."""
+    timings = []
+    for _ in range(repeat):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session)
+            started = time.perf_counter()
+            await func(db, minutes)
+            timings.append((time.perf_counter() - started) * 1000)
+    return dict(best_ms=min(timings), median_ms=statistics.median(timings))
+
+
+async def main(rows: int, repeat: int, json_path: str = ""):
+    started = time.perf_counter()
+    await populate(rows)
+    print(f"Inserted {rows} rows in {time.perf_counter() - started:.1f}s")
+
+    cases = [
+        ("stats", minutes, name, func)
+        for minutes in (5, 60, 24 * 60, None)
+        for name, func in (
+            ("orm", orm_stats),
+            ("projection", projection_stats),
+            ("sql", sql_stats),
+        )
+    ] + [
+        ("below", minutes, name, func)
+        for minutes in (2, 24 * 60, 365 * 24 * 60)
+        for name, func in (("orm", orm_below), ("sql", sql_below))
+    ]
+
+    results = []
+    print(f"{'query':<8}{'minutes':>10}  {'path':<12}{'best ms':>12}{'median ms':>12}")
+    for query, minutes, name, func in cases:
+        timing = await time_it(func, minutes, repeat)
+        results.append(dict(query=query, minutes=minutes, path=name, **timing))
+        print(
+            f"{query:<8}{str(minutes or 'all'):>10}  {name:<12}"
+            f"{timing['best_ms']:>12.2f}{timing['median_ms']:>12.2f}"
+        )
+
+    if json_path:
+        Path(json_path).write_text(
+            json.dumps(dict(rows=rows, results=results), indent=2)
+        )
+    await engine.dispose()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--json", default="", help="Also write the results to this file"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(rows=args.rows, repeat=args.repeat, json_path=args.json))
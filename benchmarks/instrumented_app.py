@@ -0,0 +1,49 @@
+"""`moon_leasing.api.main:app` instrumented for the load tests.
+
+Counts the served requests, the HTTP requests made upstream (retries included) and the
+DB queries, and serves the running totals at /_bench/counters.
+
+    uvicorn benchmarks.instrumented_app:app
+"""
+from typing import Dict
+
+from fastapi import Request
+from sqlalchemy import event
+
+from moon_leasing.api.main import app
+from moon_leasing.db.config import engine, read_engine
+from moon_leasing.space import SatelliteData
+
+counters = dict(requests=0, upstream_calls=0, db_queries=0)
+
+
+def count_query(*_args):
+    counters["db_queries"] += 1
+
+
+for each in (engine, read_engine):
+    each.sync_engine.echo = False
+    event.listen(each.sync_engine, "before_cursor_execute", count_query)
+
+_upstream_get = SatelliteData.upstream._get  # pylint: disable=protected-access
+
+
+async def counted_upstream_get(url: str):
+    counters["upstream_calls"] += 1
+    return await _upstream_get(url)
+
+
+SatelliteData.upstream._get = counted_upstream_get  # pylint: disable=protected-access
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    if not request.url.path.startswith("/_bench"):
+        counters["requests"] += 1
+    return await call_next(request)
+
+
+@app.get("/_bench/counters")
+async def get_counters() -> Dict[str, int]:
+    """Running totals of requests served, upstream calls and DB queries."""
+    return counters
@@ -0,0 +1,220 @@
+"""Load test of /stats and /health against the fake satellite site, all running locally.
+
+Starts `fake_satellite_site.main:app` and `benchmarks.instrumented_app:app` (the API
+with request, upstream call and DB query counters) with uvicorn on free ports and a
+temporary DB, then drives each endpoint for `--duration` seconds at each `--concurrency`.
+Reports p50/p95/p99 latency, requests/s, upstream calls and DB queries per request.
+
+    python -m benchmarks.load_test --endpoints /stats,/health --concurrency 1,10,50 \\
+        --duration 10 [--json results.json]
+"""
+# pylint: disable=missing-function-docstring
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+@contextmanager
+def serve(app: str, port: int, log_path: Path, env: Dict[str, str]) -> Iterator[str]:
+    """Run `app` with uvicorn on `port` for the duration of the context."""
+    with log_path.open("w") as log_file:
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "uvicorn", app, "--port", str(port)]
+            + ["--no-access-log", "--log-level", "warning"],
+            cwd=ROOT_DIR,
+            env=env,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(f"{base_url}/")
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of the sorted `ordered`."""
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def drive(url: str, concurrency: int, duration: float) -> dict:
+    """GET `url` from `concurrency` workers for `duration` seconds."""
+    timings: List[float] = []
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient, deadline: float):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(worker(client, deadline) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    timings.sort()
+    return dict(
+        requests=len(timings),
+        errors=errors,
+        requests_per_second=len(timings) / elapsed,
+        p50_ms=percentile(timings, 0.50),
+        p95_ms=percentile(timings, 0.95),
+        p99_ms=percentile(timings, 0.99),
+        max_ms=timings[-1] if timings else float("nan"),
+    )
+
+
+async def run_case(
+    base_url: str, endpoint: str, concurrency: int, duration: float, warmup: float
+) -> dict:
+    if warmup:
+        await drive(base_url + endpoint, concurrency, warmup)
+    async with httpx.AsyncClient() as client:
+        before = (await client.get(f"{base_url}/_bench/counters")).json()
+        result = await drive(base_url + endpoint, concurrency, duration)
+        after = (await client.get(f"{base_url}/_bench/counters")).json()
+    served = max(after["requests"] - before["requests"], 1)
+    return dict(
+        endpoint=endpoint,
+        concurrency=concurrency,
+        **result,
+        upstream_calls_per_request=(after["upstream_calls"] - before["upstream_calls"])
+        / served,
+        db_queries_per_request=(after["db_queries"] - before["db_queries"]) / served,
+    )
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(args):
+    tmp_dir = Path(tempfile.mkdtemp(prefix="load_test_"))
+    fake_port, api_port = free_port(), free_port()
+    env = dict(
+        os.environ,
+        TEST="true",
+        TEST_DATABASE_URL=f"sqlite+aiosqlite:///{tmp_dir}/load_test.db",
+        TEST_SATELLITE_REALTIME_URL=f"http://127.0.0.1:{fake_port}/api/satellite/data",
+    )
+    results = []
+    try:
+        with serve(
+            "fake_satellite_site.main:app", fake_port, tmp_dir / "fake.log", env
+        ), serve(
+            "benchmarks.instrumented_app:app", api_port, tmp_dir / "api.log", env
+        ) as base_url:
+            print(
+                f"{'endpoint':<20}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+                f"{'p99 ms':>10}{'errors':>8}{'upstream/req':>14}{'db/req':>8}"
+            )
+            for endpoint in args.endpoints.split(","):
+                for concurrency in map(int, args.concurrency.split(",")):
+                    result = asyncio.run(
+                        run_case(
+                            base_url, endpoint, concurrency, args.duration, args.warmup
+                        )
+                    )
+                    results.append(result)
+                    print(
+                        f"{endpoint:<20}{concurrency:>6}"
+                        f"{result['requests_per_second']:>10.1f}"
+                        f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                        f"{result['p99_ms']:>10.2f}{result['errors']:>8}"
+                        f"{result['upstream_calls_per_request']:>14.3f}"
+                        f"{result['db_queries_per_request']:>8.2f}"
+                    )
+    finally:
+        if args.keep_logs:
+            print(f"Logs and DB kept in {tmp_dir}")
+        else:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(
+                dict(
+                    started=datetime.utcnow().isoformat() + "Z",
+                    revision=git_revision(),
+                    config=vars(args),
+                    results=results,
+                ),
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--endpoints", default="/stats,/health", help="Comma separated paths"
+    )
+    parser.add_argument(
+        "--concurrency", default="1,10,50", help="Comma separated worker counts"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument(
+        "--warmup", type=float, default=2, help="Seconds of unmeasured load first"
+    )
+    parser.add_argument(
+        "--json", default="", help="Also write the results to this file"
+    )
+    parser.add_argument(
+        "--keep-logs", action="store_true", help="Keep the server logs and the DB"
+    )
+    main(parser.parse_args())
@@ -1,11 +1,56 @@
-import random
+"""Fake satellite site, serving the feeds of simulated satellites (see simulator.py).
+
+Configured by environment variables:
+- FAKE_SATELLITES: comma separated ids of the satellites ("default"),
+- FAKE_SEED: seed of their trajectories (0),
+- FAKE_RATE: readings published per second by each satellite, or 0 for a new reading on
+  each request (0),
+- FAKE_HISTORY: latest readings kept for the batch endpoints (10000),
+- FAKE_LOG: file the readings are appended to (none).
+"""
+import os
 from datetime import datetime
-from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+
+from fake_satellite_site.simulator import (
+    SimulatedReading,
+    SimulatedSatellite,
+    Simulator,
+)
 
 app = FastAPI()
 
+simulator = Simulator(
+    [
+        item.strip()
+        for item in os.environ.get("FAKE_SATELLITES", "default").split(",")
+        if item.strip()
+    ],
+    seed=int(os.environ.get("FAKE_SEED", 0)),
+    rate=float(os.environ.get("FAKE_RATE", 0)),
+    history=int(os.environ.get("FAKE_HISTORY", 10000)),
+    log_path=os.environ.get("FAKE_LOG") or None,
+)
+default_satellite = next(iter(simulator.satellites.values()))
+
+
+@app.on_event("startup")
+async def startup():
+    simulator.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await simulator.stop()
+
+
+def get_satellite(satellite_id: str) -> SimulatedSatellite:
+    try:
+        return simulator.get(satellite_id)
+    except KeyError as ex:
+        raise HTTPException(404, f"Unknown satellite: {satellite_id}") from ex
+
 
 @app.get("/")
 async def root():
@@ -19,64 +64,45 @@ async def move_satellite(direction):
         direction = 15
     elif str(direction).lower() == "down":
         direction = -15
-    return make_new_data(direction=direction, sigma=0)
+    return default_satellite.nudge(float(direction)).as_dict()
 
 
 @app.get("/api/satellite/up")
 async def nudge_satellite_upwards():
-    return make_new_data(direction=10)
+    return default_satellite.nudge(10).as_dict()
 
 
 @app.get("/api/satellite/down")
 async def nudge_satellite_downwards():
-    return make_new_data(direction=-10)
+    return default_satellite.nudge(-10).as_dict()
 
 
 @app.get("/api/satellite/data/{date_str}/{altitude}")
-async def move_satellite_to_altitude(date_str: str, altitude: int):
-    return make_new_data(now_str=date_str, altitude=altitude)
+async def move_satellite_to_altitude(date_str: str, altitude: float):
+    if date_str.lower() in ["now", "0"]:
+        reading = SimulatedReading.at(datetime.utcnow(), altitude)
+    else:
+        reading = SimulatedReading(date_str, altitude)
+    return default_satellite.put(reading).as_dict()
 
 
 @app.get("/api/satellite/data")
 async def fake_satellite_data():
-    return make_new_data()
-
-
-def make_new_data(now_str="", altitude=None, direction: float = 0, sigma=20):
-    """Generate new date_string and altitude."""
-    filename = Path(__file__).resolve().parent / "tmp_last_date.txt"
-    log_filename = Path(__file__).resolve().parent / "tmp_last_date_log.txt"
-    action = "given"
-    if altitude is None:
-        altitude = 213.001
-        action = "default"
-
-        if filename.exists():
-            action = "calc"
-            with filename.open() as fp:
-                now_str, altitude, *_rest = fp.read().split()
-                if direction or random.randint(0, 100) < 95:
-                    action = f"direction:{direction}"
-                    altitude = float(altitude) + float(direction)
-                    if sigma:
-                        altitude = random.gauss(mu=altitude, sigma=sigma)
-
-    if not now_str or now_str.lower() in ["now", "0"]:
-        now = datetime.utcnow()
-        now_str = now.isoformat(sep="T") + "Z"
-
-    with filename.open("w") as fp:
-        fp.write(f"{now_str} {altitude} {action}")
-    with log_filename.open("a") as fp:
-        fp.write(f"{now_str} {float(altitude):012.8f} {action}\n")
-    # sample_datetime = "2017-04-07T02:53:10.000Z"
-
-    return {
-        "last_updated": now_str,
-        "altitude": f"{altitude}",
-        "": action,
-    }
-    # return {
-    #     "last_updated": "2017-04-07T02:53:10.000Z",
-    #     "altitude": "213.001"
-    # }
+    return default_satellite.latest().as_dict()
+
+
+@app.get("/api/satellite/batch")
+async def fake_satellite_batch(count: int = Query(100, ge=1, le=10000)):
+    """The latest `count` readings, oldest first."""
+    return [reading.as_dict() for reading in default_satellite.batch(count)]
+
+
+@app.get("/api/satellites/{satellite_id}/data")
+async def satellite_data(satellite_id: str):
+    return get_satellite(satellite_id).latest().as_dict()
+
+
+@app.get("/api/satellites/{satellite_id}/batch")
+async def satellite_batch(satellite_id: str, count: int = Query(100, ge=1, le=10000)):
+    """The latest `count` readings, oldest first."""
+    return [reading.as_dict() for reading in get_satellite(satellite_id).batch(count)]
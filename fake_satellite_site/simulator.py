@@ -0,0 +1,256 @@
+"""In-memory simulator of satellites' altitude feeds, with seeded, deterministic trajectories.
+
+The altitude of each satellite relaxes towards its base altitude (which drifts), with
+Gaussian noise, except during decay events, when it relaxes towards a decay altitude
+below the 160 critical one. The same seed always gives the same altitudes.
+
+A satellite publishes `rate` readings per second, or with a rate of 0 a new reading each
+time it is asked for one. The readings can be logged to a file, by a background task.
+"""
+import asyncio
+import math
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Union
+
+
+class SimulatedReading(NamedTuple):
+    """A reading, as published by the satellite's feed."""
+
+    last_updated: str  # ISO 8601, UTC, as published upstream
+    altitude: float
+
+    @classmethod
+    def at(cls, when: datetime, altitude: float) -> "SimulatedReading":
+        return cls(when.isoformat(sep="T") + "Z", altitude)
+
+    def as_dict(self) -> dict:
+        return dict(last_updated=self.last_updated, altitude=f"{self.altitude}")
+
+
+class Trajectory:  # pylint: disable=too-many-instance-attributes
+    """Altitudes of a satellite, seeded with `seed`.
+
+    Per second, the altitude moves by `reversion` times its distance to the target
+    altitude, plus noise with a standard deviation of `noise`. The target is the `altitude`
+    (drifting by `drift` per second), or `decay_altitude` during the `decay_seconds` long
+    decay events, which start `decays_per_hour` times per hour on average.
+    """
+
+    def __init__(
+        self,
+        seed: Union[int, str] = 0,
+        altitude: float = 213.0,
+        drift: float = 0.0,
+        noise: float = 5.0,
+        reversion: float = 0.05,
+        decays_per_hour: float = 4.0,
+        decay_seconds: float = 90.0,
+        decay_altitude: float = 140.0,
+    ):  # pylint: disable=too-many-arguments
+        self.random = random.Random(seed)
+        self.base = altitude
+        self.altitude = altitude
+        self.drift = drift
+        self.noise = noise
+        self.reversion = reversion
+        self.decays_per_hour = decays_per_hour
+        self.decay_seconds = decay_seconds
+        self.decay_altitude = decay_altitude
+        self.decay_left = 0.0
+
+    def step(self, seconds: float) -> float:
+        """The altitude `seconds` later."""
+        if self.decay_left > 0:
+            self.decay_left -= seconds
+        elif self.random.random() < self.decays_per_hour * seconds / 3600:
+            self.decay_left = self.decay_seconds
+        self.base += self.drift * seconds
+        target = self.decay_altitude if self.decay_left > 0 else self.base
+        self.altitude += min(self.reversion * seconds, 1.0) * (target - self.altitude)
+        self.altitude += self.noise * math.sqrt(seconds) * self.random.gauss(0, 1)
+        return self.altitude
+
+
+class SimulatedSatellite:
+    """The feed of one satellite: its latest `history` readings, published `rate` per
+    second since `start` (or one per request with a rate of 0)."""
+
+    def __init__(
+        self,
+        satellite_id: str,
+        trajectory: Trajectory,
+        rate: float = 0,
+        history: int = 10000,
+        start: Optional[datetime] = None,
+    ):  # pylint: disable=too-many-arguments
+        self.satellite_id = satellite_id
+        self.trajectory = trajectory
+        self.rate = rate
+        self.start = start or datetime.utcnow()
+        self.readings: Deque[SimulatedReading] = deque(maxlen=history)
+        self.published = 0
+        self.scheduled = 0  # Readings published at the rate so far
+        self.on_publish = None  # Called with the satellite id and each reading
+
+    def _publish(self, reading: SimulatedReading):
+        self.readings.append(reading)
+        self.published += 1
+        if self.on_publish is not None:
+            self.on_publish(self.satellite_id, reading)
+
+    def advance(self, now: Optional[datetime] = None):
+        """Publish the readings due by `now`."""
+        if not self.rate:
+            return
+        now = now or datetime.utcnow()
+        due = int((now - self.start).total_seconds() * self.rate) + 1
+        step = 1 / self.rate
+        for index in range(self.scheduled, due):
+            self._publish(
+                SimulatedReading.at(
+                    self.start + timedelta(seconds=index * step),
+                    self.trajectory.step(step),
+                )
+            )
+        self.scheduled = max(self.scheduled, due)
+
+    def latest(self, now: Optional[datetime] = None) -> SimulatedReading:
+        """The latest reading (a new one, with a rate of 0)."""
+        if self.rate:
+            self.advance(now)
+        else:
+            self._publish(
+                SimulatedReading.at(now or datetime.utcnow(), self.trajectory.step(1))
+            )
+        return self.readings[-1]
+
+    def batch(
+        self, count: int, now: Optional[datetime] = None
+    ) -> List[SimulatedReading]:
+        """The latest `count` readings at most, oldest first (new ones, with a rate of 0)."""
+        if not self.rate:
+            for _ in range(count):
+                self.latest(now)
+        self.advance(now)
+        return list(self.readings)[-count:]
+
+    def nudge(self, offset: float) -> SimulatedReading:
+        """Move the satellite by `offset`. Returns the latest reading (with a rate of 0, a
+        new one at the moved altitude)."""
+        self.advance()
+        self.trajectory.altitude += offset
+        if self.rate:
+            return self.readings[-1]
+        return self.put(
+            SimulatedReading.at(datetime.utcnow(), self.trajectory.altitude)
+        )
+
+    def put(self, reading: SimulatedReading) -> SimulatedReading:
+        """Publish a given reading, out of schedule, the trajectory continuing from its
+        altitude."""
+        self.advance()
+        self.trajectory.altitude = reading.altitude
+        self._publish(reading)
+        return reading
+
+
+class TrajectoryLog:
+    """Appends the published readings to a file, from a background task, in batches."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Future] = None
+
+    def write(self, satellite_id: str, reading: SimulatedReading):
+        self.queue.put_nowait(
+            f"{reading.last_updated} {satellite_id} {reading.altitude:012.8f}\n"
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._write_periodically())
+
+    async def stop(self):
+        """Stop, once the lines queued are written."""
+        if self._task is not None:
+            self.queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    def _append(self, text: str):
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(text)
+
+    async def _write_periodically(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            lines = [await self.queue.get()]
+            while not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            stopping = lines[-1] is None
+            text = "".join(line for line in lines if line is not None)
+            if text:
+                await loop.run_in_executor(None, self._append, text)
+            if not stopping:
+                await asyncio.sleep(0.5)
+
+
+class Simulator:
+    """Simulated satellites, by id, each with its own trajectory seeded from `seed`."""
+
+    def __init__(
+        self,
+        satellite_ids: Iterable[str],
+        seed: int = 0,
+        rate: float = 0,
+        history: int = 10000,
+        log_path: Union[str, Path, None] = None,
+    ):  # pylint: disable=too-many-arguments
+        self.satellites: Dict[str, SimulatedSatellite] = {
+            satellite_id: SimulatedSatellite(
+                satellite_id,
+                Trajectory(seed=f"{seed}-{satellite_id}"),
+                rate=rate,
+                history=history,
+            )
+            for satellite_id in satellite_ids
+        }
+        self.log = TrajectoryLog(log_path) if log_path else None
+        self._task: Optional[asyncio.Future] = None
+
+    def get(self, satellite_id: str) -> SimulatedSatellite:
+        """The simulated satellite. Raises KeyError if unknown."""
+        return self.satellites[satellite_id]
+
+    def start(self):
+        """Start logging, and publishing at the satellites' rate in the background (so
+        that requests never have many readings to catch up on)."""
+        if self.log is not None:
+            for satellite in self.satellites.values():
+                satellite.on_publish = self.log.write
+            self.log.start()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._advance_periodically())
+
+    async def stop(self):
+        """Stop publishing in the background, and logging once the log is written."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.log is not None:
+            await self.log.stop()
+
+    async def _advance_periodically(self):
+        while True:
+            for satellite in self.satellites.values():
+                satellite.advance()
+            await asyncio.sleep(0.1)
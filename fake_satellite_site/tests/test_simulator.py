@@ -0,0 +1,83 @@
+"""Tests for simulator.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fake_satellite_site.simulator import (
+    SimulatedReading,
+    SimulatedSatellite,
+    Simulator,
+    Trajectory,
+)
+
+start = datetime(2022, 7, 27, 4, 49, 37)
+
+
+class TestTrajectory(unittest.TestCase):
+    def test_seeded(self):
+        altitudes = [Trajectory(seed=1).step(1) for _ in range(2)]
+        self.assertEqual(altitudes[0], altitudes[1])
+        self.assertNotEqual(Trajectory(seed=1).step(1), Trajectory(seed=2).step(1))
+
+    def test_decay(self):
+        trajectory = Trajectory(seed=3, decays_per_hour=60)
+        altitudes = [trajectory.step(1) for _ in range(3600)]
+        self.assertLess(min(altitudes), 160)
+        self.assertGreater(max(altitudes), 200)
+
+    def test_drift(self):
+        trajectory = Trajectory(noise=0, drift=1, decays_per_hour=0)
+        for _ in range(1000):
+            trajectory.step(1)
+        self.assertAlmostEqual(trajectory.altitude, 213 + 1000 - 1 / 0.05, delta=2)
+
+
+class TestSimulatedSatellite(unittest.TestCase):
+    def test_rate(self):
+        satellite = SimulatedSatellite("a", Trajectory(), rate=1000, start=start)
+        reading = satellite.latest(now=start + timedelta(seconds=2))
+        self.assertEqual(satellite.published, 2001)
+        self.assertEqual(reading.last_updated, "2022-07-27T04:49:39Z")
+        batch = satellite.batch(3, now=start + timedelta(seconds=2))
+        self.assertEqual(batch[-1], reading)
+        self.assertEqual(
+            [item.last_updated[11:] for item in batch],
+            ["04:49:38.998000Z", "04:49:38.999000Z", "04:49:39Z"],
+        )
+
+        other = SimulatedSatellite("a", Trajectory(), rate=1000, start=start)
+        for milliseconds in range(0, 2001, 7):  # Same readings, however often polled
+            other.advance(now=start + timedelta(milliseconds=milliseconds))
+        other.advance(now=start + timedelta(seconds=2))
+        self.assertEqual(list(other.readings), list(satellite.readings))
+
+    def test_on_request(self):
+        satellite = SimulatedSatellite("a", Trajectory(), history=5)
+        self.assertEqual(len(satellite.batch(3)), 3)
+        self.assertEqual(satellite.latest(), satellite.readings[-1])
+        self.assertEqual(len(satellite.readings), 4)
+
+        reading = satellite.nudge(-100)
+        self.assertAlmostEqual(reading.altitude, satellite.readings[-2].altitude - 100)
+        put = satellite.put(SimulatedReading("2017-04-07T02:53:10.000Z", 150))
+        self.assertEqual(satellite.latest(), satellite.readings[-1])
+        self.assertEqual(list(satellite.readings)[-2], put)
+        self.assertEqual(len(satellite.readings), 5)
+
+
+class TestSimulator(unittest.IsolatedAsyncioTestCase):
+    async def test_log(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = Path(tmp_dir) / "log.txt"
+            simulator = Simulator(["a", "b"], seed=1, log_path=log_path)
+            simulator.start()
+            self.assertNotEqual(
+                simulator.get("a").latest().altitude,
+                simulator.get("b").latest().altitude,
+            )
+            await simulator.stop()
+            lines = log_path.read_text().splitlines()
+        self.assertEqual([line.split()[1] for line in lines], ["a", "b"])
@@ -0,0 +1,184 @@
+"""Incremental min/max/average of altitude readings over sliding time windows."""
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, List, Optional, Sequence
+
+from moon_leasing.cache import Reading, merge_readings
+
+
+class WindowAggregate:
+    """Min, max, sum and count of the readings within `window` of the newest one.
+
+    Readings are expected in time order: the minimum and maximum are kept in monotonic
+    deques and the sum and count are running totals, so adding and expiring readings are
+    amortized O(1) and reading the aggregates is O(1).
+    A late (out of order) reading is still accepted, at the cost of a rebuild, once for a
+    whole batch of them if `merge`d.
+    """
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.total = 0.0
+        self.count = 0
+        self._samples: Deque[Reading] = deque()
+        self._mins: Deque[Reading] = deque()  # Increasing altitudes
+        self._maxs: Deque[Reading] = deque()  # Decreasing altitudes
+
+    @property
+    def minimum(self) -> Optional[float]:
+        return self._mins[0].altitude if self._mins else None
+
+    @property
+    def maximum(self) -> Optional[float]:
+        return self._maxs[0].altitude if self._maxs else None
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def readings(self) -> List[Reading]:
+        """The readings in the window, oldest first."""
+        return list(self._samples)
+
+    def add(self, reading: Reading) -> bool:
+        """Add a reading. Returns False if it is a duplicate or already out of the window."""
+        samples = self._samples
+        if samples and reading.last_updated <= samples[-1].last_updated:
+            return self._add_late(reading)
+
+        samples.append(reading)
+        self.total += reading.altitude
+        self.count += 1
+        self._push_extremes(reading)
+        self.expire(reading.last_updated)
+        return True
+
+    def merge(self, readings: Sequence[Reading]):
+        """Add readings sorted by time: rebuilding the window once, O(n + k), if some are
+        older than the newest one."""
+        samples = self._samples
+        if (
+            readings
+            and samples
+            and readings[0].last_updated <= samples[-1].last_updated
+        ):
+            readings = merge_readings(samples, readings)
+            self.clear()
+        for reading in readings:
+            self.add(reading)
+
+    def expire(self, now: datetime):
+        """Drop the readings older than `window` before `now`."""
+        oldest_allowed = now - self.window
+        samples = self._samples
+        while samples and samples[0].last_updated < oldest_allowed:
+            old = samples.popleft()
+            self.total -= old.altitude
+            self.count -= 1
+            if self._mins[0].last_updated == old.last_updated:
+                self._mins.popleft()
+            if self._maxs[0].last_updated == old.last_updated:
+                self._maxs.popleft()
+        if not samples:
+            self.total = 0.0  # Don't carry float rounding errors over
+
+    def clear(self):
+        """Drop all readings."""
+        self.total = 0.0
+        self.count = 0
+        self._samples.clear()
+        self._mins.clear()
+        self._maxs.clear()
+
+    def _push_extremes(self, reading: Reading):
+        while self._mins and self._mins[-1].altitude >= reading.altitude:
+            self._mins.pop()
+        self._mins.append(reading)
+        while self._maxs and self._maxs[-1].altitude <= reading.altitude:
+            self._maxs.pop()
+        self._maxs.append(reading)
+
+    def _add_late(self, reading: Reading) -> bool:
+        samples = self._samples
+        if reading.last_updated < samples[-1].last_updated - self.window:
+            return False
+        idx = bisect_left(samples, (reading.last_updated,))
+        if idx < len(samples) and samples[idx].last_updated == reading.last_updated:
+            return False
+
+        samples.insert(idx, reading)
+        self.total += reading.altitude
+        self.count += 1
+        self._mins.clear()
+        self._maxs.clear()
+        for item in samples:
+            self._push_extremes(item)
+        return True
+
+
+class WindowAggregates:
+    """Several `WindowAggregate`s, keyed by their window length in minutes."""
+
+    def __init__(self, windows_minutes: Iterable[int]):
+        self.windows: Dict[int, WindowAggregate] = {
+            minutes: WindowAggregate(timedelta(minutes=minutes))
+            for minutes in sorted(set(windows_minutes))
+        }
+
+    def __contains__(self, minutes):
+        return minutes in self.windows
+
+    def __getitem__(self, minutes) -> WindowAggregate:
+        return self.windows[minutes]
+
+    @property
+    def longest(self) -> timedelta:
+        """Length of the longest window."""
+        return max((item.window for item in self.windows.values()), default=timedelta())
+
+    def add(self, reading: Reading):
+        """Add a reading to every window."""
+        for aggregate in self.windows.values():
+            aggregate.add(reading)
+
+    def merge(self, readings: Sequence[Reading]):
+        """Add readings sorted by time to every window, each rebuilt at most once."""
+        for aggregate in self.windows.values():
+            aggregate.merge(readings)
+
+    def clear(self):
+        """Drop all readings from every window."""
+        for aggregate in self.windows.values():
+            aggregate.clear()
+
+
+def downsample(
+    readings: Iterable[Reading], since: datetime, until: datetime, points: int
+) -> List[dict]:
+    """Min, max and average of the readings in each of `points` equal time buckets from
+    `since` to `until`, in one pass and O(points) memory. Empty buckets are left out."""
+    width = (until - since) / points
+    buckets: Dict[int, List[float]] = {}  # [minimum, maximum, total, count]
+    for last_updated, altitude in readings:
+        if last_updated < since:
+            continue
+        idx = min(int((last_updated - since) / width), points - 1) if width else 0
+        bucket = buckets.get(idx)
+        if bucket is None:
+            buckets[idx] = [altitude, altitude, altitude, 1]
+        else:
+            bucket[0] = min(bucket[0], altitude)
+            bucket[1] = max(bucket[1], altitude)
+            bucket[2] += altitude
+            bucket[3] += 1
+    return [
+        dict(
+            start=(since + idx * width).isoformat() + "Z",
+            minimum=minimum,
+            maximum=maximum,
+            average=total / count,
+        )
+        for idx, (minimum, maximum, total, count) in sorted(buckets.items())
+    ]
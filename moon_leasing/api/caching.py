@@ -0,0 +1,203 @@
+"""HTTP caching of the JSON answers computed from a satellite's in-memory state.
+
+These answers only change when a reading is ingested, or as time passes and readings leave
+the windows. So each has a validator made of the satellite's newest reading time and the
+current `max_age` time bucket, the same in every worker process once synced: conditional
+requests matching it are answered with 304 (a late reading, older than the newest, only
+shows from the next time bucket on). Each answer is also memoized, serialized, until the
+next ingest or the next time bucket. Bodies are serialized with orjson if installed, and
+memoized gzipped too when large enough, for the clients accepting it.
+"""
+import gzip
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class Validator(NamedTuple):
+    """ETag and Last-Modified of a response."""
+
+    etag: str
+    last_modified: datetime  # Naive UTC, whole seconds
+
+    @classmethod
+    def create(
+        cls,
+        latest: Optional[datetime],
+        max_age: float,
+        now: Optional[float] = None,
+    ) -> "Validator":
+        """Validator of the answers computed with `latest` the newest reading's time, during
+        the `max_age` seconds long time bucket of `now`."""
+        bucket = int((time.time() if now is None else now) // max_age)
+        last_modified = datetime.utcfromtimestamp(bucket * max_age)
+        if latest is not None and latest > last_modified:
+            last_modified = latest
+        latest_us = (
+            0 if latest is None else (latest - EPOCH) // timedelta(microseconds=1)
+        )
+        return cls(
+            etag=f'W/"{latest_us:x}-{bucket}"',
+            last_modified=last_modified.replace(microsecond=0),
+        )
+
+    def matches(self, headers: Mapping[str, str]) -> bool:
+        """Whether a conditional request with these headers is answered with 304.
+
+        If-None-Match is used if present (weak comparison), otherwise If-Modified-Since.
+        """
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {_opaque_tag(tag) for tag in if_none_match.split(",")}
+            return "*" in tags or _opaque_tag(self.etag) in tags
+        if_modified_since = headers.get("if-modified-since")
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return self.last_modified <= since
+
+    def headers(self, max_age: float) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(
+                self.last_modified.replace(tzinfo=timezone.utc), usegmt=True
+            ),
+            "Cache-Control": f"max-age={int(max_age)}",
+        }
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def dumps(data) -> bytes:
+    """Compact JSON of `data`, with orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(data)  # pylint: disable=no-member
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def accepts_gzip(headers: Mapping[str, str]) -> bool:
+    """Whether the Accept-Encoding request header allows gzip."""
+    for item in headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            quality = params.strip().partition("q=")[2]
+            try:
+                return not quality or float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class _Answer(NamedTuple):
+    validator: Validator
+    sequence: int  # Ingest sequence number it was computed at
+    body: bytes
+    gzipped: Optional[bytes]  # None if too small to gain from it
+
+
+class ResponseCache:
+    """Memoized, serialized JSON answers by key, each with the Validator it is valid for.
+
+    At most `maxsize` answers are kept, the oldest memoized being dropped first. Bodies of
+    `gzip_min_size` bytes or more are also memoized gzipped.
+    """
+
+    def __init__(self, max_age: float, maxsize: int = 1024, gzip_min_size: int = 1000):
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self.gzip_min_size = gzip_min_size
+        self._answers: Dict[Hashable, _Answer] = {}
+
+    def __len__(self):
+        return len(self._answers)
+
+    def clear(self):
+        self._answers.clear()
+
+    def bucket_end(self, now: Optional[float] = None) -> datetime:
+        """End of the current `max_age` time bucket, naive UTC: a default "now" for the
+        answers, the same all along the bucket, so memoized under one key."""
+        return datetime.utcfromtimestamp(
+            (int((time.time() if now is None else now) // self.max_age) + 1)
+            * self.max_age
+        )
+
+    async def respond(
+        self,
+        headers: Mapping[str, str],
+        key: Hashable,
+        version: Callable[[], Awaitable[Tuple[int, Optional[datetime]]]],
+        compute: Callable[[], Awaitable[dict]],
+    ) -> Response:
+        """The answer for `key`: 304 if the request's validators match, the memoized body if
+        still valid, otherwise `compute`d and memoized.
+
+        `version` returns the ingest sequence number and time of the newest reading the
+        answers are computed from, once up to date.
+        """
+        sequence, latest = await version()
+        validator = Validator.create(latest, max_age=self.max_age)
+        response_headers = validator.headers(self.max_age)
+        response_headers["Vary"] = "Accept-Encoding"
+        if validator.matches(headers):
+            return Response(status_code=304, headers=response_headers)
+
+        answer = self._answers.get(key)
+        if answer is None or (answer.validator, answer.sequence) != (
+            validator,
+            sequence,
+        ):
+            body = dumps(await compute())
+            new_sequence, new_latest = await version()
+            if (
+                new_sequence != sequence
+                or Validator.create(new_latest, max_age=self.max_age) != validator
+            ):
+                # Ingested while computing: the body may be either version
+                return Response(body, media_type="application/json")
+            answer = _Answer(
+                validator,
+                sequence,
+                body,
+                gzip.compress(body, compresslevel=6)
+                if len(body) >= self.gzip_min_size
+                else None,
+            )
+            self._answers.pop(key, None)
+            while len(self._answers) >= self.maxsize:
+                del self._answers[next(iter(self._answers))]
+            self._answers[key] = answer
+
+        body = answer.body
+        if answer.gzipped is not None and accepts_gzip(headers):
+            body = answer.gzipped
+            response_headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type="application/json", headers=response_headers)
@@ -1,27 +1,170 @@
 """FastAPI app which provides endpoints for the Satellite stats and health."""
-from typing import Dict
+import asyncio
+import codecs
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Type
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi import FastAPI  # , BackgroundTasks
-from fastapi.responses import RedirectResponse
+from fastapi import (  # , BackgroundTasks
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+)
+from fastapi.responses import (
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Match
 
-from moon_leasing.db.config import Base, engine
+from moon_leasing import metrics
+from moon_leasing.api.caching import ResponseCache
+from moon_leasing.broadcast import Subscription
+from moon_leasing.db.config import create_tables, dispose_engines
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.leadership import LeaderElection
+from moon_leasing.db.retention import RetentionPolicy, check_auto_vacuum
+from moon_leasing.importer import FORMATS, ReadingImporter
+from moon_leasing.schemas import AnalyticsResponse, HealthResponse, StatsResponse
 from moon_leasing.settings import Settings
-from moon_leasing.space import SatelliteData
+from moon_leasing.space import NoReadingsError, SatelliteData, Satellites
 
 logger = Settings.get_logger(__name__)
 
+STATS_PERCENTILES = (50, 90, 99)  # Of /stats?include=percentiles
+
+HTTP_SECONDS = metrics.Histogram(
+    "moon_leasing_http_request_seconds",
+    "Latency of HTTP requests until the response starts, by method, route and status",
+    ["method", "route", "status"],
+)
+
+
+class MetricsMiddleware:  # pylint: disable=too-few-public-methods
+    """ASGI middleware observing the latency of every HTTP request in HTTP_SECONDS."""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = None
+
+        def observe(status_code: int):
+            HTTP_SECONDS.labels(
+                scope["method"], self.route(scope), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+        async def send_observed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                observe(status)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        except Exception:
+            if status is None:
+                observe(500)
+            raise
+
+    @staticmethod
+    def route(scope) -> str:
+        """Path template of the route matching the request, to keep the labels bounded."""
+        for route in app.router.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+responses = ResponseCache(
+    max_age=Settings.POLL_INTERVAL_SECONDS, gzip_min_size=Settings.GZIP_MIN_SIZE
+)
+
+retention = RetentionPolicy(
+    raw_days=Settings.RETENTION_DAYS,
+    minute_rollup_days=Settings.ROLLUP_RETENTION_DAYS,
+    chunk_size=Settings.RETENTION_CHUNK_SIZE,
+    vacuum_pages=Settings.VACUUM_PAGES,
+    min_raw_minutes=max(
+        [Settings.BUFFER_MINUTES, Settings.HEALTH_RECOVERY_MINUTES]
+        + Settings.STATS_WINDOWS
+    ),
+)
+
+
+async def set_leader(is_leader: bool):
+    """Poll upstream and write the readings as the leader, only read them as a follower."""
+    SatelliteData.is_leader = is_leader
+    if is_leader:
+        SatelliteData.writer.start()
+    else:
+        await SatelliteData.writer.stop()
+
+
+election = (
+    LeaderElection(lease_seconds=Settings.LEADER_LEASE_SECONDS, on_change=set_leader)
+    if Settings.LEADER_ELECTION
+    else None
+)
+
+
+async def run_retention():
+    """Apply the retention policy, if the leader."""
+    if SatelliteData.is_leader:
+        await retention.run()
 
 
 @app.on_event("startup")
 async def startup():
-    """At server startup: create db tables if needed."""
-    async with engine.begin() as conn:
-        # await conn.run_sync(Base.metadata.drop_all)
-        # print("dropped")
-        await conn.run_sync(Base.metadata.create_all)
-        print("DB table created")
+    """At server startup: create db tables if needed, campaign for leadership, warm up caches
+    and start polling and the scheduled jobs (and the DB writer, if the leader)."""
+    await create_tables()
+    logger.info("DB table created")
+    await check_auto_vacuum()
+    if election is not None:
+        SatelliteData.is_leader = False
+        await election.campaign()
+        app.scheduler.add_job(
+            election.campaign, "interval", seconds=Settings.LEADER_RENEW_SECONDS
+        )
+    else:
+        await set_leader(True)
+    await Satellites.warm_up()
+    Satellites.start_polling()
+    app.scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """At server shutdown: hand over the leadership, write pending readings and close the
+    upstream and DB connection pools."""
+    if app.scheduler.running:
+        app.scheduler.shutdown(wait=False)
+    await Satellites.stop_polling()
+    if election is not None:
+        await election.resign()
+    await SatelliteData.writer.stop()
+    await SatelliteData.upstream.aclose()
+    await dispose_engines()
+
+
+@app.exception_handler(NoReadingsError)
+async def no_readings(_request: Request, ex: NoReadingsError):
+    """503: no reading in memory and upstream (or, for a follower, the DB) unavailable."""
+    return JSONResponse(status_code=503, content={"detail": str(ex)})
 
 
 @app.get("/")
@@ -29,20 +172,343 @@ async def root():
     return RedirectResponse(url="/docs")
 
 
-@app.get("/stats")
-async def get_stats() -> Dict[str, str]:
-    """Returns the minimum, maximum and average altitude for the last 5 minutes."""
-    data = await SatelliteData.stats()
-    return {"data": data}
+def get_satellite(satellite_id: str) -> Type[SatelliteData]:
+    """The tracked satellite `satellite_id` (404 if unknown)."""
+    try:
+        return Satellites.get(satellite_id)
+    except KeyError as ex:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown satellite: {satellite_id}"
+        ) from ex
+
+
+@app.get("/stats", response_model=StatsResponse, response_model_exclude_none=True)
+async def get_stats(
+    request: Request,
+    window: int = 5,
+    include: str = "",
+    points: int = Query(60, ge=1, le=1000),
+) -> StatsResponse:
+    """Returns the minimum, maximum and average altitude for the last `window` minutes.
+
+    `include` may list `altitudes` (all of the window), `series` (downsampled to
+    `points` time buckets) and `percentiles` (p50, p90 and p99, from quantile sketches).
+    """
+    return await get_satellite_stats(
+        request, window=window, include=include, points=points, satellite=SatelliteData
+    )
 
 
-@app.get("/health")
-async def get_health() -> Dict[str, str]:
+@app.get("/health", response_model=HealthResponse)
+async def get_health(request: Request) -> HealthResponse:
     """Returns the health based on altitude 160."""
-    data = await SatelliteData.health()
+    return await get_satellite_health(request, satellite=SatelliteData)
+
+
+@app.get("/history")
+async def get_history(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fmt: str = Query("ndjson", alias="format"),
+):
+    """Streams the stored readings between `since` and `until` as NDJSON or CSV."""
+    return await get_satellite_history(
+        since=since, until=until, fmt=fmt, satellite=SatelliteData
+    )
+
+
+@app.get(
+    "/analytics", response_model=AnalyticsResponse, response_model_exclude_none=True
+)
+async def get_analytics(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    percentiles: str = "5,50,95",
+    points: int = Query(0, ge=0, le=10000),
+) -> AnalyticsResponse:
+    """Returns altitude analytics from `since` (default: a day before `until`) to `until`
+    (default: now, rounded up to the end of the cache time bucket): count, minimum,
+    maximum, average, standard deviation, `percentiles`, rate of change and, if `points`,
+    a series downsampled to `points` time buckets."""
+    return await get_satellite_analytics(
+        request,
+        since=since,
+        until=until,
+        percentiles=percentiles,
+        points=points,
+        satellite=SatelliteData,
+    )
+
+
+@app.post("/import")
+async def import_readings(
+    request: Request, fmt: Optional[str] = Query(None, alias="format")
+) -> Dict[str, int]:
+    """Imports readings from a CSV or NDJSON body, skipping those already stored."""
+    return await import_satellite_readings(request, fmt=fmt, satellite=SatelliteData)
+
+
+@app.get("/events")
+async def get_events():
+    """Streams new readings and health changes as Server-Sent Events."""
+    return await get_satellite_events(satellite=SatelliteData)
+
+
+@app.websocket("/ws")
+async def websocket_events(websocket: WebSocket):
+    """Sends new readings and health changes as JSON messages."""
+    await websocket_satellite_events(websocket, satellite=SatelliteData)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Returns the service metrics in the Prometheus text format."""
+    return Response(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/debug/diagnostics")
+async def get_diagnostics(
+    limit: Optional[int] = 100, level: str = "DEBUG"
+) -> Dict[str, List[dict]]:
+    """Returns the last `limit` diagnostics log records at `level` or above (if enabled)."""
+    if not Settings.DIAGNOSTICS_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        data = Settings.diagnostics.get_records(limit=limit, level=level)
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex)) from ex
     return {"data": data}
 
 
+@app.get("/satellites")
+async def get_satellites() -> Dict[str, List[str]]:
+    """Returns the ids of the tracked satellites."""
+    return {"data": list(Satellites.registry)}
+
+
+@app.get(
+    "/satellites/{satellite_id}/stats",
+    response_model=StatsResponse,
+    response_model_exclude_none=True,
+)
+async def get_satellite_stats(
+    request: Request,
+    window: int = 5,
+    include: str = "",
+    points: int = Query(60, ge=1, le=1000),
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+) -> StatsResponse:
+    """Returns the minimum, maximum and average altitude of a satellite for the last `window` minutes.
+
+    `include` may list `altitudes` (all of the window), `series` (downsampled to
+    `points` time buckets) and `percentiles` (p50, p90 and p99, from quantile sketches).
+    """
+    fields = {item.strip() for item in include.split(",") if item.strip()}
+    unknown = fields - {"altitudes", "series", "percentiles"}
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}"
+        )
+    points = points if "series" in fields else 0
+    percentiles = STATS_PERCENTILES if "percentiles" in fields else ()
+
+    async def compute():
+        try:
+            data = await satellite.stats(
+                window=window,
+                altitudes="altitudes" in fields,
+                points=points,
+                percentiles=percentiles,
+            )
+        except ValueError as ex:
+            raise HTTPException(status_code=400, detail=str(ex)) from ex
+        return {"data": data}
+
+    return await responses.respond(
+        request.headers,
+        (
+            satellite.SATELLITE_ID,
+            "stats",
+            window,
+            "altitudes" in fields,
+            points,
+            percentiles,
+        ),
+        satellite.version,
+        compute,
+    )
+
+
+@app.get("/satellites/{satellite_id}/health", response_model=HealthResponse)
+async def get_satellite_health(
+    request: Request,
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+) -> HealthResponse:
+    """Returns the health of a satellite based on altitude 160."""
+
+    async def compute():
+        return {"data": await satellite.health()}
+
+    return await responses.respond(
+        request.headers, (satellite.SATELLITE_ID, "health"), satellite.version, compute
+    )
+
+
+@app.get("/satellites/{satellite_id}/history")
+async def get_satellite_history(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fmt: str = Query("ndjson", alias="format"),
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+):
+    """Streams the stored readings of a satellite between `since` and `until` as NDJSON or CSV."""
+    media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    if fmt not in media_types:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    return StreamingResponse(
+        satellite.history(since=since, until=until, fmt=fmt),
+        media_type=media_types[fmt],
+    )
+
+
+@app.get(
+    "/satellites/{satellite_id}/analytics",
+    response_model=AnalyticsResponse,
+    response_model_exclude_none=True,
+)
+async def get_satellite_analytics(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    percentiles: str = "5,50,95",
+    points: int = Query(0, ge=0, le=10000),
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+) -> AnalyticsResponse:
+    """Returns altitude analytics of a satellite from `since` (default: a day before
+    `until`) to `until` (default: now, rounded up to the end of the cache time bucket):
+    count, minimum, maximum, average, standard deviation, `percentiles`, rate of change
+    and, if `points`, a series downsampled to `points` time buckets."""
+    until = SatelliteDB.to_naive_datetime(until) if until else responses.bucket_end()
+    since = SatelliteDB.to_naive_datetime(since) if since else until - timedelta(days=1)
+    try:
+        quantiles = tuple(
+            float(item) for item in percentiles.split(",") if item.strip()
+        )
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=f"Bad percentiles: {ex}") from ex
+    if not all(0 <= item <= 100 for item in quantiles):
+        raise HTTPException(
+            status_code=400, detail="Percentiles must be between 0 and 100"
+        )
+    if since > until:
+        raise HTTPException(status_code=400, detail="since is after until")
+
+    async def compute():
+        return {
+            "data": await satellite.analytics(
+                since, until, percentiles=quantiles, points=points
+            )
+        }
+
+    return await responses.respond(
+        request.headers,
+        (satellite.SATELLITE_ID, "analytics", since, until, quantiles, points),
+        satellite.version,
+        compute,
+    )
+
+
+@app.post("/satellites/{satellite_id}/import")
+async def import_satellite_readings(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format"),
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+) -> Dict[str, int]:
+    """Imports readings of a satellite from a CSV (with a `last_updated,altitude` header) or
+    NDJSON body, as exported by its history, skipping those already stored.
+
+    The format defaults to NDJSON for an `application/x-ndjson` body, CSV otherwise.
+    """
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "ndjson" if "ndjson" in content_type else "csv"
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    importer = ReadingImporter(
+        satellite.SATELLITE_ID,
+        fmt=fmt,
+        batch_size=Settings.IMPORT_BATCH_SIZE,
+        on_insert=satellite.add_imported,
+    )
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    partial = ""
+    async for chunk in request.stream():
+        *lines, partial = (partial + decoder.decode(chunk)).split("\n")
+        await importer.feed(lines)
+    await importer.feed([partial + decoder.decode(b"", final=True)])
+    return await importer.close()
+
+
+@app.get("/satellites/{satellite_id}/events")
+async def get_satellite_events(
+    satellite: Type[SatelliteData] = Depends(get_satellite),
+):
+    """Streams a satellite's new readings and health changes as Server-Sent Events."""
+    return StreamingResponse(
+        server_sent_events(satellite),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/satellites/{satellite_id}/ws")
+async def websocket_satellite_events(
+    websocket: WebSocket, satellite: Type[SatelliteData] = Depends(get_satellite)
+):
+    """Sends a satellite's new readings and health changes as JSON messages."""
+    await websocket.accept()
+    subscription = satellite.subscribe()
+    sender = asyncio.ensure_future(send_events(websocket, subscription))
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        satellite.broadcaster.unsubscribe(subscription)
+
+
+async def server_sent_events(satellite: Type[SatelliteData]) -> AsyncIterator[str]:
+    """Events of a new subscription to `satellite`, with keep-alive comments when idle."""
+    subscription = satellite.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), timeout=Settings.EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:  # Dropped as a slow consumer: the client may reconnect
+                return
+            yield event.sse
+    finally:
+        satellite.broadcaster.unsubscribe(subscription)
+
+
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    """Send the events of `subscription`, closing the socket if it is dropped."""
+    async for event in subscription:
+        await websocket.send_text(event.payload)
+    await websocket.close(code=1013)  # Try again later
+
+
+# Started at startup, like the pollers (the leader's poll upstream, followers' read what it
+# stored)
 app.scheduler = AsyncIOScheduler()
-app.scheduler.add_job(SatelliteData.refresh, "interval", seconds=15)
-app.scheduler.start()
+app.scheduler.add_job(
+    run_retention, "interval", minutes=Settings.RETENTION_INTERVAL_MINUTES
+)
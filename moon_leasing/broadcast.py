@@ -0,0 +1,107 @@
+"""Fan-out of events to any number of subscribers, each with a bounded queue."""
+import asyncio
+import json
+from typing import NamedTuple, Optional, Set
+
+from moon_leasing.metrics import Counter
+
+EVENTS_PUBLISHED = Counter(
+    "moon_leasing_events_published_total", "Events published to subscribers"
+)
+SUBSCRIBERS_DROPPED = Counter(
+    "moon_leasing_event_subscribers_dropped_total",
+    "Subscribers dropped for not keeping up with the events",
+)
+
+
+class Event(NamedTuple):
+    """An event, serialized once for all subscribers."""
+
+    name: str
+    payload: str  # JSON object with the event name and its data
+    sse: str  # Server-Sent Events message
+
+    @classmethod
+    def create(cls, name: str, data: dict) -> "Event":
+        payload = json.dumps(dict(event=name, **data))
+        return cls(name, payload, f"event: {name}\ndata: {payload}\n\n")
+
+
+class Subscription:
+    """Events for one subscriber, iterated until it is closed."""
+
+    def __init__(self, maxsize: int):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def put(self, event: Event) -> bool:
+        """Queue an event. Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        """Drop the queued events and end the iteration."""
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Event]:
+        """The next event, or None once closed."""
+        return None if self.closed and self.queue.empty() else await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class Broadcaster:
+    """Publishes each event to every subscriber without waiting for any of them.
+
+    Each subscriber has a queue of up to `queue_size` events: a subscriber whose queue is
+    full is a slow consumer, and is dropped rather than slowing down or buffering for
+    everyone else.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, *initial: Event) -> Subscription:
+        """A new subscription, starting with the `initial` events."""
+        subscription = Subscription(max(self.queue_size, len(initial)))
+        for event in initial:
+            subscription.put(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, name: str, data: dict) -> Optional[Event]:
+        """Send an event to all subscribers (not even serialized if there are none)."""
+        if not self._subscribers:
+            return None
+        event = Event.create(name, data)
+        slow = [
+            subscription
+            for subscription in self._subscribers
+            if not subscription.put(event)
+        ]
+        for subscription in slow:
+            self._subscribers.discard(subscription)
+            subscription.close()
+        EVENTS_PUBLISHED.inc()
+        SUBSCRIBERS_DROPPED.inc(len(slow))
+        return event
@@ -0,0 +1,106 @@
+"""In-process buffer of the most recent altitude readings."""
+import heapq
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import attrgetter
+from typing import Deque, Iterable, List, NamedTuple, Optional, Sequence
+
+
+class Reading(NamedTuple):
+    """A single altitude reading, as stored in memory."""
+
+    last_updated: datetime
+    altitude: float
+
+
+class ReadingBuffer:
+    """Bounded ring buffer of readings, ordered and indexed by `last_updated`.
+
+    Holds at most `maxlen` readings, and none older than `horizon` before the newest one.
+    Readings with an already buffered `last_updated` are ignored, like in the DB.
+    """
+
+    def __init__(self, maxlen: int = 4096, horizon: timedelta = timedelta(minutes=10)):
+        self.horizon = horizon
+        self._readings: Deque[Reading] = deque(maxlen=maxlen)
+        self._times: Deque[datetime] = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self._readings)
+
+    def __iter__(self):
+        return iter(self._readings)
+
+    @property
+    def latest(self) -> Optional[Reading]:
+        """The newest buffered reading (None if empty)."""
+        return self._readings[-1] if self._readings else None
+
+    def append(self, reading: Reading) -> bool:
+        """Add a reading in time order. Returns False if it was not stored."""
+        times = self._times
+        if not times or reading.last_updated > times[-1]:
+            times.append(reading.last_updated)
+            self._readings.append(reading)
+        else:
+            idx = bisect_left(times, reading.last_updated)
+            if idx < len(times) and times[idx] == reading.last_updated:
+                return False
+            if len(times) == times.maxlen:
+                if idx == 0:
+                    return False  # Older than anything we have room for
+                times.popleft()
+                self._readings.popleft()
+                idx -= 1
+            times.insert(idx, reading.last_updated)
+            self._readings.insert(idx, reading)
+
+        oldest_allowed = times[-1] - self.horizon
+        while times[0] < oldest_allowed:
+            times.popleft()
+            self._readings.popleft()
+        return times[0] <= reading.last_updated
+
+    def extend(self, readings: Iterable[Reading]):
+        """Add several readings."""
+        for reading in readings:
+            self.append(reading)
+
+    def merge(self, readings: Sequence[Reading]):
+        """Add readings sorted by time, in one merge: O(n + k) rather than an O(n) insertion
+        for each one older than the newest."""
+        times = self._times
+        if not readings or not times or readings[0].last_updated > times[-1]:
+            self.extend(readings)
+            return
+        merged = merge_readings(self._readings, readings)
+        oldest_allowed = merged[-1].last_updated - self.horizon
+        merged = merged[bisect_left(merged, (oldest_allowed,)) :]
+        self._readings = deque(merged, maxlen=times.maxlen)
+        self._times = deque(
+            (reading.last_updated for reading in self._readings), maxlen=times.maxlen
+        )
+
+    def since(self, dt_since: datetime) -> List[Reading]:
+        """Readings with `last_updated >= dt_since`, oldest first."""
+        idx = bisect_left(self._times, dt_since)
+        return list(islice(self._readings, idx, None))
+
+    def clear(self):
+        """Drop all buffered readings."""
+        self._times.clear()
+        self._readings.clear()
+
+
+def merge_readings(
+    readings: Iterable[Reading], others: Iterable[Reading]
+) -> List[Reading]:
+    """The readings of both, each sorted by time, in time order: without duplicates, those
+    of `readings` kept over those of `others` at the same time."""
+    merged: List[Reading] = []
+    for reading in heapq.merge(readings, others, key=attrgetter("last_updated")):
+        if not merged or reading.last_updated != merged[-1].last_updated:
+            merged.append(reading)
+    return merged
@@ -0,0 +1,235 @@
+"""Columnar in-memory history of a satellite's readings, for ad-hoc analytics with numpy.
+
+The timestamps (datetime64) and altitudes (float64) are kept in two contiguous arrays,
+sorted by time and grown by doubling, so appending is amortized O(1). A time range is
+found by binary search, as views of the arrays, and analyzed with vectorized operations.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from moon_leasing.cache import Reading
+
+TIME_UNIT = "datetime64[us]"
+
+
+class ColumnarHistory:
+    """Readings sorted by time, the oldest dropped beyond `max_readings`.
+
+    It is empty until `load`ed: readings `add`ed before are ignored, as loading is expected
+    to include them.
+    """
+
+    def __init__(self, max_readings: int = 5_000_000, capacity: int = 1024):
+        self.max_readings = max_readings
+        self.loaded = False
+        self._times = np.empty(capacity, TIME_UNIT)
+        self._altitudes = np.empty(capacity, np.float64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[: self._size]
+
+    @property
+    def altitudes(self) -> np.ndarray:
+        return self._altitudes[: self._size]
+
+    def load(self, chunks: Iterable[Sequence[Tuple[datetime, float]]]):
+        """Replace the readings with (last_updated, altitude) rows, given oldest first."""
+        self.clear()
+        for rows in chunks:
+            self.extend(rows)
+        self.loaded = True
+
+    def extend(self, rows: Sequence[Tuple[datetime, float]]):
+        """Append (last_updated, altitude) rows, oldest first and newer than the readings,
+        e.g. each chunk as it is read while loading (setting `loaded` once done)."""
+        if rows:
+            self._append(
+                np.array([row[0] for row in rows], dtype=TIME_UNIT),
+                np.array([row[1] for row in rows], dtype=np.float64),
+            )
+
+    def add(self, reading: Reading) -> bool:
+        """Add a reading, in any order. Returns False if not loaded yet, or a duplicate."""
+        if not self.loaded:
+            return False
+        when = np.datetime64(reading.last_updated, "us")
+        size = self._size
+        if not size or when > self._times[size - 1]:
+            self._append(np.array([when]), np.array([reading.altitude]))
+            return True
+        idx = int(np.searchsorted(self.times, when))
+        if idx < size and self._times[idx] == when:
+            return False
+        self._reserve(size + 1)
+        self._times[idx + 1 : size + 1] = self._times[idx:size]
+        self._altitudes[idx + 1 : size + 1] = self._altitudes[idx:size]
+        self._times[idx] = when
+        self._altitudes[idx] = reading.altitude
+        self._size += 1
+        self._trim()
+        return True
+
+    def merge(self, readings: Sequence[Reading]) -> int:
+        """Add readings, in any order, in one sorted merge: O(n + k log k) for k readings.
+        Returns how many were added (not duplicates), none if not loaded yet."""
+        if not self.loaded or not readings:
+            return 0
+        times = np.array([item.last_updated for item in readings], TIME_UNIT)
+        altitudes = np.array([item.altitude for item in readings], np.float64)
+        order = np.argsort(times, kind="stable")
+        times, altitudes = times[order], altitudes[order]
+        new = np.r_[True, times[1:] != times[:-1]]
+        size = self._size
+        idx = np.searchsorted(self.times, times)
+        if size:
+            new &= (idx == size) | (self._times[np.minimum(idx, size - 1)] != times)
+        times, altitudes, idx = times[new], altitudes[new], idx[new]
+        if not len(times):
+            return 0
+        if idx[0] == size:  # All newer
+            self._append(times, altitudes)
+        else:
+            merged_times = np.insert(self.times, idx, times)
+            merged_altitudes = np.insert(self.altitudes, idx, altitudes)
+            self._size = 0
+            self._append(merged_times, merged_altitudes)
+        return len(times)
+
+    def range(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Views of the timestamps and altitudes from `since` (included) to `until`."""
+        times = self.times
+        first = (
+            0 if since is None else np.searchsorted(times, np.datetime64(since, "us"))
+        )
+        last = (
+            self._size
+            if until is None
+            else np.searchsorted(times, np.datetime64(until, "us"))
+        )
+        return times[first:last], self.altitudes[first:last]
+
+    def clear(self):
+        """Drop all readings, until loaded again."""
+        self._size = 0
+        self.loaded = False
+
+    def _append(self, times: np.ndarray, altitudes: np.ndarray):
+        size = self._size
+        self._reserve(size + len(times))
+        self._times[size : size + len(times)] = times
+        self._altitudes[size : size + len(times)] = altitudes
+        self._size += len(times)
+        self._trim()
+
+    def _reserve(self, size: int):
+        capacity = len(self._times)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ("_times", "_altitudes"):
+            old = getattr(self, name)
+            new = np.empty(capacity, old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def _trim(self):
+        """Drop the oldest readings beyond `max_readings` (and some more, so that this
+        O(n) shift is amortized)."""
+        if self._size <= self.max_readings:
+            return
+        keep = self.max_readings - self.max_readings // 10
+        drop = self._size - keep
+        self._times[:keep] = self._times[drop : self._size]
+        self._altitudes[:keep] = self._altitudes[drop : self._size]
+        self._size = keep
+
+
+def analyze(
+    times: np.ndarray,
+    altitudes: np.ndarray,
+    since: datetime,
+    until: datetime,
+    percentiles: Sequence[float] = (),
+    points: int = 0,
+) -> dict:  # pylint: disable=too-many-arguments
+    """Stats of the altitudes at `times` (sorted, from `since` to `until`): count,
+    minimum, maximum, average, standard deviation, the `percentiles` (as `p<percentile>`),
+    the rate of change (per second) between successive readings and, if `points`, a series
+    of `points` equal time buckets (empty ones left out)."""
+    count = len(altitudes)
+    data = dict(
+        since=since.isoformat() + "Z",
+        until=until.isoformat() + "Z",
+        count=count,
+    )
+    if not count:
+        return data
+    data.update(
+        minimum=float(altitudes.min()),
+        maximum=float(altitudes.max()),
+        average=float(altitudes.mean()),
+        stddev=float(altitudes.std()),
+        percentiles={
+            f"p{percentile:g}": float(value)
+            for percentile, value in zip(
+                percentiles, np.percentile(altitudes, percentiles)
+            )
+        },
+    )
+    if count > 1:
+        seconds = np.diff(times) / np.timedelta64(1, "s")
+        rates = np.diff(altitudes) / seconds
+        data["rate_of_change"] = dict(
+            minimum=float(rates.min()),
+            maximum=float(rates.max()),
+            average=float((altitudes[-1] - altitudes[0]) / seconds.sum()),
+        )
+    if points:
+        data["series"] = series(times, altitudes, since, until, points)
+    return data
+
+
+def series(
+    times: np.ndarray,
+    altitudes: np.ndarray,
+    since: datetime,
+    until: datetime,
+    points: int,
+) -> List[dict]:
+    """Min, max and average of the altitudes in each of `points` equal time buckets from
+    `since` to `until`, like `aggregates.downsample`. Empty buckets are left out."""
+    width = (until - since) / points
+    start = np.datetime64(since, "us")
+    if width:
+        buckets = ((times - start) / np.timedelta64(width)).astype(np.int64)
+        np.clip(buckets, 0, points - 1, out=buckets)
+    else:
+        buckets = np.zeros(len(times), np.int64)
+    firsts = np.flatnonzero(np.r_[True, np.diff(buckets) != 0])
+    counts = np.diff(np.r_[firsts, len(times)])
+    totals = np.add.reduceat(altitudes, firsts)
+    return [
+        dict(
+            start=(since + int(bucket) * width).isoformat() + "Z",
+            minimum=float(minimum),
+            maximum=float(maximum),
+            average=float(total / bucket_count),
+        )
+        for bucket, minimum, maximum, total, bucket_count in zip(
+            buckets[firsts],
+            np.minimum.reduceat(altitudes, firsts),
+            np.maximum.reduceat(altitudes, firsts),
+            totals,
+            counts,
+        )
+    ]
@@ -1,17 +1,124 @@
-"""DB setup with sqlalchemy."""
+"""DB setup with sqlalchemy.
+
+Writes go through `engine` / `async_session`, reads may use `read_engine` /
+`read_session`. On SQLite the writer engine holds a single connection, so writers queue
+in the pool instead of failing on the database lock, while pooled read-only connections
+read concurrently from the WAL journal.
+"""
+import asyncio
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from moon_leasing.metrics import Histogram
 from moon_leasing.settings import Settings
 
 logger = Settings.get_logger(__name__)
 
-engine = create_async_engine(Settings.DATABASE_URL, future=True, echo=True)
+DB_QUERY_SECONDS = Histogram(
+    "moon_leasing_db_query_seconds",
+    "Latency of DB statements, by engine (read or write)",
+    ["engine"],
+)
+
+
+def sqlite_pragmas(read_only: bool = False) -> dict:
+    """PRAGMAs set on every new SQLite connection."""
+    pragmas = dict(
+        auto_vacuum="INCREMENTAL",  # Only takes effect on a new DB, so it comes first
+        journal_mode=Settings.DB_JOURNAL_MODE,
+        synchronous=Settings.DB_SYNCHRONOUS,
+        cache_size=-Settings.DB_CACHE_SIZE_KB,  # Negative: size in KiB, not pages
+        mmap_size=Settings.DB_MMAP_SIZE,
+        busy_timeout=Settings.DB_BUSY_TIMEOUT_MS,
+        temp_store="MEMORY",
+    )
+    if read_only:
+        pragmas["query_only"] = "ON"
+    return pragmas
+
+
+def create_engine(url: str, pool_size: int, max_overflow: int, read_only: bool = False):
+    """Async engine for `url`, timing its statements and setting `sqlite_pragmas` on
+    connect for a SQLite file."""
+    new_engine = create_async_engine(
+        url,
+        future=True,
+        echo=Settings.DB_ECHO,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+    )
+    query_seconds = DB_QUERY_SECONDS.labels("read" if read_only else "write")
+
+    @event.listens_for(new_engine.sync_engine, "before_cursor_execute")
+    def start_timer(conn, *_args):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(new_engine.sync_engine, "after_cursor_execute")
+    def stop_timer(conn, *_args):
+        query_seconds.observe(time.perf_counter() - conn.info.pop("query_started"))
+
+    if new_engine.sync_engine.dialect.name == "sqlite" and ":memory:" not in url:
+        pragmas = sqlite_pragmas(read_only=read_only)
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+
+    return new_engine
+
+
+engine = create_engine(
+    Settings.DATABASE_URL,
+    pool_size=Settings.DB_WRITE_POOL_SIZE,
+    max_overflow=0,
+)
+read_engine = create_engine(
+    Settings.DATABASE_READ_URL,
+    pool_size=Settings.DB_READ_POOL_SIZE,
+    max_overflow=Settings.DB_READ_MAX_OVERFLOW,
+    read_only=True,
+)
 
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+read_session = sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
+
+async def dispose_engines():
+    """Close the pooled connections of both engines."""
+    await engine.dispose()
+    await read_engine.dispose()
+
 
 Base = declarative_base()
 
+
+async def create_tables(attempts: int = 3):
+    """Create the missing tables.
+
+    Worker processes starting together may race to create the same table, in which case
+    it is attempted again, as the table will then already exist.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            return
+        except OperationalError as ex:
+            if attempt == attempts:
+                raise
+            logger.info(f"Creating the tables failed ({ex}), trying again")
+            await asyncio.sleep(0.1 * attempt)
+
+
 # def get_db():
 #     """
 #     Get the database session
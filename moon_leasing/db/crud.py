@@ -1,36 +1,83 @@
-"""CRUD operations for SatelliteStatusTable"""
-import os
+"""CRUD operations for SatelliteStatusTable, SatelliteRollupTable and SatelliteSketchTable"""
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Union
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
 
 # from sqlalchemy import update
 import dateutil.parser
 
-from sqlalchemy import desc
+from sqlalchemy import (
+    and_,
+    bindparam,
+    delete,
+    desc,
+    exists,
+    false,
+    func,
+    insert,
+    or_,
+    union,
+    update,
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.future import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from moon_leasing.db.config import async_session
-from moon_leasing.db.models.satellite import SatelliteStatusTable
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session, engine
+from moon_leasing.db.models.satellite import (
+    DEFAULT_SATELLITE_ID,
+    SatelliteRollupTable,
+    SatelliteSketchTable,
+    SatelliteStatusTable,
+)
+from moon_leasing.metrics import Counter, Histogram
 from moon_leasing.settings import Settings
+from moon_leasing.sketch import QuantileSketch
 
 logger = Settings.get_logger(__name__)
 
+DB_INSERT_SECONDS = Histogram(
+    "moon_leasing_db_insert_seconds",
+    "Latency of storing readings, rollups included, per batch",
+)
+DUPLICATE_READINGS = Counter(
+    "moon_leasing_duplicate_readings_total",
+    "Readings not inserted as they were already stored",
+)
+
 
 class SatelliteDB:
-    """CRUD operations for SatelliteStatusTable"""
+    """CRUD operations for SatelliteStatusTable, SatelliteRollupTable and SatelliteSketchTable
+
+    All operations are scoped to the readings of one satellite, `satellite_id`.
+    """
 
     count = 0
+    ROLLUP_RESOLUTIONS = (60, 60 * 60)  # Seconds: per minute and per hour
+    SKETCH_RESOLUTION = 60 * 60  # Seconds: per hour
 
-    def __init__(self, db_session: Optional[Session] = None):
+    def __init__(
+        self,
+        db_session: Optional[Session] = None,
+        satellite_id: str = DEFAULT_SATELLITE_ID,
+    ):
         self.db_session = db_session or async_session
+        self.satellite_id = satellite_id
+        self._own_status = SatelliteStatusTable.satellite_id == satellite_id
+        self._own_rollups = SatelliteRollupTable.satellite_id == satellite_id
+        self._own_sketches = SatelliteSketchTable.satellite_id == satellite_id
 
     @staticmethod
     def to_naive_datetime(date_str: Union[str, datetime]) -> datetime:
         """Convert given value to naive UTC datetime (time in UTC without timezone info)."""
         if isinstance(date_str, str):
-            date_obj = dateutil.parser.parse(date_str)
+            try:  # Fast path for ISO 8601, falling back to dateutil for other formats
+                if date_str.endswith("Z"):
+                    return datetime.fromisoformat(date_str[:-1])  # Already UTC
+                date_obj = datetime.fromisoformat(date_str)
+            except ValueError:
+                date_obj = dateutil.parser.parse(date_str)
         elif isinstance(date_str, datetime):
             date_obj = date_str
         else:
@@ -48,34 +95,378 @@ class SatelliteDB:
         self.__class__.count += 1
 
         last_updated = self.to_naive_datetime(last_updated)
-        os.environ[
-            "ins"
-        ] = f"{os.environ.get('ins')}\t {last_updated.minute % 10}:{last_updated.second}-{altitude}"
         status = SatelliteStatusTable(
-            last_updated=last_updated, altitude=altitude
+            satellite_id=self.satellite_id, last_updated=last_updated, altitude=altitude
         )  # , **_kwargs)
-        print("----> Creating: ", repr(status))
+        logger.debug(f"Creating {self.satellite_id} {last_updated} {altitude}")
         try:
-            added = self.db_session.add(status)
-            print(f"added: {added}")
-            flushed = await self.db_session.flush()
-            print(f"flushed: {flushed}")
-            os.environ["ins"] = f"{os.environ.get('ins')}+"
+            with DB_INSERT_SECONDS.time():
+                self.db_session.add(status)
+                await self.db_session.flush()
+                reading = Reading(last_updated, float(altitude))
+                await self.update_rollups([reading])
+                await self.update_sketches([reading])
         except IntegrityError as ex:
-            os.environ["ins"] = f"{os.environ.get('ins')}={ex}"
+            DUPLICATE_READINGS.inc()
             logger.info(f"Attempted duplicate insert ({ex})")
             # We attempted to insert same altitude reading twice. Ignoring
         except Exception as ex:
-            os.environ["ins"] = f"{os.environ.get('ins')}={type(ex)}:{ex}"
             logger.error(f"Error inserting {status} - {type(ex)}:{ex}")
         return status
 
+    async def insert_many(self, readings: Iterable[Reading]) -> List[Reading]:
+        """Insert readings with a batched INSERT, skipping already stored ones.
+
+        Returns the readings which were not stored yet, which are also added to the rollups
+        and sketches.
+        """
+        readings = list(readings)
+        with DB_INSERT_SECONDS.time():
+            inserted = await self._insert_new(readings)
+        DUPLICATE_READINGS.inc(len(readings) - len(inserted))
+        logger.debug(
+            f"Inserted {len(inserted)} of {len(readings)} {self.satellite_id} readings"
+        )
+        return inserted
+
+    async def _insert_new(self, readings: List[Reading]) -> List[Reading]:
+        new_readings: Dict[datetime, Reading] = {}
+        for reading in readings:
+            last_updated = self.to_naive_datetime(reading.last_updated)
+            new_readings.setdefault(
+                last_updated, Reading(last_updated, float(reading.altitude))
+            )
+        if not new_readings:
+            return []
+
+        await self._lock_readings()
+        query = await self.db_session.execute(
+            select(SatelliteStatusTable.last_updated)
+            .where(
+                self._own_status,
+                SatelliteStatusTable.last_updated >= min(new_readings),
+                SatelliteStatusTable.last_updated <= max(new_readings),
+            )
+            .with_for_update()
+        )
+        for last_updated in query.scalars():
+            new_readings.pop(last_updated, None)
+
+        retrieved = datetime.utcnow()
+        rows = [
+            dict(
+                satellite_id=self.satellite_id,
+                last_updated=item.last_updated,
+                altitude=item.altitude,
+                retrieved=retrieved,
+            )
+            for item in new_readings.values()
+        ]
+        if rows:  # One prepared statement, executed for every row
+            await self.db_session.execute(
+                self.insert_ignore(SatelliteStatusTable), rows
+            )
+        await self.update_rollups(new_readings.values())
+        await self.update_sketches(new_readings.values())
+        return list(new_readings.values())
+
+    async def _lock_readings(self):
+        """Keep other transactions from inserting readings of this satellite until this one
+        ends, so that those found not stored yet are exactly the ones inserted (and rolled
+        up).
+
+        SQLite: any write takes the database write lock. PostgreSQL: a transaction-level
+        advisory lock per satellite. MySQL/MariaDB: the SELECT ... FOR UPDATE of the
+        readings' range then locks the gaps in it too.
+        """
+        dialect = engine.sync_engine.dialect.name
+        if dialect == "sqlite":
+            table = SatelliteStatusTable.__table__
+            await self.db_session.execute(
+                update(table).where(false()).values(altitude=table.c.altitude)
+            )
+        elif dialect == "postgresql":
+            await self.db_session.execute(
+                select(func.pg_advisory_xact_lock(func.hashtext(self.satellite_id)))
+            )
+
+    async def update_rollups(self, readings: Iterable[Reading]):
+        """Add newly stored readings to the per-minute and per-hour rollups."""
+        buckets: Dict[Tuple[int, datetime], List[float]] = {}
+        for reading in readings:
+            for resolution in self.ROLLUP_RESOLUTIONS:
+                key = (resolution, floor_time(reading.last_updated, resolution))
+                bucket = buckets.setdefault(key, [reading.altitude] * 2 + [0.0, 0])
+                bucket[0] = min(bucket[0], reading.altitude)
+                bucket[1] = max(bucket[1], reading.altitude)
+                bucket[2] += reading.altitude
+                bucket[3] += 1
+        rows = [
+            dict(
+                satellite_id=self.satellite_id,
+                resolution=resolution,
+                bucket_start=bucket_start,
+                minimum=minimum,
+                maximum=maximum,
+                total=total,
+                count=count,
+            )
+            for (resolution, bucket_start), (
+                minimum,
+                maximum,
+                total,
+                count,
+            ) in buckets.items()
+        ]
+        if rows:
+            await self.db_session.execute(self.upsert_rollups(), rows)
+
+    async def update_sketches(self, readings: Iterable[Reading]):
+        """Add newly stored readings to the per-hour quantile sketches.
+
+        The sketches of the hours they fall in are read, locked until the end of the
+        transaction (where supported), updated and written back.
+        """
+        resolution = self.SKETCH_RESOLUTION
+        buckets: Dict[datetime, List[float]] = {}
+        for reading in readings:
+            key = floor_time(reading.last_updated, resolution)
+            buckets.setdefault(key, []).append(reading.altitude)
+        if not buckets:
+            return
+
+        table = SatelliteSketchTable.__table__
+        query = await self.db_session.execute(
+            select(table.c.id, table.c.bucket_start, table.c.sketch)
+            .where(
+                self._own_sketches,
+                table.c.resolution == resolution,
+                table.c.bucket_start.in_(list(buckets)),
+            )
+            .with_for_update()
+        )
+        stored = {bucket_start: (row_id, text) for row_id, bucket_start, text in query}
+        inserts, updates = [], []
+        for bucket_start, altitudes in buckets.items():
+            if bucket_start in stored:
+                row_id, text = stored[bucket_start]
+                sketch = QuantileSketch.from_json(text, Settings.SKETCH_MAX_BINS)
+                sketch.update(altitudes)
+                updates.append(dict(row_id=row_id, new_sketch=sketch.to_json()))
+            else:
+                sketch = self.new_sketch()
+                sketch.update(altitudes)
+                inserts.append(
+                    dict(
+                        satellite_id=self.satellite_id,
+                        resolution=resolution,
+                        bucket_start=bucket_start,
+                        sketch=sketch.to_json(),
+                    )
+                )
+        if inserts:
+            await self.db_session.execute(insert(table), inserts)
+        if updates:
+            await self.db_session.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(sketch=bindparam("new_sketch")),
+                updates,
+            )
+
+    @staticmethod
+    def new_sketch() -> QuantileSketch:
+        """An empty quantile sketch, of the configured accuracy."""
+        return QuantileSketch(
+            alpha=Settings.SKETCH_RELATIVE_ACCURACY, max_bins=Settings.SKETCH_MAX_BINS
+        )
+
+    async def backfill_rollups(self, chunk_size: int = 10000):
+        """Build the rollups from the stored readings when there are none (e.g. after an upgrade)."""
+        query = await self.db_session.execute(
+            select(func.count(SatelliteRollupTable.id)).where(self._own_rollups)
+        )
+        if not query.scalar():
+            async for readings in self._stored_readings(chunk_size):
+                await self.update_rollups(readings)
+
+    async def backfill_sketches(self, chunk_size: int = 10000):
+        """Build the sketches from the stored readings when there are none (e.g. after an upgrade)."""
+        query = await self.db_session.execute(
+            select(func.count(SatelliteSketchTable.id)).where(self._own_sketches)
+        )
+        if not query.scalar():
+            async for readings in self._stored_readings(chunk_size):
+                await self.update_sketches(readings)
+
+    async def _stored_readings(self, chunk_size: int) -> AsyncIterator[List[Reading]]:
+        """Yield all stored readings, `chunk_size` at a time, in the order stored."""
+        last_id = 0
+        while True:
+            query = await self.db_session.execute(
+                select(
+                    SatelliteStatusTable.id,
+                    SatelliteStatusTable.last_updated,
+                    SatelliteStatusTable.altitude,
+                )
+                .where(self._own_status, SatelliteStatusTable.id > last_id)
+                .order_by(SatelliteStatusTable.id)
+                .limit(chunk_size)
+            )
+            rows = query.all()
+            if not rows:
+                return
+            yield [Reading(row[1], row[2]) for row in rows]
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def upsert_rollups():
+        """INSERT statement merging its rows into existing SatelliteRollupTable buckets."""
+        table = SatelliteRollupTable.__table__
+        dialect = engine.sync_engine.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            module = sqlite if dialect == "sqlite" else postgresql
+            least, greatest = (
+                (func.min, func.max)
+                if dialect == "sqlite"
+                else (func.least, func.greatest)
+            )
+            statement = module.insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=[
+                    table.c.satellite_id,
+                    table.c.resolution,
+                    table.c.bucket_start,
+                ],
+                set_=dict(
+                    minimum=least(table.c.minimum, statement.excluded.minimum),
+                    maximum=greatest(table.c.maximum, statement.excluded.maximum),
+                    total=table.c.total + statement.excluded.total,
+                    count=table.c.count + statement.excluded.count,
+                ),
+            )
+        if dialect in ("mysql", "mariadb"):
+            statement = mysql.insert(table)
+            return statement.on_duplicate_key_update(
+                minimum=func.least(table.c.minimum, statement.inserted.minimum),
+                maximum=func.greatest(table.c.maximum, statement.inserted.maximum),
+                total=table.c.total + statement.inserted.total,
+                count=table.c.count + statement.inserted.count,
+            )
+        raise NotImplementedError(f"No INSERT ... update support for {dialect}")
+
+    @staticmethod
+    def insert_ignore(table):
+        """INSERT statement that does nothing on unique conflicts, in the engine's dialect."""
+        dialect = engine.sync_engine.dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing()
+        if dialect == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing()
+        if dialect in ("mysql", "mariadb"):
+            return insert(table).prefix_with("IGNORE")
+        raise NotImplementedError(f"No INSERT ... ignore support for {dialect}")
+
+    async def get_stats(
+        self, since: datetime
+    ) -> Tuple[Optional[float], Optional[float], float, int]:
+        """Minimum, maximum, sum and count of the altitudes since `since`.
+
+        Whole minutes and hours are read from the rollups, so only the readings of the
+        partial minute right after `since` are scanned.
+        """
+        minute, hour = self.ROLLUP_RESOLUTIONS
+        first_minute = ceil_time(since, minute)
+        first_hour = ceil_time(since, hour)
+        rollup = SatelliteRollupTable
+
+        rollup_query = select(
+            func.min(rollup.minimum),
+            func.max(rollup.maximum),
+            func.sum(rollup.total),
+            func.sum(rollup.count),
+        ).where(
+            self._own_rollups,
+            or_(
+                and_(
+                    rollup.resolution == minute,
+                    rollup.bucket_start >= first_minute,
+                    rollup.bucket_start < first_hour,
+                ),
+                and_(rollup.resolution == hour, rollup.bucket_start >= first_hour),
+            ),
+        )
+
+        parts = [
+            await self.get_raw_stats(since=since, until=first_minute),
+            (await self.db_session.execute(rollup_query)).one(),
+        ]
+        parts = [part for part in parts if part[3]]
+        return (
+            min((part[0] for part in parts), default=None),
+            max((part[1] for part in parts), default=None),
+            sum(part[2] for part in parts),
+            sum(part[3] for part in parts),
+        )
+
+    async def get_sketch(self, since: datetime) -> QuantileSketch:
+        """Quantile sketch of the altitudes since `since`.
+
+        The sketches of the whole hours are merged, so only the readings of the partial hour
+        right after `since` are scanned.
+        """
+        first_hour = ceil_time(since, self.SKETCH_RESOLUTION)
+        sketch = self.new_sketch()
+        query = await self.db_session.execute(
+            select(SatelliteStatusTable.altitude).where(
+                self._own_status,
+                SatelliteStatusTable.last_updated >= since,
+                SatelliteStatusTable.last_updated < first_hour,
+            )
+        )
+        sketch.update(query.scalars())
+        query = await self.db_session.execute(
+            select(SatelliteSketchTable.sketch).where(
+                self._own_sketches,
+                SatelliteSketchTable.resolution == self.SKETCH_RESOLUTION,
+                SatelliteSketchTable.bucket_start >= first_hour,
+            )
+        )
+        for text in query.scalars():
+            sketch.merge(QuantileSketch.from_json(text, Settings.SKETCH_MAX_BINS))
+        return sketch
+
+    async def stream_history(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        chunk_size: int = 1000,
+    ) -> AsyncIterator[List[Tuple[datetime, float]]]:
+        """Yield (last_updated, altitude) rows between `since` and `until`, oldest first.
+
+        Rows are streamed from a server side cursor in chunks of `chunk_size`.
+        """
+        query = select(
+            SatelliteStatusTable.last_updated, SatelliteStatusTable.altitude
+        ).where(self._own_status)
+        if since:
+            query = query.where(SatelliteStatusTable.last_updated >= since)
+        if until:
+            query = query.where(SatelliteStatusTable.last_updated < until)
+        result = await self.db_session.stream(
+            query.order_by(SatelliteStatusTable.last_updated).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        async for partition in result.partitions(chunk_size):
+            yield partition
+
     async def get_all(self) -> List[SatelliteStatusTable]:
         """Retrieve all records from SatelliteStatusTable."""
         query = await self.db_session.execute(
-            select(SatelliteStatusTable).order_by(
-                desc(SatelliteStatusTable.last_updated)
-            )
+            select(SatelliteStatusTable)
+            .where(self._own_status)
+            .order_by(desc(SatelliteStatusTable.last_updated))
         )
         return query.scalars().all()
 
@@ -88,10 +479,9 @@ class SatelliteDB:
             return await self.get_all()
 
         dt_since = datetime.utcnow() - timedelta(minutes=minutes)
-        os.environ["get_latest"] = str(dt_since)
         query = await self.db_session.execute(
             select(SatelliteStatusTable)
-            .where(SatelliteStatusTable.last_updated >= dt_since)
+            .where(self._own_status, SatelliteStatusTable.last_updated >= dt_since)
             .order_by(desc(SatelliteStatusTable.last_updated))
         )
         return query.scalars().all()
@@ -103,10 +493,10 @@ class SatelliteDB:
         minutes = max(minutes, 1)
 
         dt_since = datetime.utcnow() - timedelta(minutes=minutes)
-        os.environ["get_last_below"] = str(dt_since)
         query = await self.db_session.execute(
             select(SatelliteStatusTable)
             .where(
+                self._own_status,
                 SatelliteStatusTable.last_updated >= dt_since,
                 SatelliteStatusTable.altitude < threshold,
             )
@@ -124,6 +514,7 @@ class SatelliteDB:
         query = await self.db_session.execute(
             select(SatelliteStatusTable)
             .where(
+                self._own_status,
                 SatelliteStatusTable.last_updated >= dt_since,
                 SatelliteStatusTable.altitude >= threshold,
             )
@@ -134,12 +525,138 @@ class SatelliteDB:
     async def get_last_one(self) -> List[SatelliteStatusTable]:
         """Retrieve the most recent record."""
         query = await self.db_session.execute(
-            select(SatelliteStatusTable).order_by(
-                desc(SatelliteStatusTable.last_updated)
-            )
+            select(SatelliteStatusTable)
+            .where(self._own_status)
+            .order_by(desc(SatelliteStatusTable.last_updated))
         )
         return query.scalars().first()
 
+    # Column projection reads: rows come back as plain tuples, without building ORM
+    # entities, and aggregates are computed by the DB.
+
+    async def get_latest_readings(self, minutes: Optional[float] = 5) -> List[Reading]:
+        """Readings from the last few minutes (default=5; all if falsy), newest first."""
+        query = select(
+            SatelliteStatusTable.last_updated, SatelliteStatusTable.altitude
+        ).where(self._own_status)
+        if minutes and minutes > 0:
+            dt_since = datetime.utcnow() - timedelta(minutes=minutes)
+            query = query.where(SatelliteStatusTable.last_updated >= dt_since)
+        result = await self.db_session.execute(
+            query.order_by(desc(SatelliteStatusTable.last_updated))
+        )
+        return list(map(Reading._make, result))
+
+    async def get_readings_after(self, after: datetime) -> List[Reading]:
+        """Readings with `last_updated` after `after`, oldest first."""
+        result = await self.db_session.execute(
+            select(SatelliteStatusTable.last_updated, SatelliteStatusTable.altitude)
+            .where(self._own_status, SatelliteStatusTable.last_updated > after)
+            .order_by(SatelliteStatusTable.last_updated)
+        )
+        return list(map(Reading._make, result))
+
+    async def get_last_reading(self) -> Optional[Reading]:
+        """The most recent reading."""
+        result = await self.db_session.execute(
+            select(SatelliteStatusTable.last_updated, SatelliteStatusTable.altitude)
+            .where(self._own_status)
+            .order_by(desc(SatelliteStatusTable.last_updated))
+            .limit(1)
+        )
+        row = result.first()
+        return Reading._make(row) if row else None
+
+    async def get_nth_latest_time(self, count: int) -> Optional[datetime]:
+        """Time of the `count`th most recent reading, the oldest of the latest `count` (None
+        if there are fewer)."""
+        result = await self.db_session.execute(
+            select(SatelliteStatusTable.last_updated)
+            .where(self._own_status)
+            .order_by(desc(SatelliteStatusTable.last_updated))
+            .offset(count - 1)
+            .limit(1)
+        )
+        return result.scalar()
+
+    async def get_raw_stats(
+        self, since: datetime, until: Optional[datetime] = None
+    ) -> Tuple[Optional[float], Optional[float], Optional[float], int]:
+        """Minimum, maximum, sum and count of the stored altitudes from `since` to `until`."""
+        query = select(
+            func.min(SatelliteStatusTable.altitude),
+            func.max(SatelliteStatusTable.altitude),
+            func.sum(SatelliteStatusTable.altitude),
+            func.count(SatelliteStatusTable.altitude),
+        ).where(self._own_status, SatelliteStatusTable.last_updated >= since)
+        if until:
+            query = query.where(SatelliteStatusTable.last_updated < until)
+        return tuple((await self.db_session.execute(query)).one())
+
+    async def any_below(self, threshold: float, since: datetime) -> bool:
+        """Whether any altitude below `threshold` was stored since `since`."""
+        query = select(
+            exists().where(
+                self._own_status,
+                SatelliteStatusTable.last_updated >= since,
+                SatelliteStatusTable.altitude < threshold,
+            )
+        )
+        return bool((await self.db_session.execute(query)).scalar())
+
+    # Retention: old rows are deleted a bounded chunk at a time, oldest first.
+
+    @staticmethod
+    async def get_satellite_ids(db_session: Session) -> List[str]:
+        """Ids of all satellites with stored readings or rollups."""
+        query = await db_session.execute(
+            union(
+                select(SatelliteStatusTable.satellite_id).distinct(),
+                select(SatelliteRollupTable.satellite_id).distinct(),
+            )
+        )
+        return query.scalars().all()
+
+    async def delete_readings_before(self, before: datetime, limit: int) -> int:
+        """Delete up to `limit` of the oldest readings stored before `before`. Returns how many."""
+        query = await self.db_session.execute(
+            select(SatelliteStatusTable.id)
+            .where(self._own_status, SatelliteStatusTable.last_updated < before)
+            .order_by(SatelliteStatusTable.last_updated)
+            .limit(limit)
+        )
+        ids = query.scalars().all()
+        if ids:
+            await self.db_session.execute(
+                delete(SatelliteStatusTable)
+                .where(SatelliteStatusTable.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+        return len(ids)
+
+    async def delete_rollups_before(
+        self, resolution: int, before: datetime, limit: int
+    ) -> int:
+        """Delete up to `limit` of the oldest `resolution` rollups starting before `before`."""
+        query = await self.db_session.execute(
+            select(SatelliteRollupTable.id)
+            .where(
+                self._own_rollups,
+                SatelliteRollupTable.resolution == resolution,
+                SatelliteRollupTable.bucket_start < before,
+            )
+            .order_by(SatelliteRollupTable.bucket_start)
+            .limit(limit)
+        )
+        ids = query.scalars().all()
+        if ids:
+            await self.db_session.execute(
+                delete(SatelliteRollupTable)
+                .where(SatelliteRollupTable.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+        return len(ids)
+
     # async def update_entry(self, id: int, last_updated: Union[str, datetime] = "",
     #                        altitude: str = "", **kwargs):
     # """Update..."""
@@ -150,3 +667,14 @@ class SatelliteDB:
     #         q = q.values(altitude=altitude)
     #     q.execution_options(synchronize_session="fetch")
     #     await  self.db_session.execute(q)
+
+
+def floor_time(dt: datetime, seconds: int) -> datetime:
+    """Start of the `seconds` long time bucket containing `dt`."""
+    return dt - (dt - datetime.min) % timedelta(seconds=seconds)
+
+
+def ceil_time(dt: datetime, seconds: int) -> datetime:
+    """Start of the first `seconds` long time bucket starting at or after `dt`."""
+    floor = floor_time(dt, seconds)
+    return floor if floor == dt else floor + timedelta(seconds=seconds)
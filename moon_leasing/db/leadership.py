@@ -0,0 +1,122 @@
+"""Leader election among the processes (e.g. uvicorn workers) sharing the DB.
+
+The leader holds a lease row in the DB, which it renews well before it expires. Taking or
+renewing the lease is a single conditional UPDATE (or INSERT of the first lease), so at
+most one process holds an unexpired lease. When the leader stops, it releases the lease;
+when it dies or stalls, another process takes over once the lease expires.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import or_, update
+
+from moon_leasing.db.config import async_session
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.models.lease import LeaseTable
+from moon_leasing.metrics import Counter
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+LEADERSHIP_CHANGES = Counter(
+    "moon_leasing_leadership_changes_total",
+    "Times this process became leader or follower",
+    ["role"],
+)
+
+
+class LeaderElection:
+    """Campaigns for the lease `name`, valid `lease_seconds` once taken or renewed.
+
+    `campaign` is meant to run every few seconds, well within `lease_seconds`.
+    `on_change(is_leader)` is awaited whenever this process becomes leader or follower.
+    """
+
+    def __init__(
+        self,
+        name: str = "poller",
+        lease_seconds: float = 15,
+        on_change: Optional[Callable[[bool], Awaitable[None]]] = None,
+        holder: Optional[str] = None,
+    ):
+        self.name = name
+        self.lease = timedelta(seconds=lease_seconds)
+        self.on_change = on_change
+        self.holder = (
+            holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.is_leader = False
+        self.expires_at: Optional[datetime] = None  # Of the lease held
+
+    async def campaign(self, now: Optional[datetime] = None) -> bool:
+        """Take or renew the lease if possible. Returns whether this process leads.
+
+        If the DB can't be reached, the leader stays so until its lease expires.
+        """
+        now = now or datetime.utcnow()
+        try:
+            acquired = await self._acquire(now)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.warning(f"Lease {self.name} campaign failed: {ex}")
+            acquired = (
+                self.is_leader and self.expires_at is not None and now < self.expires_at
+            )
+        else:
+            self.expires_at = now + self.lease if acquired else None
+        await self._set_leader(acquired)
+        return acquired
+
+    async def resign(self):
+        """Release the lease, if held, so that another process takes over right away."""
+        if self.is_leader:
+            try:
+                async with async_session() as session:
+                    async with session.begin():
+                        await session.execute(
+                            update(LeaseTable)
+                            .where(
+                                LeaseTable.name == self.name,
+                                LeaseTable.holder == self.holder,
+                            )
+                            .values(expires_at=datetime.utcnow())
+                        )
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.warning(f"Lease {self.name} release failed: {ex}")
+        self.expires_at = None
+        await self._set_leader(False)
+
+    async def _acquire(self, now: datetime) -> bool:
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(LeaseTable)
+                    .where(
+                        LeaseTable.name == self.name,
+                        or_(
+                            LeaseTable.holder == self.holder,
+                            LeaseTable.expires_at < now,
+                        ),
+                    )
+                    .values(holder=self.holder, expires_at=now + self.lease)
+                )
+                if result.rowcount:
+                    return True
+                result = await session.execute(
+                    SatelliteDB.insert_ignore(LeaseTable.__table__).values(
+                        name=self.name, holder=self.holder, expires_at=now + self.lease
+                    )
+                )
+                return bool(result.rowcount)
+
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        role = "leader" if is_leader else "follower"
+        LEADERSHIP_CHANGES.labels(role).inc()
+        logger.info(f"{self.holder} is now {role} for {self.name}")
+        if self.on_change is not None:
+            await self.on_change(is_leader)
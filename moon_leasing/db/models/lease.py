@@ -0,0 +1,17 @@
+"""DB table of the leases electing a leader among the processes sharing the DB."""
+from sqlalchemy import Column, DateTime, String
+
+from moon_leasing.db.config import Base
+
+
+class LeaseTable(Base):  # pylint: disable=too-few-public-methods
+    """The `holder` of the lease `name` until `expires_at`."""
+
+    __tablename__ = "lease"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return str(self.__dict__)
@@ -1,16 +1,43 @@
 """DB table to keep Satellite's altitude updates."""
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, DateTime, Float
+from sqlalchemy import (
+    Column,
+    Integer,
+    DateTime,
+    Float,
+    Index,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    event,
+    text,
+)
 
 from moon_leasing.db.config import Base
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+DEFAULT_SATELLITE_ID = "default"
 
 
 class SatelliteStatusTable(Base):
     __tablename__ = "satellite_status"
+    __table_args__ = (
+        Index(
+            "ix_satellite_status_satellite_id_last_updated",
+            "satellite_id",
+            "last_updated",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
-    last_updated = Column(DateTime, nullable=False, index=True, unique=True)
+    satellite_id = Column(String(64), nullable=False, default=DEFAULT_SATELLITE_ID)
+    last_updated = Column(DateTime, nullable=False)
     altitude = Column(Float, nullable=False)
     # retrieved = Column(DateTime(timezone=False), onupdate=func.now())
     # retrieved = Column(DateTime(timezone=False), onupdate=func.current_timestamp())
@@ -27,3 +54,65 @@ class SatelliteStatusTable(Base):
                 f"----> (Updated {since.total_seconds()//60}:{since.total_seconds()%60:5.2f} ago)"
             )
         )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_status_table(_metadata, connection, **_kwargs):
+    """Upgrade a satellite_status table from before there were several satellites, which
+    `create_all` leaves as is: add its satellite_id column (its readings being those of
+    the default satellite) and swap its unique index on last_updated for the one on
+    (satellite_id, last_updated)."""
+    table = SatelliteStatusTable.__table__
+    stored = Table(table.name, MetaData(), autoload_with=connection)
+    if "satellite_id" in stored.c:
+        return
+    logger.warning(f"Migrating {table.name}: adding satellite_id")
+    column = table.c.satellite_id
+    connection.execute(
+        text(
+            f"ALTER TABLE {table.name} ADD COLUMN {column.name}"
+            f" {column.type.compile(dialect=connection.dialect)} NOT NULL"
+            f" DEFAULT '{DEFAULT_SATELLITE_ID}'"
+        )
+    )
+    for index in stored.indexes:
+        if [item.name for item in index.columns] == ["last_updated"]:
+            index.drop(connection)
+    for index in table.indexes:
+        index.create(connection)
+
+
+class SatelliteRollupTable(Base):  # pylint: disable=too-few-public-methods
+    """Altitude min/max/sum/count per time bucket of `resolution` seconds."""
+
+    __tablename__ = "satellite_rollup"
+    __table_args__ = (UniqueConstraint("satellite_id", "resolution", "bucket_start"),)
+
+    id = Column(Integer, primary_key=True)
+    satellite_id = Column(String(64), nullable=False, default=DEFAULT_SATELLITE_ID)
+    resolution = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    total = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class SatelliteSketchTable(Base):  # pylint: disable=too-few-public-methods
+    """Quantile sketch (see `moon_leasing.sketch`) of the altitudes per time bucket of
+    `resolution` seconds, as JSON."""
+
+    __tablename__ = "satellite_sketch"
+    __table_args__ = (UniqueConstraint("satellite_id", "resolution", "bucket_start"),)
+
+    id = Column(Integer, primary_key=True)
+    satellite_id = Column(String(64), nullable=False, default=DEFAULT_SATELLITE_ID)
+    resolution = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    sketch = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return str(self.__dict__)
@@ -0,0 +1,120 @@
+"""Retention of old readings, run as a scheduled job.
+
+Raw readings are downsampled into per-minute and per-hour rollups as they are written,
+so old raw rows, and later old per-minute rollups, can be deleted without losing the
+long-window stats; only their resolution gets coarser. Per-hour quantile sketches keep
+the long-window percentiles. Rows are deleted a bounded chunk per transaction and, on
+SQLite, the freed pages are reclaimed incrementally.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from moon_leasing.db.config import async_session, engine, read_session
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+
+class RetentionPolicy:
+    """Deletes raw readings older than `raw_days` and per-minute rollups older than
+    `minute_rollup_days` (0 keeps them forever); per-hour rollups and sketches are always
+    kept.
+
+    Raw readings younger than `min_raw_minutes` are never deleted, as they are needed
+    to warm up the in-memory buffer and window aggregates.
+    """
+
+    def __init__(
+        self,
+        raw_days: float = 30,
+        minute_rollup_days: float = 365,
+        chunk_size: int = 500,
+        vacuum_pages: int = 1000,
+        min_raw_minutes: float = 0,
+    ):
+        self.raw_age = (
+            max(timedelta(days=raw_days), timedelta(minutes=min_raw_minutes))
+            if raw_days
+            else None
+        )
+        self.minute_rollup_age = (
+            timedelta(days=minute_rollup_days) if minute_rollup_days else None
+        )
+        self.chunk_size = chunk_size
+        self.vacuum_pages = vacuum_pages
+
+    async def run(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Apply the policy to every satellite. Returns how many rows were deleted."""
+        now = now or datetime.utcnow()
+        minute, _hour = SatelliteDB.ROLLUP_RESOLUTIONS
+        deleted = dict(readings=0, rollups=0)
+        async with read_session() as session:
+            satellite_ids = await SatelliteDB.get_satellite_ids(session)
+
+        for satellite_id in satellite_ids:
+            if self.raw_age:
+                before = now - self.raw_age
+                deleted["readings"] += await self._delete_in_chunks(
+                    satellite_id,
+                    lambda db, before=before: db.delete_readings_before(
+                        before, limit=self.chunk_size
+                    ),
+                )
+            if self.minute_rollup_age:
+                before = now - self.minute_rollup_age
+                deleted["rollups"] += await self._delete_in_chunks(
+                    satellite_id,
+                    lambda db, before=before: db.delete_rollups_before(
+                        minute, before, limit=self.chunk_size
+                    ),
+                )
+
+        if any(deleted.values()):
+            logger.info(f"Retention deleted {deleted}")
+            await self.vacuum()
+        return deleted
+
+    async def _delete_in_chunks(
+        self, satellite_id: str, delete_chunk: Callable[[SatelliteDB], Awaitable[int]]
+    ) -> int:
+        """Call `delete_chunk` in a transaction of its own until it deletes a partial chunk."""
+        total = 0
+        while True:
+            async with async_session() as session:
+                async with session.begin():
+                    db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+                    deleted = await delete_chunk(db)
+            total += deleted
+            if deleted < self.chunk_size:
+                return total
+            await asyncio.sleep(0)  # Let waiting writers in between chunks
+
+    async def vacuum(self):
+        """Return up to `vacuum_pages` free pages to the filesystem (SQLite only)."""
+        if engine.sync_engine.dialect.name != "sqlite" or not self.vacuum_pages:
+            return
+        async with engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            # executescript steps the pragma to completion, execute frees a single page
+            await raw.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});"
+            )
+
+
+async def check_auto_vacuum():
+    """Warn if the SQLite DB is not in incremental auto-vacuum mode.
+
+    New DBs are created in that mode (see `sqlite_pragmas`), an existing DB keeps its
+    mode until a one-off full VACUUM is run.
+    """
+    if engine.sync_engine.dialect.name != "sqlite":
+        return
+    async with engine.connect() as conn:
+        mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+    if mode != 2:
+        logger.warning(
+            "SQLite auto_vacuum is not INCREMENTAL: run VACUUM once to reclaim the space"
+            " freed by the retention job"
+        )
@@ -0,0 +1,118 @@
+"""Write-behind queue persisting readings to the DB in batches."""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.models.satellite import DEFAULT_SATELLITE_ID
+from moon_leasing.metrics import Counter
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+DROPPED_READINGS = Counter(
+    "moon_leasing_dropped_readings_total",
+    "Readings dropped unwritten, the oldest first, while the DB was failing",
+)
+
+
+class WriteBehindQueue:
+    """Collects readings of any satellite and writes them in one transaction, with a
+    batched, conflict-ignoring insert per satellite.
+
+    A batch is flushed when `batch_size` readings are pending, every `flush_interval`
+    seconds once started, and on stop. A batch that fails to be written is kept for the
+    next flush, up to `max_pending` readings (the oldest are dropped beyond); until a
+    flush succeeds again, only the periodic flush retries.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+        max_pending: int = 10000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.failing = False  # Whether the last flush failed
+        self._pending: List[Tuple[str, Reading]] = []
+        self._task: Optional[asyncio.Future] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def put(self, reading: Reading, satellite_id: str = DEFAULT_SATELLITE_ID):
+        """Queue a reading for writing, flushing if the batch is full (unless failing).
+
+        Never raises: a failed flush is logged and left to the periodic flush.
+        """
+        self._pending.append((satellite_id, reading))
+        if len(self._pending) >= self.batch_size and not self.failing:
+            try:
+                await self.flush()
+            except Exception as ex:
+                logger.error(f"Error flushing {len(self)} readings - {type(ex)}:{ex}")
+        self._drop_oldest()
+
+    async def flush(self) -> int:
+        """Write all pending readings. Returns how many were written."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        by_satellite: Dict[str, List[Reading]] = {}
+        for satellite_id, reading in batch:
+            by_satellite.setdefault(satellite_id, []).append(reading)
+        try:
+            async with async_session() as session:
+                async with session.begin():
+                    for satellite_id, readings in by_satellite.items():
+                        db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+                        await db.insert_many(readings)
+        except Exception:
+            self._pending[:0] = batch
+            self.failing = True
+            self._drop_oldest()
+            raise
+        self.failing = False
+        logger.debug(f"Flushed {len(batch)} readings")
+        return len(batch)
+
+    def _drop_oldest(self):
+        """Drop the oldest pending readings beyond `max_pending`."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            DROPPED_READINGS.inc(excess)
+            logger.warning(f"Dropped {excess} unwritten readings")
+
+    def clear(self, satellite_id: Optional[str] = None):
+        """Drop the pending readings (of one satellite if given) without writing them."""
+        self._pending = [
+            item for item in self._pending if satellite_id not in (None, item[0])
+        ]
+
+    def start(self):
+        """Start flushing every `flush_interval` seconds."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as ex:
+                logger.error(f"Error flushing {len(self)} readings - {type(ex)}:{ex}")
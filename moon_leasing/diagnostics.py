@@ -0,0 +1,64 @@
+"""Non-blocking logging: records are queued by the logging calls and handled, by the stream
+handler and an in-memory ring buffer of recent records, in a listener thread."""
+import atexit
+import logging
+import queue
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Deque, List, Optional, Union
+
+
+def level_number(level: Union[int, str]) -> int:
+    """Numeric value of a logging level given by name or number."""
+    if isinstance(level, int):
+        return level
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError(f"Unknown logging level: {level}")
+    return number
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last `capacity` log records in memory, as dicts."""
+
+    def __init__(self, capacity: int = 1000, level: Union[int, str] = logging.NOTSET):
+        super().__init__(level_number(level))
+        self.buffer: Deque[dict] = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord):
+        self.buffer.append(
+            dict(
+                time=datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+                level=record.levelname,
+                levelno=record.levelno,
+                logger=record.name,
+                message=record.getMessage(),
+            )
+        )
+
+    def get_records(
+        self, limit: Optional[int] = None, level: Union[int, str] = logging.NOTSET
+    ) -> List[dict]:
+        """The last `limit` (all if None) records at `level` or above, oldest first."""
+        levelno = level_number(level)
+        records = [item for item in list(self.buffer) if item["levelno"] >= levelno]
+        return records[-limit:] if limit else records
+
+
+def start_queue_logging(logger: logging.Logger, *handlers: logging.Handler):
+    """Route the records of `logger` through a queue to `handlers`, in a listener thread.
+
+    Returns the started `QueueListener`, which is stopped at exit.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    @atexit.register
+    def stop():
+        if listener._thread is not None:  # pylint: disable=protected-access
+            listener.stop()
+
+    return listener
@@ -0,0 +1,75 @@
+"""Health of a satellite, from its altitude readings, evaluated in constant time."""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from moon_leasing.cache import Reading
+
+
+class HealthMonitor:
+    """Health state machine, advanced by each reading.
+
+    - "missing": no reading within `critical_window`,
+    - "critical": a reading below `critical_altitude` within `critical_window`,
+    - "warning": recovering, with a reading below `critical_altitude` within
+      `recovery_window`,
+    - "ok": otherwise.
+
+    The window minimum is below `critical_altitude` exactly when the last reading below it
+    is within the window, so only the times of the newest reading and of the newest
+    reading below `critical_altitude` are kept: adding a reading and getting the state
+    are O(1).
+    """
+
+    def __init__(
+        self,
+        critical_altitude: float = 160,
+        critical_window: timedelta = timedelta(minutes=1),
+        recovery_window: timedelta = timedelta(minutes=2),
+    ):
+        self.critical_altitude = critical_altitude
+        self.critical_window = critical_window
+        self.recovery_window = max(recovery_window, critical_window)
+        self.latest: Optional[datetime] = None
+        self.last_below: Optional[datetime] = None
+
+    def add(self, reading: Reading):
+        """Account for a reading, in any order."""
+        if self.latest is None or reading.last_updated > self.latest:
+            self.latest = reading.last_updated
+        if reading.altitude < self.critical_altitude and (
+            self.last_below is None or reading.last_updated > self.last_below
+        ):
+            self.last_below = reading.last_updated
+
+    def state(self, now: datetime) -> str:
+        """The health state at `now`: "missing", "critical", "warning" or "ok"."""
+        if self.latest is None or self.latest < now - self.critical_window:
+            return "missing"
+        if self.last_below is None or self.last_below < now - self.recovery_window:
+            return "ok"
+        if self.last_below < now - self.critical_window:
+            return "warning"
+        return "critical"
+
+    def next_transition(self, now: datetime) -> Optional[datetime]:
+        """When the state may change next with no new reading, as the readings leave the
+        windows (at or after `now`); None if it can't, "missing" lasting until one."""
+        if self.latest is None:
+            return None
+        missing_at = self.latest + self.critical_window
+        candidates = [missing_at]
+        if self.last_below is not None:
+            candidates += [
+                item
+                for item in (
+                    self.last_below + self.critical_window,
+                    self.last_below + self.recovery_window,
+                )
+                if item < missing_at
+            ]
+        return min((item for item in candidates if item >= now), default=None)
+
+    def clear(self):
+        """Forget all readings."""
+        self.latest = None
+        self.last_below = None
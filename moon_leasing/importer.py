@@ -0,0 +1,234 @@
+"""Bulk import of historical readings, from CSV or NDJSON (as exported by /history).
+
+Lines are parsed a batch at a time, vectorized with numpy: ISO 8601 UTC timestamps (with
+or without a "Z") and the altitudes each as one array. Unless some row isn't one, then
+parsed row by row, like `SatelliteDB.to_naive_datetime` (dateutil parsing the others).
+Each batch is written in one transaction, skipping the readings already stored.
+
+    python -m moon_leasing.importer readings.csv [--satellite default] [--format csv]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import sys
+import time
+import warnings
+from datetime import datetime
+from itertools import repeat
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session, create_tables, dispose_engines
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.models.satellite import DEFAULT_SATELLITE_ID
+from moon_leasing.metrics import Counter
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+IMPORTED_READINGS = Counter(
+    "moon_leasing_imported_readings_total",
+    "Readings read by bulk imports, by result (inserted, duplicate or rejected)",
+    ["result"],
+)
+
+FORMATS = ("csv", "ndjson")
+
+
+def parse_readings(rows: List[Tuple[Any, Any]]) -> Tuple[List[Reading], int]:
+    """Readings of (last_updated, altitude) rows. Returns them and how many were invalid."""
+    try:
+        times = parse_times([row[0] for row in rows])
+        altitudes = np.array([row[1] for row in rows], dtype=np.float64)
+        if np.isfinite(altitudes).all():
+            pairs = zip(times.astype(datetime).tolist(), altitudes.tolist())
+            # Built as tuples, skipping the namedtuple's Python-level __new__
+            return list(map(tuple.__new__, repeat(Reading), pairs)), 0
+    except (TypeError, ValueError, OverflowError, Warning):
+        pass
+
+    to_datetime = SatelliteDB.to_naive_datetime
+    readings = []  # Some row is invalid, or not ISO 8601 UTC: parse them one by one
+    for last_updated, altitude in rows:
+        try:
+            reading = Reading(to_datetime(last_updated), float(altitude))
+        except (TypeError, ValueError, OverflowError):
+            continue
+        if math.isfinite(reading.altitude):
+            readings.append(reading)
+    return readings, len(rows) - len(readings)
+
+
+def parse_times(values: List[Any]) -> np.ndarray:
+    """Datetimes (datetime64[us]) of ISO 8601 UTC strings, with or without a "Z", all at
+    once. Raises ValueError (or a Warning, for a UTC offset) if any isn't one."""
+    utc = [value[:-1] if value[-1:] == "Z" else value for value in values]
+    if not all(isinstance(value, str) and value[:4].isdigit() for value in utc):
+        raise ValueError("Not all dates")  # Nor "now" or "today", as numpy parses them
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # Time zones are parsed with a warning
+        times = np.array(utc, dtype="datetime64[us]")
+    if np.isnat(times).any():
+        raise ValueError("Missing time")
+    return times
+
+
+class ReadingImporter:  # pylint: disable=too-many-instance-attributes
+    """Imports the readings of a satellite from lines of CSV (with a header naming the
+    `last_updated` and `altitude` columns, or just these two) or NDJSON, fed in any number
+    of parts.
+
+    Readings are written `batch_size` at a time, `on_insert` being called with those which
+    were not stored yet.
+    """
+
+    def __init__(
+        self,
+        satellite_id: str = DEFAULT_SATELLITE_ID,
+        fmt: str = "csv",
+        batch_size: int = 50000,
+        on_insert: Optional[Callable[[List[Reading]], None]] = None,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.satellite_id = satellite_id
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.on_insert = on_insert
+        self.read = self.inserted = self.rejected = 0
+        self._rows: List[Tuple[Any, Any]] = []
+        self._columns: Optional[Tuple[int, int]] = None  # Of the CSV
+
+    @property
+    def result(self) -> dict:
+        """How many readings were read, inserted, already stored or rejected."""
+        return dict(
+            read=self.read,
+            inserted=self.inserted,
+            duplicates=self.read - self.inserted - self.rejected,
+            rejected=self.rejected,
+        )
+
+    async def feed(self, lines: Iterable[str]):
+        """Import lines (the last ones may be written on `close`)."""
+        lines = [line for line in lines if line.strip()]
+        if self.fmt == "csv":
+            self._rows.extend(self._csv_rows(lines))
+        else:
+            self._rows.extend(self._ndjson_rows(lines))
+        while len(self._rows) >= self.batch_size:
+            rows = self._rows[: self.batch_size]
+            del self._rows[: self.batch_size]
+            await self._write(rows)
+
+    async def close(self) -> dict:
+        """Write the remaining readings. Returns the `result`."""
+        rows, self._rows = self._rows, []
+        if rows:
+            await self._write(rows)
+        return self.result
+
+    def _csv_rows(self, lines: List[str]) -> Iterable[Tuple[Any, Any]]:
+        rows = csv.reader(lines)
+        if self._columns is None:
+            header = next(rows, None)
+            if header is None:
+                return []
+            names = [name.strip().lower() for name in header]
+            if "last_updated" in names and "altitude" in names:
+                self._columns = (names.index("last_updated"), names.index("altitude"))
+            else:  # No header
+                self._columns = (0, 1)
+                rows = csv.reader(lines)
+        time_column, altitude_column = self._columns
+        last = max(self._columns)
+        return [
+            (row[time_column], row[altitude_column])
+            if len(row) > last
+            else (None, None)
+            for row in rows
+        ]
+
+    @staticmethod
+    def _ndjson_rows(lines: List[str]) -> Iterable[Tuple[Any, Any]]:
+        rows = []
+        for line in lines:
+            try:
+                item = json.loads(line)
+                rows.append((item.get("last_updated"), item.get("altitude")))
+            except (ValueError, AttributeError):
+                rows.append((None, None))
+        return rows
+
+    async def _write(self, rows: List[Tuple[Any, Any]]):
+        readings, rejected = parse_readings(rows)
+        async with async_session() as session:
+            async with session.begin():
+                db = SatelliteDB(db_session=session, satellite_id=self.satellite_id)
+                inserted = await db.insert_many(readings)
+        self.read += len(rows)
+        self.rejected += rejected
+        self.inserted += len(inserted)
+        IMPORTED_READINGS.labels("inserted").inc(len(inserted))
+        IMPORTED_READINGS.labels("duplicate").inc(len(readings) - len(inserted))
+        IMPORTED_READINGS.labels("rejected").inc(rejected)
+        logger.info(
+            f"Imported {len(inserted)} of {len(rows)} {self.satellite_id} readings"
+            f" ({self.read} read so far)"
+        )
+        if inserted and self.on_insert is not None:
+            self.on_insert(inserted)
+
+
+async def import_file(
+    path: str, satellite_id: str, fmt: str, batch_size: int, read_size: int = 1 << 20
+) -> dict:
+    """Import the readings in a file ("-" for stdin), reading about `read_size` characters
+    at a time. Returns the importer's result."""
+    importer = ReadingImporter(satellite_id, fmt=fmt, batch_size=batch_size)
+    file = (
+        sys.stdin
+        if path == "-"
+        else open(path, encoding="utf-8")  # pylint: disable=consider-using-with
+    )
+    try:
+        await create_tables()
+        while True:
+            lines = file.readlines(read_size)
+            if not lines:
+                break
+            await importer.feed(lines)
+        return await importer.close()
+    finally:
+        if file is not sys.stdin:
+            file.close()
+        await dispose_engines()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Import a file given on the command line, printing the result as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help='CSV or NDJSON file, "-" for stdin')
+    parser.add_argument("--satellite", default=DEFAULT_SATELLITE_ID)
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="Default: from the file extension (.ndjson or .jsonl), else csv",
+    )
+    parser.add_argument("--batch-size", type=int, default=Settings.IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    fmt = args.format or (
+        "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+    )
+    started = time.perf_counter()
+    result = asyncio.run(import_file(args.path, args.satellite, fmt, args.batch_size))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
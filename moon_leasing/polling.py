@@ -0,0 +1,157 @@
+"""Adaptive polling of an upstream feed, timed on its publish cadence.
+
+The cadence is learned from the successive `last_updated` values the feed publishes, so
+each poll is made just after the next update is expected, instead of at a fixed interval
+unrelated to it. Polls that find nothing new are retried sooner, then less and less
+often, and failing polls back off exponentially, with jitter.
+"""
+import asyncio
+import random
+import statistics
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Optional
+
+from moon_leasing.cache import Reading
+from moon_leasing.metrics import Counter
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+POLLS = Counter(
+    "moon_leasing_polls_total",
+    "Scheduled polls, by satellite and result (new, unchanged or error)",
+    ["satellite", "result"],
+)
+
+
+class PublishCadence:
+    """When the feed publishes, learned from the last `samples` readings seen.
+
+    The interval is the median of the intervals between successive readings (robust to the
+    odd missed or late one), and the lag the smallest delay from a reading's `last_updated`
+    to when it was seen, which includes any clock offset from upstream.
+    """
+
+    def __init__(self, samples: int = 8):
+        self.last_updated: Optional[datetime] = None
+        self._intervals: Deque[float] = deque(maxlen=samples)
+        self._lags: Deque[float] = deque(maxlen=samples)
+
+    @property
+    def interval(self) -> Optional[float]:
+        """Seconds between upstream updates (None until two were seen)."""
+        return statistics.median(self._intervals) if self._intervals else None
+
+    @property
+    def lag(self) -> float:
+        """Seconds from an update's `last_updated` until it can be seen."""
+        return min(self._lags, default=0.0)
+
+    def observe(self, last_updated: datetime, seen_at: datetime) -> bool:
+        """Account for the reading published at `last_updated`, seen at `seen_at`.
+
+        Returns whether it is a new one.
+        """
+        if self.last_updated is not None:
+            if last_updated <= self.last_updated:
+                return False
+            self._intervals.append((last_updated - self.last_updated).total_seconds())
+        self._lags.append((seen_at - last_updated).total_seconds())
+        self.last_updated = last_updated
+        return True
+
+    def next_update(self) -> Optional[datetime]:
+        """When the next update is expected to be seen (None until the interval is known)."""
+        interval = self.interval
+        if interval is None or self.last_updated is None:
+            return None
+        return self.last_updated + timedelta(seconds=interval + self.lag)
+
+
+class AdaptivePoller:  # pylint: disable=too-many-instance-attributes
+    """Calls `poll` (returning the latest reading) of the feed `name` in a background task.
+
+    Polls every `interval` seconds until the cadence is known, then `margin` seconds after
+    each expected update. Delays stay between `min_interval` and `max_interval` seconds
+    (`max_interval` also bounds how long a faster cadence may go unnoticed), and back off
+    up to `max_backoff` seconds on errors.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        poll: Callable[[], Awaitable[Optional[Reading]]],
+        interval: float = 15,
+        min_interval: float = 2,
+        max_interval: float = 60,
+        margin: float = 0.5,
+        max_backoff: float = 300,
+    ):  # pylint: disable=too-many-arguments
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.margin = margin
+        self.max_backoff = max_backoff
+        self.cadence = PublishCadence()
+        self.failures = 0
+        self.unchanged = 0
+        self._task: Optional[asyncio.Future] = None
+
+    async def poll_once(self, now: Optional[datetime] = None) -> float:
+        """Poll once. Returns the seconds to wait until the next poll."""
+        try:
+            reading = await self.poll()
+        except Exception as ex:  # pylint: disable=broad-except
+            self.failures += 1
+            POLLS.labels(self.name, "error").inc()
+            delay = self.backoff()
+            logger.warning(f"Polling {self.name} failed ({ex}), next in {delay:.1f}s")
+            return delay
+
+        self.failures = 0
+        now = now or datetime.utcnow()
+        if reading is not None and self.cadence.observe(reading.last_updated, now):
+            self.unchanged = 0
+            POLLS.labels(self.name, "new").inc()
+        else:
+            self.unchanged += 1
+            POLLS.labels(self.name, "unchanged").inc()
+        return self.delay(now)
+
+    def delay(self, now: datetime) -> float:
+        """Seconds from `now` until the next poll, after a successful one."""
+        expected = self.cadence.next_update()
+        if expected is None:
+            delay = self.interval
+        elif not self.unchanged:
+            delay = (expected - now).total_seconds() + self.margin
+        else:  # Late update: retry sooner, then less and less often
+            delay = self.cadence.interval / 4 * 2 ** (self.unchanged - 1)
+        return min(max(delay, self.min_interval), self.max_interval)
+
+    def backoff(self) -> float:
+        """Seconds until the next poll after `failures` failed ones in a row."""
+        delay = min(self.max_backoff, self.interval * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def start(self):
+        """Start polling, right away."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._poll_periodically())
+
+    async def stop(self):
+        """Stop polling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll_periodically(self):
+        while True:
+            await asyncio.sleep(await self.poll_once())
@@ -1,4 +1,7 @@
+"""Data and response models: the API answers are documented by them, but serialized
+directly from dicts of the same shape, without validation."""
 from datetime import datetime
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -6,3 +9,59 @@ from pydantic import BaseModel
 class AltitudeData(BaseModel):  # pylint: disable=too-few-public-methods
     last_updated: datetime
     altitude: float
+
+
+class SeriesPoint(BaseModel):  # pylint: disable=too-few-public-methods
+    """Altitudes of the readings in a time bucket starting at `start`."""
+
+    start: datetime
+    minimum: float
+    maximum: float
+    average: float
+
+
+class Stats(BaseModel):  # pylint: disable=too-few-public-methods
+    """Altitude stats of a window, with the opt-in fields if included."""
+
+    minimum: float
+    maximum: float
+    average: float
+    dlen: int
+    altitudes: Optional[List[float]] = None
+    series: Optional[List[SeriesPoint]] = None
+    percentiles: Optional[Dict[str, float]] = None  # By name, e.g. "p99"
+
+
+class StatsResponse(BaseModel):  # pylint: disable=too-few-public-methods
+    data: Stats
+
+
+class RateOfChange(BaseModel):  # pylint: disable=too-few-public-methods
+    """Altitude change per second: extremes between successive readings, and overall."""
+
+    minimum: float
+    maximum: float
+    average: float
+
+
+class Analytics(BaseModel):  # pylint: disable=too-few-public-methods
+    """Altitude analytics of the readings of a time range (only `count` if none)."""
+
+    since: datetime
+    until: datetime
+    count: int
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    average: Optional[float] = None
+    stddev: Optional[float] = None
+    percentiles: Optional[Dict[str, float]] = None  # By name, e.g. "p95"
+    rate_of_change: Optional[RateOfChange] = None
+    series: Optional[List[SeriesPoint]] = None
+
+
+class AnalyticsResponse(BaseModel):  # pylint: disable=too-few-public-methods
+    data: Analytics
+
+
+class HealthResponse(BaseModel):  # pylint: disable=too-few-public-methods
+    data: str
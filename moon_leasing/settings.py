@@ -1,10 +1,20 @@
 """ENV settings and logging."""
+import hashlib
 import logging
 import os
+import tempfile
 from pathlib import Path
 from typing import Union
 
 from dotenv import dotenv_values, find_dotenv, load_dotenv
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+
+from moon_leasing.diagnostics import (
+    RingBufferHandler,
+    level_number,
+    start_queue_logging,
+)
 
 
 class _Settings:  # pylint: disable=too-few-public-methods
@@ -34,26 +44,203 @@ class _Settings:  # pylint: disable=too-few-public-methods
                 or self.SATELLITE_REALTIME_URL
             )
 
+        # Tracked satellites, as "id=url,id=url": the first one is also served by /stats
+        # and /health. Defaults to a single satellite at SATELLITE_REALTIME_URL.
+        self.SATELLITES = {
+            satellite_id.strip(): url.strip()
+            for satellite_id, _, url in (
+                item.partition("=")
+                for item in str(self._get_env("SATELLITES", "")).split(",")
+                if item.strip()
+            )
+        } or {"default": self.SATELLITE_REALTIME_URL}
+
+        self.BUFFER_MINUTES = float(self._get_env("BUFFER_MINUTES", 10))
+        self.BUFFER_SIZE = int(self._get_env("BUFFER_SIZE", 4096))
+        self.STATS_WINDOWS = [
+            int(item)
+            for item in str(self._get_env("STATS_WINDOWS", "1,5,60,1440")).split(",")
+        ]
+
+        self.UPSTREAM_CONNECT_TIMEOUT = float(
+            self._get_env("UPSTREAM_CONNECT_TIMEOUT", 2)
+        )
+        self.UPSTREAM_READ_TIMEOUT = float(self._get_env("UPSTREAM_READ_TIMEOUT", 5))
+        self.UPSTREAM_MAX_CONNECTIONS = int(
+            self._get_env("UPSTREAM_MAX_CONNECTIONS", 10)
+        )
+        self.UPSTREAM_RETRIES = int(self._get_env("UPSTREAM_RETRIES", 2))
+        self.UPSTREAM_RETRY_BACKOFF = float(
+            self._get_env("UPSTREAM_RETRY_BACKOFF", 0.5)
+        )
+
+        # Upstream polling interval until the feeds' cadence is learned, also the max-age of
+        # the cacheable answers
+        self.POLL_INTERVAL_SECONDS = float(self._get_env("POLL_INTERVAL_SECONDS", 15))
+        # Once the feeds' cadence is learned, each is polled POLL_MARGIN_SECONDS after its
+        # expected update, waiting between POLL_MIN/MAX_INTERVAL_SECONDS between polls, and
+        # up to POLL_MAX_BACKOFF_SECONDS after errors
+        self.POLL_MIN_INTERVAL_SECONDS = float(
+            self._get_env("POLL_MIN_INTERVAL_SECONDS", 2)
+        )
+        self.POLL_MAX_INTERVAL_SECONDS = float(
+            self._get_env("POLL_MAX_INTERVAL_SECONDS", 60)
+        )
+        self.POLL_MARGIN_SECONDS = float(self._get_env("POLL_MARGIN_SECONDS", 0.5))
+        self.POLL_MAX_BACKOFF_SECONDS = float(
+            self._get_env("POLL_MAX_BACKOFF_SECONDS", 300)
+        )
+        # With LEADER_ELECTION, only the process holding the DB lease (renewed every
+        # LEADER_RENEW_SECONDS, expiring after LEADER_LEASE_SECONDS) polls and writes
+        self.LEADER_ELECTION = (
+            str(self._get_env("LEADER_ELECTION", "true")).lower() == "true"
+        )
+        self.LEADER_LEASE_SECONDS = float(self._get_env("LEADER_LEASE_SECONDS", 15))
+        self.LEADER_RENEW_SECONDS = float(self._get_env("LEADER_RENEW_SECONDS", 5))
+
+        # The leader shares the last SHARED_READINGS_SIZE readings of each satellite with the
+        # other processes of the host through a memory-mapped file, unique to the DB and
+        # the tracked satellites
+        self.SHARED_READINGS = (
+            str(self._get_env("SHARED_READINGS", "true")).lower() == "true"
+        )
+        shm_dir = (
+            Path("/dev/shm") if Path("/dev/shm").is_dir() else tempfile.gettempdir()
+        )
+        self.SHARED_READINGS_PATH = self._get_env(
+            "SHARED_READINGS_PATH",
+            str(Path(shm_dir) / f"moon_leasing-{self._shared_readings_key()}.shm"),
+        )
+        self.SHARED_READINGS_SIZE = int(self._get_env("SHARED_READINGS_SIZE", 1024))
+
+        # Cacheable answers of at least GZIP_MIN_SIZE bytes are also kept gzipped
+        self.GZIP_MIN_SIZE = int(self._get_env("GZIP_MIN_SIZE", 1000))
+        self.STALE_AFTER_SECONDS = float(self._get_env("STALE_AFTER_SECONDS", 20))
+        self.STALE_WHILE_REVALIDATE = (
+            str(self._get_env("STALE_WHILE_REVALIDATE", "")).lower() == "true"
+        )
+
+        self.WRITE_BATCH_SIZE = int(self._get_env("WRITE_BATCH_SIZE", 100))
+        self.WRITE_FLUSH_SECONDS = float(self._get_env("WRITE_FLUSH_SECONDS", 5))
+        # While the DB fails, up to WRITE_MAX_PENDING readings are kept for writing
+        self.WRITE_MAX_PENDING = int(self._get_env("WRITE_MAX_PENDING", 10000))
+        # /analytics keeps up to ANALYTICS_MAX_READINGS readings per satellite in memory
+        self.ANALYTICS_MAX_READINGS = int(
+            self._get_env("ANALYTICS_MAX_READINGS", 5_000_000)
+        )
+        # Per-hour quantile sketches: percentiles within SKETCH_RELATIVE_ACCURACY of the
+        # exact ones, with up to SKETCH_MAX_BINS bins each
+        self.SKETCH_RELATIVE_ACCURACY = float(
+            self._get_env("SKETCH_RELATIVE_ACCURACY", 0.001)
+        )
+        self.SKETCH_MAX_BINS = int(self._get_env("SKETCH_MAX_BINS", 2048))
+        # Bulk imports write IMPORT_BATCH_SIZE readings per transaction
+        self.IMPORT_BATCH_SIZE = int(self._get_env("IMPORT_BATCH_SIZE", 50000))
+
+        # DB engines: writes share DB_WRITE_POOL_SIZE connections (1 suits SQLite), reads
+        # use their own pool, on DATABASE_READ_URL (e.g. a replica) if set.
+        self.DATABASE_READ_URL = self._get_env("DATABASE_READ_URL", self.DATABASE_URL)
+        if (os.environ.get("TEST") or "").lower() == "true":
+            self.DATABASE_READ_URL = (
+                os.environ.get("TEST_DATABASE_READ_URL") or self.DATABASE_URL
+            )
+        self.DB_WRITE_POOL_SIZE = int(self._get_env("DB_WRITE_POOL_SIZE", 1))
+        self.DB_READ_POOL_SIZE = int(self._get_env("DB_READ_POOL_SIZE", 5))
+        self.DB_READ_MAX_OVERFLOW = int(self._get_env("DB_READ_MAX_OVERFLOW", 10))
+        self.DB_ECHO = str(self._get_env("DB_ECHO", "")).lower() == "true"
+        # SQLite PRAGMAs set on connect
+        self.DB_JOURNAL_MODE = self._get_env("DB_JOURNAL_MODE", "WAL")
+        self.DB_SYNCHRONOUS = self._get_env("DB_SYNCHRONOUS", "NORMAL")
+        self.DB_CACHE_SIZE_KB = int(self._get_env("DB_CACHE_SIZE_KB", 20000))
+        self.DB_MMAP_SIZE = int(self._get_env("DB_MMAP_SIZE", 256 * 1024 * 1024))
+        self.DB_BUSY_TIMEOUT_MS = int(self._get_env("DB_BUSY_TIMEOUT_MS", 5000))
+
+        # Retention job: raw readings and per-minute rollups older than these many days
+        # are deleted (0 keeps them), per-hour rollups are kept.
+        self.RETENTION_DAYS = float(self._get_env("RETENTION_DAYS", 30))
+        self.ROLLUP_RETENTION_DAYS = float(self._get_env("ROLLUP_RETENTION_DAYS", 365))
+        self.RETENTION_CHUNK_SIZE = int(self._get_env("RETENTION_CHUNK_SIZE", 500))
+        self.RETENTION_INTERVAL_MINUTES = float(
+            self._get_env("RETENTION_INTERVAL_MINUTES", 60)
+        )
+        self.VACUUM_PAGES = int(self._get_env("VACUUM_PAGES", 1000))
+
+        # Health: critical while a reading within HEALTH_CRITICAL_MINUTES is below
+        # CRITICAL_ALTITUDE, then recovering until HEALTH_RECOVERY_MINUTES after it
+        self.CRITICAL_ALTITUDE = float(self._get_env("CRITICAL_ALTITUDE", 160))
+        self.HEALTH_CRITICAL_MINUTES = float(
+            self._get_env("HEALTH_CRITICAL_MINUTES", 1)
+        )
+        self.HEALTH_RECOVERY_MINUTES = float(
+            self._get_env("HEALTH_RECOVERY_MINUTES", 2)
+        )
+
+        # Pushed events: each subscriber may lag by EVENTS_QUEUE_SIZE events before being
+        # dropped; SSE streams send a keep-alive comment after EVENTS_KEEPALIVE_SECONDS idle
+        self.EVENTS_QUEUE_SIZE = int(self._get_env("EVENTS_QUEUE_SIZE", 100))
+        self.EVENTS_KEEPALIVE_SECONDS = float(
+            self._get_env("EVENTS_KEEPALIVE_SECONDS", 15)
+        )
+
+        # The last DIAGNOSTICS_SIZE log records of the app at DIAGNOSTICS_LEVEL or above
+        # are kept in memory, served by /debug/diagnostics if DIAGNOSTICS_ENDPOINT=true
+        self.DIAGNOSTICS_SIZE = int(self._get_env("DIAGNOSTICS_SIZE", 1000))
+        self.DIAGNOSTICS_LEVEL = level_number(
+            self._get_env("DIAGNOSTICS_LEVEL", "DEBUG")
+        )
+        self.DIAGNOSTICS_ENDPOINT = (
+            str(self._get_env("DIAGNOSTICS_ENDPOINT", "")).lower() == "true"
+        )
+
+    def _shared_readings_key(self) -> str:
+        """Hash of the DB (the absolute path of a SQLite file, as a relative one differs
+        from one deployment to another) and of the tracked satellites' ids."""
+        try:
+            url = make_url(str(self.DATABASE_URL))
+            if url.get_backend_name() == "sqlite" and url.database not in (
+                None,
+                "",
+                ":memory:",
+            ):
+                url = url.set(database=str(Path(url.database).resolve()))
+            db = url.render_as_string(hide_password=True)
+        except ArgumentError:
+            db = str(self.DATABASE_URL)
+        key = f"{db} {','.join(self.SATELLITES)}"
+        return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+    def _get_env(self, name: str, default=None):
+        """Value of `name` from the .env file, then the environment, then `default`."""
+        return self.ENV.get(name) or os.environ.get(name) or default
+
     def __init__(self, env_file: Union[str, Path] = ""):
         self._setup_env(env_file=env_file)
         self.main_logger = self._set_logging()
 
     def _set_logging(self):
+        """Log through a queue, so that writing the logs never blocks the event loop."""
         logger = logging.getLogger()
+        if self.ENV.get("DEBUG"):
+            log_level = logging.DEBUG
+        else:
+            log_level = level_number(self.ENV.get("LOG_LEVEL") or logging.INFO)
+        logger.setLevel(log_level)
 
         stream_handler = logging.StreamHandler()
-        stream_handler.setLevel(logging.DEBUG)
+        stream_handler.setLevel(log_level)
         stream_handler.setFormatter(
             logging.Formatter(fmt=self.log_format, datefmt="%m%d %H:%M")
         )
-        logger.addHandler(stream_handler)
+        self.diagnostics = RingBufferHandler(
+            capacity=self.DIAGNOSTICS_SIZE, level=self.DIAGNOSTICS_LEVEL
+        )
+        self.log_listener = start_queue_logging(
+            logger, stream_handler, self.diagnostics
+        )
 
-        if self.ENV.get("DEBUG"):
-            logger.setLevel(logging.DEBUG)
-        else:
-            _log_level = self.ENV.get("LOG_LEVEL") or logging.INFO
-            logger.setLevel(_log_level)
-        return logging.getLogger(self.package_name)
+        package_logger = logging.getLogger(self.package_name)
+        package_logger.setLevel(min(log_level, self.DIAGNOSTICS_LEVEL))
+        return package_logger
 
     def get_logger(self, name: Union[str, Path]):
         try:
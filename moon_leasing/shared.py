@@ -0,0 +1,163 @@
+"""Recent readings shared between the processes of a host through a memory-mapped file.
+
+The leader publishes each reading it ingests, and the followers pick up the new ones with
+a couple of memory reads, instead of querying the DB. The file holds one slot per
+satellite: a seqlock sequence number, the count of readings ever published, and a ring of
+the last `capacity` readings.
+
+The single writer makes the sequence number odd while it updates the slot and even again
+when done. Readers take no lock: they retry if the sequence number was odd or changed
+while they were copying the slot (this relies on stores not being reordered, as on x86).
+
+Every process using the file holds a shared `flock` on it, so that a file laid out for
+other settings is only reset once no process uses it any more.
+"""
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from moon_leasing.cache import Reading
+from moon_leasing.settings import Settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = Settings.get_logger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+_HEADER = struct.Struct("<8sII")  # Magic, slots, capacity
+_MAGIC = b"MOONSHM1"
+_SLOT_HEADER = struct.Struct("<QQ")  # Sequence number, count of published readings
+_READING = struct.Struct("<qd")  # Microseconds since the epoch, altitude
+_MAX_RETRIES = 1000
+
+
+class SharedReadings:
+    """A ring of the last `capacity` readings of each of `slots` satellites, in `path`.
+
+    Only one process, the leader, may publish. Raises ValueError if the file is in use by
+    other processes with another layout.
+    """
+
+    def __init__(self, path: Union[str, Path], slots: int, capacity: int = 1024):
+        self.path = Path(path)
+        self.slots = slots
+        self.capacity = capacity
+        self._slot_size = _SLOT_HEADER.size + capacity * _READING.size
+        size = _HEADER.size + slots * self._slot_size
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            alone = self._lock()
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._view = memoryview(self._mmap)
+        header = _HEADER.unpack_from(self._mmap)
+        if header != (_MAGIC, slots, capacity):
+            if not alone and header[0] == _MAGIC:
+                self.close()
+                raise ValueError(f"{self.path} is in use with another layout: {header}")
+            # New file, or laid out for other settings: followers see a gap, if anything
+            self._mmap[:] = bytes(size)
+            _HEADER.pack_into(self._mmap, 0, _MAGIC, slots, capacity)
+        if alone and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)  # Done initializing
+
+    def _lock(self) -> bool:
+        """Lock the file for exclusive use if no other process uses it, otherwise for
+        shared use. Returns whether it is used alone (unknown without flock: False)."""
+        if fcntl is None:
+            return False
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)  # Once initialized by its user
+            return False
+
+    @classmethod
+    def open(
+        cls, path: Union[str, Path], slots: int, capacity: int = 1024
+    ) -> Optional["SharedReadings"]:
+        """The shared readings in `path`, or None if disabled (empty path) or unavailable."""
+        if not path:
+            return None
+        try:
+            return cls(path, slots, capacity)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Shared readings disabled, can't map {path}: {ex}")
+            return None
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+        os.close(self._fd)  # Releasing the lock
+
+    def _offset(self, slot: int) -> int:
+        if not 0 <= slot < self.slots:
+            raise IndexError(f"No shared readings slot {slot}")
+        return _HEADER.size + slot * self._slot_size
+
+    def publish(self, slot: int, reading: Reading):
+        """Append a reading to the ring of `slot`."""
+        offset = self._offset(slot)
+        sequence, count = _SLOT_HEADER.unpack_from(self._mmap, offset)
+        struct.pack_into("<Q", self._mmap, offset, sequence + 1)
+        _READING.pack_into(
+            self._mmap,
+            offset + _SLOT_HEADER.size + (count % self.capacity) * _READING.size,
+            (reading.last_updated - EPOCH) // timedelta(microseconds=1),
+            reading.altitude,
+        )
+        _SLOT_HEADER.pack_into(self._mmap, offset, sequence + 2, count + 1)
+
+    def published(self, slot: int) -> int:
+        """Count of the readings ever published to `slot`."""
+        return _SLOT_HEADER.unpack_from(self._mmap, self._offset(slot))[1]
+
+    def read_since(self, slot: int, after: int) -> Tuple[int, List[Reading], bool]:
+        """The readings published to `slot` after the first `after` ones, oldest first.
+
+        Returns the count of published readings, the readings still in the ring, and
+        whether these are all of them: if not, some were overwritten (or the segment was
+        reset), and should be read from the DB.
+        """
+        offset = self._offset(slot)
+        ring = offset + _SLOT_HEADER.size
+        for _ in range(_MAX_RETRIES):
+            sequence, count = _SLOT_HEADER.unpack_from(self._mmap, offset)
+            if sequence % 2:
+                continue
+            start = min(max(after, count - self.capacity), count)
+            first, last = start % self.capacity, count % self.capacity
+            if start == count:
+                rows: List[Tuple[int, float]] = []
+            elif first < last:
+                rows = list(self._rows(ring, first, last))
+            else:  # Wrapping around the end of the ring
+                rows = list(self._rows(ring, first, self.capacity))
+                rows.extend(self._rows(ring, 0, last))
+            if _SLOT_HEADER.unpack_from(self._mmap, offset)[0] == sequence:
+                break
+        else:
+            return after, [], False  # The writer died while publishing
+        readings = [
+            Reading(EPOCH + timedelta(microseconds=micros), altitude)
+            for micros, altitude in rows
+        ]
+        return count, readings, start == after
+
+    def _rows(self, ring: int, first: int, last: int):
+        return _READING.iter_unpack(
+            self._view[ring + first * _READING.size : ring + last * _READING.size]
+        )
@@ -0,0 +1,166 @@
+"""Mergeable quantile sketches of altitudes, for percentiles over long windows.
+
+A `QuantileSketch` (after DDSketch) counts values in logarithmic bins: the bin of `x > 0`
+is `ceil(log(x) / log(gamma))`, with `gamma = (1 + alpha) / (1 - alpha)`, so every value
+in a bin is within a relative error `alpha` of the bin's representative value. Hence:
+
+    |quantile(q) - x_q| <= alpha * |x_q|
+
+where `x_q` is the exact q-quantile (the value of rank `q * (count - 1)`) of the values
+added. Merging two sketches adds their bin counts, so the bound also holds for any merge
+of sketches: those of the time buckets of a window give the window's percentiles.
+
+Memory is bounded by the range of the values, not their number: `log(max / min) /
+log(gamma)` bins, e.g. 380 at `alpha=0.001` for altitudes from 140 to 300. Beyond
+`max_bins` the bins of the smallest magnitudes are collapsed, the bound then only
+holding for the quantiles above them.
+"""
+import json
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+MIN_VALUE = 1e-9  # Smaller magnitudes are counted as zero
+
+
+class QuantileSketch:  # pylint: disable=too-many-instance-attributes
+    """Counts of values in logarithmic bins, with their exact count, minimum and maximum."""
+
+    def __init__(self, alpha: float = 0.001, max_bins: int = 2048):
+        if not 0 < alpha < 1:
+            raise ValueError(f"Invalid sketch relative accuracy: {alpha}")
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.count = 0
+        self.zero_count = 0
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self._positive: Dict[int, int] = {}  # Bin counts of the positive values
+        self._negative: Dict[int, int] = {}  # And of the negative ones, by magnitude
+
+    def __len__(self):
+        return self.count
+
+    def update(self, values: Iterable[float]):
+        """Add values, binned all at once."""
+        values = np.fromiter(values, np.float64)
+        if not values.size:
+            return
+        self.count += len(values)
+        minimum, maximum = float(values.min()), float(values.max())
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+        self.zero_count += int(np.count_nonzero(np.abs(values) < MIN_VALUE))
+        for store, magnitudes in (
+            (self._positive, values[values >= MIN_VALUE]),
+            (self._negative, -values[values <= -MIN_VALUE]),
+        ):
+            if len(magnitudes):
+                keys, counts = np.unique(
+                    np.ceil(np.log(magnitudes) / self._log_gamma), return_counts=True
+                )
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    store[int(key)] = store.get(int(key), 0) + count
+                self._collapse(store)
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the values counted by `other`. The bins of a sketch of another `alpha` (kept
+        from before a configuration change) are re-binned, adding up both errors."""
+        # pylint: disable=protected-access
+        if not other.count:
+            return
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.minimum = (
+            other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        )
+        self.maximum = (
+            other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        )
+        for store, other_store in (
+            (self._positive, other._positive),
+            (self._negative, other._negative),
+        ):
+            for key, count in other_store.items():
+                if other.alpha != self.alpha:
+                    key = math.ceil(math.log(other._value(key)) / self._log_gamma)
+                store[key] = store.get(key, 0) + count
+            self._collapse(store)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile (0 <= q <= 1) of the values, within the relative error `alpha`
+        (exact for the minimum and maximum); None if there are none."""
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantile: {q}")
+        if not self.count:
+            return None
+        if q in (0, 1):
+            return self.minimum if q == 0 else self.maximum
+        rank = q * (self.count - 1)
+        value = self.maximum
+        seen = 0
+        for key in sorted(self._negative, reverse=True):  # Lowest values first
+            seen += self._negative[key]
+            if seen > rank:
+                value = -self._value(key)
+                break
+        else:
+            seen += self.zero_count
+            if seen > rank:
+                value = 0.0
+            else:
+                for key in sorted(self._positive):
+                    seen += self._positive[key]
+                    if seen > rank:
+                        value = self._value(key)
+                        break
+        return min(max(value, self.minimum), self.maximum)
+
+    def percentiles(self, percentiles: Iterable[float]) -> Dict[str, float]:
+        """The `percentiles` (0 to 100), by name, e.g. "p99"."""
+        return {
+            f"p{percentile:g}": self.quantile(percentile / 100)
+            for percentile in percentiles
+        }
+
+    def to_json(self) -> str:
+        """Compact JSON of the sketch, for `from_json`."""
+        return json.dumps(
+            dict(
+                alpha=self.alpha,
+                count=self.count,
+                zero=self.zero_count,
+                min=self.minimum,
+                max=self.maximum,
+                pos=self._positive,
+                neg=self._negative,
+            ),
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, text: str, max_bins: int = 2048) -> "QuantileSketch":
+        """The sketch of a `to_json` text."""
+        data = json.loads(text)
+        sketch = cls(alpha=data["alpha"], max_bins=max_bins)
+        sketch.count = data["count"]
+        sketch.zero_count = data["zero"]
+        sketch.minimum = data["min"]
+        sketch.maximum = data["max"]
+        sketch._positive = {int(key): count for key, count in data["pos"].items()}
+        sketch._negative = {int(key): count for key, count in data["neg"].items()}
+        return sketch
+
+    def _value(self, key: int) -> float:
+        """Representative magnitude of a bin: within `alpha` of any value in it."""
+        return 2 * math.exp(key * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+    def _collapse(self, store: Dict[int, int]):
+        """Fold the bins of the smallest magnitudes into one, down to `max_bins`."""
+        excess = len(store) - self.max_bins
+        if excess <= 0:
+            return
+        keys = sorted(store)
+        store[keys[excess]] += sum(store.pop(key) for key in keys[:excess])
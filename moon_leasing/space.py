@@ -1,13 +1,32 @@
-import os
-from datetime import datetime
-from typing import Optional
+import asyncio
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
-import requests
 from dotenv import dotenv_values, find_dotenv, load_dotenv
 
-from moon_leasing.db.config import async_session
+from moon_leasing.aggregates import WindowAggregates, downsample
+from moon_leasing.broadcast import Broadcaster, Event, Subscription
+from moon_leasing.cache import Reading, ReadingBuffer
+from moon_leasing.columnar import ColumnarHistory, analyze
+from moon_leasing.db.config import async_session, read_session
 from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.writer import WriteBehindQueue
+from moon_leasing.health import HealthMonitor
+from moon_leasing.metrics import Counter
+from moon_leasing.polling import AdaptivePoller
 from moon_leasing.settings import Settings
+from moon_leasing.shared import SharedReadings
+from moon_leasing.upstream import UpstreamClient
 
 my_env = find_dotenv(raise_error_if_not_found=False)
 ENV = load_dotenv()
@@ -16,15 +35,84 @@ values = dotenv_values()
 
 logger = Settings.main_logger.getChild("space")
 
+REFRESHES = Counter(
+    "moon_leasing_refreshes_total",
+    "Refreshes from upstream, by satellite and result (ok, error or cancelled)",
+    ["satellite", "result"],
+)
+UNCHANGED_READINGS = Counter(
+    "moon_leasing_unchanged_readings_total",
+    "Readings fetched from upstream unchanged since the previous one, and skipped",
+    ["satellite"],
+)
+CACHE_REQUESTS = Counter(
+    "moon_leasing_cache_requests_total",
+    "Reads of the in-memory readings, by satellite and result: hit when fresh, stale"
+    " when served while refreshing, miss when waiting for a refresh",
+    ["satellite", "result"],
+)
+
+
+class NoReadingsError(LookupError):
+    """No reading in memory, and none could be fetched."""
+
 
 class SatelliteData:
+    """Readings, stats and health of a satellite.
+
+    State is kept on the class: SatelliteData itself tracks the first configured satellite
+    and `for_satellite` makes a subclass with its own state for any other one.
+    """
+
+    # Per-satellite state, set by _init_state
+    SATELLITE_ID: str
     # SATELLITE_REALTIME_URL = "https://nestio.space/api/satellite/data"
-    SATELLITE_REALTIME_URL = Settings.SATELLITE_REALTIME_URL
+    SATELLITE_REALTIME_URL: Optional[str]
     # os.environ.get("SATELLITE_REALTIME_URL")
-    CRITICAL_ALTITUDE = os.environ.get("CRITICAL_ALTITUDE") or 160
+    _last_retrieved: Optional[datetime]
+    _refresh_task: Optional[asyncio.Future]
+    _failed_at: Optional[datetime]  # Of the last refresh, if it failed
+    _columns_task: Optional[asyncio.Future]
+    _health: Optional[str]
+    _health_timer: Optional[asyncio.TimerHandle]  # At the next health transition
+    sequence: int  # Of the ingested readings
+    _shared_slot: Optional[int]
+    _shared_count: int
+    buffer: ReadingBuffer
+    aggregates: WindowAggregates
+    health_monitor: HealthMonitor
+    columns: ColumnarHistory  # Of the stored readings, for analytics
+    broadcaster: Broadcaster
+    poller: Optional[AdaptivePoller]  # Set when polling starts
+
+    CRITICAL_ALTITUDE = Settings.CRITICAL_ALTITUDE
     _latest_data = None
-    _last_retrieved: Optional[datetime] = None
-    db = SatelliteDB()
+    STALE_AFTER_SECONDS = Settings.STALE_AFTER_SECONDS
+    STALE_WHILE_REVALIDATE = Settings.STALE_WHILE_REVALIDATE
+    # Only the leader polls upstream and writes the readings, followers read them from the DB
+    is_leader = True
+    # Shared by all satellites
+    writer = WriteBehindQueue(
+        batch_size=Settings.WRITE_BATCH_SIZE,
+        flush_interval=Settings.WRITE_FLUSH_SECONDS,
+        max_pending=Settings.WRITE_MAX_PENDING,
+    )
+    upstream = UpstreamClient(
+        connect_timeout=Settings.UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout=Settings.UPSTREAM_READ_TIMEOUT,
+        max_connections=Settings.UPSTREAM_MAX_CONNECTIONS,
+        retries=Settings.UPSTREAM_RETRIES,
+        backoff=Settings.UPSTREAM_RETRY_BACKOFF,
+    )
+    shared = (
+        SharedReadings.open(
+            Settings.SHARED_READINGS_PATH,
+            slots=len(Settings.SATELLITES),
+            capacity=Settings.SHARED_READINGS_SIZE,
+        )
+        if Settings.SHARED_READINGS
+        else None
+    )
 
     messages = {
         "missing": "WARNING: No altitude information available",
@@ -47,94 +135,509 @@ class SatelliteData:
     #     return self._latest_data
 
     @classmethod
-    async def stats(cls):
-        """Calculate altitude stats for the past 5 minutes."""
-        data = await cls._get_latest_data_list(minutes=5)
-        altitudes = [float(item.altitude) for item in data]
-        if not altitudes:
-            new_entry = await cls.refresh()
-            altitudes = [new_entry.altitude]
-            print(repr(altitudes))
+    def _init_state(cls, satellite_id: str, url: Optional[str]):
+        """Give this class its own per-satellite state."""
+        cls.SATELLITE_ID = satellite_id
+        cls.SATELLITE_REALTIME_URL = url
+        cls._last_retrieved = None
+        cls._refresh_task = None
+        cls._failed_at = None
+        cls._columns_task = None
+        cls.buffer = ReadingBuffer(
+            maxlen=Settings.BUFFER_SIZE,
+            horizon=timedelta(minutes=Settings.BUFFER_MINUTES),
+        )
+        cls.aggregates = WindowAggregates(Settings.STATS_WINDOWS)
+        cls.health_monitor = HealthMonitor(
+            critical_altitude=cls.CRITICAL_ALTITUDE,
+            critical_window=timedelta(minutes=Settings.HEALTH_CRITICAL_MINUTES),
+            recovery_window=timedelta(minutes=Settings.HEALTH_RECOVERY_MINUTES),
+        )
+        cls.columns = ColumnarHistory(max_readings=Settings.ANALYTICS_MAX_READINGS)
+        cls._health = None
+        cls._health_timer = None
+        cls.sequence = 0
+        satellite_ids = list(Settings.SATELLITES)
+        cls._shared_slot = (
+            satellite_ids.index(satellite_id) if satellite_id in satellite_ids else None
+        )
+        cls._shared_count = 0
+        cls.broadcaster = Broadcaster(queue_size=Settings.EVENTS_QUEUE_SIZE)
+        cls.poller = None
+
+    @classmethod
+    def for_satellite(cls, satellite_id: str, url: str) -> Type["SatelliteData"]:
+        """A SatelliteData class with its own state, tracking another satellite."""
+        satellite = type(f"{cls.__name__}[{satellite_id}]", (cls,), {})
+        satellite._init_state(satellite_id, url)
+        return satellite
+
+    @classmethod
+    def _db(cls, session) -> SatelliteDB:
+        return SatelliteDB(db_session=session, satellite_id=cls.SATELLITE_ID)
+
+    @classmethod
+    async def stats(
+        cls,
+        window: int = 5,
+        altitudes: bool = False,
+        points: int = 0,
+        percentiles: Sequence[float] = (),
+    ):
+        """Altitude stats for the past `window` minutes (default=5), with all the window's
+        `altitudes`, a `series` downsampled to `points` time buckets and the `percentiles`
+        (within SKETCH_RELATIVE_ACCURACY) if asked for.
+
+        Windows in STATS_WINDOWS are kept up to date in memory, any other is read from the
+        DB rollups and sketches and, for the opt-in fields, from the stored readings, with
+        the buffered readings not written yet.
+        """
+        if window <= 0:
+            raise ValueError(f"Invalid stats window: {window} minutes")
+        await cls._refresh_if_stale()
+
+        now = datetime.utcnow()
+        dt_since = now - timedelta(minutes=window)
+        readings: List[Tuple[datetime, float]] = []
+        sketch = SatelliteDB.new_sketch()
+        if window in cls.aggregates:
+            aggregate = cls.aggregates[window]
+            aggregate.expire(now)
+            minimum, maximum = aggregate.minimum, aggregate.maximum
+            total, count = aggregate.total, aggregate.count
+            if altitudes or points or percentiles:
+                readings = aggregate.readings
+            if percentiles:
+                sketch.update(altitude for _, altitude in readings)
+        else:
+            async with read_session() as session:
+                db = cls._db(session)
+                minimum, maximum, total, count = await db.get_stats(since=dt_since)
+                if percentiles:
+                    sketch = await db.get_sketch(since=dt_since)
+                if altitudes or points:
+                    async for rows in db.stream_history(since=dt_since):
+                        readings.extend(rows)
+                stored = await db.get_last_reading()  # Last, not to count any twice
+            unwritten = cls._unwritten_since(dt_since, stored)
+            if unwritten:
+                values = [altitude for _, altitude in unwritten]
+                minimum = min(values + ([] if minimum is None else [minimum]))
+                maximum = max(values + ([] if maximum is None else [maximum]))
+                total += sum(values)
+                count += len(values)
+                readings.extend(unwritten)
+                sketch.update(values)
+
+        if not count:
+            new_entry = cls.buffer.latest
+            if new_entry is None:  # Nothing in memory either
+                new_entry = await cls.refresh()
+            if new_entry is None:
+                raise NoReadingsError("No altitude information available")
+            altitude = float(new_entry.altitude)
+            data = dict(minimum=altitude, maximum=altitude, average=altitude, dlen=0)
+            sketch.update([altitude])
             # return dict(error="Data not available")
-        print(altitudes)
-        response = dict(
-            minimum=min(altitudes),
-            maximum=max(altitudes),
-            average=sum(altitudes) / len(altitudes),
-            altitudes=altitudes,
-            dlen=len(data),
+        else:
+            data = dict(
+                minimum=minimum, maximum=maximum, average=total / count, dlen=count
+            )
+        if altitudes:
+            data["altitudes"] = [altitude for _, altitude in readings]
+        if points:
+            data["series"] = downsample(readings, dt_since, now, points)
+        if percentiles:
+            data["percentiles"] = sketch.percentiles(percentiles)
+        return data
+
+    @classmethod
+    def _unwritten_since(
+        cls, dt_since: datetime, stored: Optional[Reading]
+    ) -> List[Reading]:
+        """Buffered readings since `dt_since` newer than `stored`, the latest stored one:
+        those still queued by the writer (or, on a follower, by the leader's)."""
+        return [
+            reading
+            for reading in cls.buffer.since(dt_since)
+            if stored is None or reading.last_updated > stored.last_updated
+        ]
+
+    @classmethod
+    async def analytics(
+        cls,
+        since: datetime,
+        until: datetime,
+        percentiles: Sequence[float] = (5, 50, 95),
+        points: int = 0,
+    ) -> dict:
+        """Altitude analytics of the readings from `since` to `until` (see
+        `columnar.analyze`), from the columnar history, loaded from the DB on first use."""
+        await cls._refresh_if_stale()
+        if not cls.columns.loaded:
+            task = cls._columns_task
+            if task is None or task.done():
+                task = cls._columns_task = asyncio.ensure_future(cls._load_columns())
+            await asyncio.shield(task)
+        times, altitudes = cls.columns.range(since, until)
+        return analyze(times, altitudes, since, until, percentiles, points)
+
+    @classmethod
+    async def _load_columns(cls):
+        """Load the latest stored readings (up to ANALYTICS_MAX_READINGS) into the columnar
+        history, converted chunk by chunk as streamed, with the buffered ones not written
+        yet."""
+        async with read_session() as session:
+            db = cls._db(session)
+            since = await db.get_nth_latest_time(cls.columns.max_readings)
+            cls.columns.clear()
+            async for rows in db.stream_history(since=since, chunk_size=10000):
+                cls.columns.extend(rows)
+        cls.columns.loaded = True
+        for reading in cls.buffer:
+            cls.columns.add(reading)
+        logger.info(
+            f"{cls.SATELLITE_ID} columnar history loaded with {len(cls.columns)} readings"
         )
-        print(response)
-        return response
 
     @classmethod
     async def health(cls):
         """Determine Satellite's "health" based on altitude."""
-        message = cls.messages["ok"]
-
-        data = await cls._get_latest_data_list(minutes=1)
-        print(f"HEALTH - Data received: {data}")
-        altitudes = [item.altitude for item in data]
-        print(f"HEALTH - Altitudes: {altitudes}")
-        if not altitudes:
-            message = cls.messages["missing"]
-        elif min(altitudes) < cls.CRITICAL_ALTITUDE:
-            message = cls.messages["critical"]
-        else:
-            async with async_session() as session:
-                async with session.begin():
-                    db = SatelliteDB(db_session=session)
-                    latest_critical = await db.get_last_below(
-                        threshold=cls.CRITICAL_ALTITUDE, minutes=2
-                    )
-                    logger.debug(f"HEALTH - latest critical: {latest_critical}")
-                    if latest_critical:
-                        message = cls.messages["warning"]
+        await cls._refresh_if_stale()
+        message = cls.messages[cls._health_state()]
         logger.debug(f"HEALTH - message: {message}")
         return message
 
     @classmethod
-    async def _get_latest_data_list(cls, **kwargs):
-        kwargs = {k: v for k, v in kwargs.items() if v is not None}
-        if (
-            not cls._last_retrieved
-            or (datetime.utcnow() - cls._last_retrieved).total_seconds() > 20
+    def _health_state(cls) -> str:
+        """Key of the health message, from the health monitor: no DB query, O(1)."""
+        return cls.health_monitor.state(datetime.utcnow())
+
+    @classmethod
+    async def version(cls) -> Tuple[int, Optional[datetime]]:
+        """Ingest sequence number and time of the newest reading, refreshed first if stale.
+
+        The answers computed from the in-memory state only change with the sequence number,
+        and as time passes.
+        """
+        await cls._refresh_if_stale()
+        latest = cls.buffer.latest
+        return cls.sequence, latest and latest.last_updated
+
+    @classmethod
+    def subscribe(cls) -> Subscription:
+        """Subscribe to the new readings and health changes, starting with the current ones.
+
+        Events are pushed from memory, as readings are ingested and as the health changes
+        over time: subscribers cost no DB queries.
+        """
+        initial = []
+        if cls.buffer.latest is not None:
+            initial.append(
+                Event.create("reading", cls._reading_data(cls.buffer.latest))
+            )
+        if cls._health is not None:
+            initial.append(Event.create("health", cls._health_data(None)))
+        return cls.broadcaster.subscribe(*initial)
+
+    @classmethod
+    def _reading_data(cls, reading: Reading) -> dict:
+        return dict(
+            satellite=cls.SATELLITE_ID,
+            last_updated=reading.last_updated.isoformat() + "Z",
+            altitude=reading.altitude,
+        )
+
+    @classmethod
+    def _health_data(cls, previous: Optional[str]) -> dict:
+        return dict(
+            satellite=cls.SATELLITE_ID,
+            state=cls._health,
+            message=cls.messages[cls._health],
+            previous=previous,
+        )
+
+    @classmethod
+    async def history(
+        cls,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fmt: str = "ndjson",
+    ) -> AsyncIterator[str]:
+        """Stored readings between `since` and `until`, as chunks of NDJSON or CSV lines."""
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError(f"Unsupported history format: {fmt}")
+        if fmt == "csv":
+            yield "last_updated,altitude\n"
+            line = "{}Z,{!r}\n"
+        else:
+            line = '{{"last_updated": "{}Z", "altitude": {!r}}}\n'
+
+        async with read_session() as session:
+            db = cls._db(session)
+            async for rows in db.stream_history(
+                since=since and SatelliteDB.to_naive_datetime(since),
+                until=until and SatelliteDB.to_naive_datetime(until),
+            ):
+                yield "".join(
+                    line.format(last_updated.isoformat(), altitude)
+                    for last_updated, altitude in rows
+                )
+
+    @classmethod
+    async def _refresh_if_stale(cls):
+        """Refresh if the data is stale: in the background when allowed to serve stale data,
+        or while refreshes fail (retried at most every STALE_AFTER_SECONDS, the pollers
+        backing off meanwhile).
+
+        A failed refresh is only raised, as NoReadingsError, with no reading in memory. A
+        follower first picks up the readings shared by the leader, if any.
+        """
+        if not cls.is_leader:
+            cls._sync_shared()
+        now = datetime.utcnow()
+        fresh_until = cls._fresh_until()
+        if fresh_until is not None and now <= fresh_until:
+            CACHE_REQUESTS.labels(cls.SATELLITE_ID, "hit").inc()
+            return
+        failed_at = cls._failed_at
+        if cls.buffer.latest is not None and (
+            cls.STALE_WHILE_REVALIDATE or failed_at is not None
         ):
-            new_entry = await cls.refresh()
-            print(new_entry)
+            CACHE_REQUESTS.labels(cls.SATELLITE_ID, "stale").inc()
+            if (
+                failed_at is None
+                or (now - failed_at).total_seconds() > cls.STALE_AFTER_SECONDS
+            ):
+                cls._start_refresh()
+            return
+        CACHE_REQUESTS.labels(cls.SATELLITE_ID, "miss").inc()
         try:
-            async with async_session() as session:
-                async with session.begin():
-                    db = SatelliteDB(db_session=session)
-                    return await db.get_latest(**kwargs)
-        except Exception:
-            msg = "Can't get data_list!!!"
-            logger.exception(msg)
-            return []
+            await cls.refresh()
+        except Exception as ex:  # pylint: disable=broad-except
+            if cls.buffer.latest is None:
+                raise NoReadingsError("No altitude information available") from ex
+            logger.warning(f"Serving the {cls.SATELLITE_ID} readings in memory: {ex}")
+
+    @classmethod
+    def _fresh_until(cls) -> Optional[datetime]:
+        """Until when the data is fresh: STALE_AFTER_SECONDS after it was retrieved or, if
+        later, until the poller's margin after the next update its cadence expects (the
+        poller refreshing it then)."""
+        if cls._last_retrieved is None:
+            return None
+        fresh_until = cls._last_retrieved + timedelta(seconds=cls.STALE_AFTER_SECONDS)
+        poller = cls.poller
+        expected = poller and poller.cadence.next_update()
+        if expected is not None:
+            fresh_until = max(fresh_until, expected + timedelta(seconds=poller.margin))
+        return fresh_until
+
+    @classmethod
+    def _ingest(cls, reading: Reading):
+        """Add a stored reading to the in-memory buffer and window aggregates, and publish
+        it, and the change of health it causes if any, to the subscribers."""
+        cls.buffer.append(reading)
+        cls.aggregates.add(reading)
+        cls.health_monitor.add(reading)
+        cls.columns.add(reading)
+        cls.sequence += 1
+        cls.broadcaster.publish("reading", cls._reading_data(reading))
+        cls._update_health()
+
+    @classmethod
+    def _ingest_many(cls, readings: Sequence[Reading]):
+        """Ingest stored readings sorted by time, like `_ingest` but merged into the buffer
+        and each window aggregate at once, and only publishing the newest one if newer
+        than the latest: a backfill doesn't flood the subscribers."""
+        if not readings:
+            return
+        latest = cls.buffer.latest
+        cls.buffer.merge(readings)
+        cls.aggregates.merge(readings)
+        for reading in readings:
+            cls.health_monitor.add(reading)
+        cls.columns.merge(readings)
+        cls.sequence += 1
+        if latest is None or readings[-1].last_updated > latest.last_updated:
+            cls.broadcaster.publish("reading", cls._reading_data(readings[-1]))
+        cls._update_health()
+
+    @classmethod
+    def _update_health(cls):
+        """Publish the change of health if any, and re-evaluate it at the next transition
+        due to time passing (to "warning", "ok" or "missing"), even with no new reading."""
+        now = datetime.utcnow()
+        previous, cls._health = cls._health, cls.health_monitor.state(now)
+        if cls._health != previous:
+            cls.broadcaster.publish("health", cls._health_data(previous))
+        if cls._health_timer is not None:
+            cls._health_timer.cancel()
+            cls._health_timer = None
+        transition = cls.health_monitor.next_transition(now)
+        if transition is not None:
+            loop = asyncio.get_running_loop()
+            cls._health_timer = loop.call_at(
+                loop.time() + (transition - now).total_seconds(), cls._update_health
+            )
+
+    @classmethod
+    async def warm_up(cls):
+        """Fill the in-memory buffer, aggregates and health monitor with the recent readings
+        stored in the DB (after rolling up any readings without rollups or sketches, if the
+        leader)."""
+        horizon = cls._horizon()
+        async with async_session() as session:
+            async with session.begin():
+                db = cls._db(session)
+                if cls.is_leader:
+                    await db.backfill_rollups()
+                    await db.backfill_sketches()
+                readings = await db.get_latest_readings(
+                    minutes=horizon.total_seconds() / 60
+                )
+        for reading in reversed(readings):
+            cls._ingest(reading)
+        logger.info(
+            f"{cls.SATELLITE_ID} buffer warmed up with {len(cls.buffer)} readings"
+        )
+
+    @classmethod
+    def _horizon(cls) -> timedelta:
+        """How far back readings are kept in memory."""
+        return max(
+            cls.buffer.horizon,
+            cls.aggregates.longest,
+            cls.health_monitor.recovery_window,
+        )
+
+    @classmethod
+    def add_imported(cls, readings: Iterable[Reading]):
+        """Add the readings just imported into the DB to the columnar history, if loaded,
+        and ingest those recent enough to be kept in memory (other processes only get
+        those newer than their latest one)."""
+        readings = sorted(readings)
+        recent = bisect_left(readings, (datetime.utcnow() - cls._horizon(),))
+        cls.columns.merge(readings[:recent])
+        cls._ingest_many(readings[recent:])
+
+    @classmethod
+    def reset(cls):
+        """Forget all in-memory state, including unwritten readings (the DB is not touched)."""
+        cls.buffer.clear()
+        cls.writer.clear(satellite_id=cls.SATELLITE_ID)
+        cls.aggregates.clear()
+        cls.health_monitor.clear()
+        cls.columns.clear()
+        cls._columns_task = None
+        cls._health = None
+        if cls._health_timer is not None:
+            cls._health_timer.cancel()
+            cls._health_timer = None
+        cls.sequence += 1
+        cls._shared_count = 0
+        cls._last_retrieved = None
+        cls._refresh_task = None
+        cls._failed_at = None
 
     @classmethod
     async def refresh(cls):
-        """Get the latest altitude reading and store into DB."""
+        """Get the latest altitude reading and store into DB (if the leader; a follower
+        gets the readings the leader stored since its latest one instead).
+
+        Concurrent calls are coalesced: they all wait for the one refresh in flight.
+        """
+        return await asyncio.shield(cls._start_refresh())
+
+    @classmethod
+    def _start_refresh(cls) -> asyncio.Future:
+        """The refresh in flight, started if there is none."""
+        task = cls._refresh_task
+        if task is None or task.done():
+            task = cls._refresh_task = asyncio.ensure_future(cls._refresh())
+            task.add_done_callback(cls._refresh_done)
+        return task
+
+    @classmethod
+    def _refresh_done(cls, task: asyncio.Future):
+        if task.cancelled():
+            result = "cancelled"
+        elif task.exception():
+            result = "error"
+            cls._failed_at = datetime.utcnow()
+            logger.warning(f"Refresh failed: {task.exception()}")
+        else:
+            result = "ok"
+            cls._failed_at = None
+        REFRESHES.labels(cls.SATELLITE_ID, result).inc()
+
+    @classmethod
+    async def _refresh(cls):
+        if not cls.is_leader:
+            return await cls._sync()
         data = await cls._get_last_update()
 
         try:
-            async with async_session() as session:
-                async with session.begin():
-                    db = SatelliteDB(db_session=session)
-
-                    print(f"REFRESH Creating from {repr(data)}")
-                    new_entry = await db.create_entry(**data)
-                    print(new_entry)
-                    cls._last_retrieved = datetime.utcnow()
-                    return new_entry
+            logger.debug(f"REFRESH {cls.SATELLITE_ID} - {data}")
+            new_entry = Reading(data["last_updated"], data["altitude"])
+            latest = cls.buffer.latest
+            if latest is not None and latest.last_updated == new_entry.last_updated:
+                # Upstream didn't update since: nothing to write, ingest or publish
+                cls._last_retrieved = datetime.utcnow()
+                UNCHANGED_READINGS.labels(cls.SATELLITE_ID).inc()
+                return latest
+            cls._last_retrieved = datetime.utcnow()
+            cls._ingest(new_entry)  # Before persisting: served even if the DB fails
+            if cls.shared is not None and cls._shared_slot is not None:
+                cls.shared.publish(cls._shared_slot, new_entry)
+            await cls.writer.put(new_entry, satellite_id=cls.SATELLITE_ID)
+            return new_entry
 
         except Exception as ex:
             logger.exception(f"{type(ex)}: {ex}", exc_info=ex)
             raise
 
+    @classmethod
+    async def _sync(cls) -> Optional[Reading]:
+        """Ingest the readings shared by the leader or, if some were missed, stored since the
+        latest one in memory. Returns the latest."""
+        if not cls._sync_shared():
+            latest = cls.buffer.latest
+            after = (
+                latest.last_updated
+                if latest is not None
+                else datetime.utcnow() - cls.buffer.horizon
+            )
+            async with read_session() as session:
+                readings = await cls._db(session).get_readings_after(after)
+            for reading in readings:
+                cls._ingest(reading)
+            logger.debug(f"SYNC {cls.SATELLITE_ID} - {len(readings)} readings")
+            cls._sync_shared(after_gap=True)  # Those not written yet
+        cls._last_retrieved = datetime.utcnow()
+        return cls.buffer.latest
+
+    @classmethod
+    def _sync_shared(cls, after_gap: bool = False) -> bool:
+        """Ingest the readings the leader published since the last ones ingested, from shared
+        memory. Returns False if unavailable or some were missed (unless `after_gap`)."""
+        if cls.shared is None or cls._shared_slot is None:
+            return False
+        count, readings, complete = cls.shared.read_since(
+            cls._shared_slot, cls._shared_count
+        )
+        if not (complete or after_gap):
+            return False
+        if count != cls._shared_count:  # The leader is polling
+            cls._shared_count = count
+            cls._last_retrieved = datetime.utcnow()
+        for reading in readings:
+            cls._ingest(reading)
+        return True
+
     @classmethod
     async def _get_last_update(cls):
-        response = requests.get(cls.SATELLITE_REALTIME_URL)
+        response = await cls.upstream.get(cls.SATELLITE_REALTIME_URL)
         data = response.json()
         if data:
             data["last_updated"] = SatelliteDB.to_naive_datetime(data["last_updated"])
@@ -143,5 +646,56 @@ class SatelliteData:
         return None
 
 
+SatelliteData._init_state(*next(iter(Settings.SATELLITES.items())))
+
+
+class Satellites:
+    """Registry of the tracked satellites' SatelliteData classes, by satellite id."""
+
+    registry: Dict[str, Type[SatelliteData]] = {
+        satellite_id: (
+            SatelliteData
+            if satellite_id == SatelliteData.SATELLITE_ID
+            else SatelliteData.for_satellite(satellite_id, url)
+        )
+        for satellite_id, url in Settings.SATELLITES.items()
+    }
+    pollers: Dict[str, AdaptivePoller] = {}
+
+    @classmethod
+    def get(cls, satellite_id: str) -> Type[SatelliteData]:
+        """The SatelliteData class of a satellite. Raises KeyError if not tracked."""
+        return cls.registry[satellite_id]
+
+    @classmethod
+    def start_polling(cls):
+        """Start polling every satellite on its own, adapting to its feed's cadence."""
+        for satellite_id, satellite in cls.registry.items():
+            poller = cls.pollers.get(satellite_id)
+            if poller is None:
+                poller = cls.pollers[satellite_id] = AdaptivePoller(
+                    satellite_id,
+                    satellite.refresh,
+                    interval=Settings.POLL_INTERVAL_SECONDS,
+                    min_interval=Settings.POLL_MIN_INTERVAL_SECONDS,
+                    max_interval=Settings.POLL_MAX_INTERVAL_SECONDS,
+                    margin=Settings.POLL_MARGIN_SECONDS,
+                    max_backoff=Settings.POLL_MAX_BACKOFF_SECONDS,
+                )
+            satellite.poller = poller
+            poller.start()
+
+    @classmethod
+    async def stop_polling(cls):
+        for poller in cls.pollers.values():
+            await poller.stop()
+
+    @classmethod
+    async def warm_up(cls):
+        """Warm up the in-memory state of every satellite from the DB."""
+        for satellite in cls.registry.values():
+            await satellite.warm_up()
+
+
 if __name__ == "__main__":
-    print(SatelliteData.SATELLITE_REALTIME_URL)
+    logger.info(SatelliteData.SATELLITE_REALTIME_URL)
@@ -0,0 +1,108 @@
+"""Shared async HTTP client for the upstream satellite feed."""
+import asyncio
+from typing import Optional
+
+import httpx
+
+from moon_leasing.metrics import Counter, Histogram
+from moon_leasing.settings import Settings
+
+logger = Settings.get_logger(__name__)
+
+UPSTREAM_SECONDS = Histogram(
+    "moon_leasing_upstream_request_seconds", "Latency of upstream HTTP requests"
+)
+UPSTREAM_ERRORS = Counter(
+    "moon_leasing_upstream_errors_total",
+    "Failed upstream HTTP requests, retried or not, by error or status code",
+    ["reason"],
+)
+
+
+class UpstreamClient:
+    """Non-blocking HTTP client with a keep-alive connection pool, timeouts and retries.
+
+    The underlying `httpx.AsyncClient` is created on first use and shared by all callers,
+    which wait for their turn when `max_connections` requests are already running.
+    Connection errors, timeouts and `RETRY_STATUSES` responses are retried up to `retries`
+    times, with exponential backoff starting at `backoff` seconds.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_connections: int = 10,
+        retries: int = 2,
+        backoff: float = 0.5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=read_timeout,
+            pool=connect_timeout,
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared `httpx.AsyncClient` (re)created when needed."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, limits=self.limits, transport=self.transport
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Bounds the requests running at once (created on first use, in the event loop)."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        return self._semaphore
+
+    async def get(self, url: str) -> httpx.Response:
+        """GET `url`, retrying transient failures. Raises `httpx.HTTPError` on failure."""
+        for attempt in range(self.retries):
+            try:
+                response = await self._get(url)
+            except httpx.TransportError as ex:
+                logger.warning(f"{url} failed ({type(ex).__name__}: {ex}), retrying")
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    break
+                logger.warning(f"{url} returned {response.status_code}, retrying")
+            await asyncio.sleep(self.backoff * 2**attempt)
+        else:
+            response = await self._get(url)
+        response.raise_for_status()
+        return response
+
+    async def _get(self, url: str) -> httpx.Response:
+        async with self.semaphore:
+            try:
+                with UPSTREAM_SECONDS.time():
+                    response = await self.client.get(url)
+            except httpx.TransportError as ex:
+                UPSTREAM_ERRORS.labels(type(ex).__name__).inc()
+                raise
+        if response.is_error:
+            UPSTREAM_ERRORS.labels(str(response.status_code)).inc()
+        return response
+
+    async def aclose(self):
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
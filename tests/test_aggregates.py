@@ -0,0 +1,118 @@
+"""Tests for aggregates.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from moon_leasing.aggregates import WindowAggregate, WindowAggregates, downsample
+from moon_leasing.cache import Reading
+
+
+class TestWindowAggregate(unittest.TestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37)
+
+    def reading(self, seconds, altitude):
+        return Reading(self.now + timedelta(seconds=seconds), altitude)
+
+    def assert_matches(self, aggregate, readings, now):
+        aggregate.expire(now)
+        expected = [
+            item.altitude
+            for item in readings
+            if item.last_updated >= now - aggregate.window
+        ]
+        self.assertEqual(aggregate.count, len(expected))
+        if expected:
+            self.assertEqual(aggregate.minimum, min(expected))
+            self.assertEqual(aggregate.maximum, max(expected))
+            self.assertAlmostEqual(aggregate.average, sum(expected) / len(expected))
+        else:
+            self.assertIsNone(aggregate.average)
+
+    def test_matches_recomputed_stats(self):
+        rnd = random.Random(42)
+        aggregate = WindowAggregate(timedelta(minutes=1))
+        readings = []
+        for idx in range(500):
+            reading = self.reading(idx * 7, rnd.uniform(100, 300))
+            readings.append(reading)
+            aggregate.add(reading)
+            with self.subTest(idx=idx):
+                self.assert_matches(aggregate, readings, reading.last_updated)
+
+    def test_expires_with_time(self):
+        aggregate = WindowAggregate(timedelta(minutes=1))
+        readings = [self.reading(0, 150), self.reading(30, 250), self.reading(45, 200)]
+        for reading in readings:
+            aggregate.add(reading)
+        self.assert_matches(aggregate, readings, self.now + timedelta(seconds=70))
+        self.assertEqual(aggregate.minimum, 200)
+        self.assert_matches(aggregate, readings, self.now + timedelta(minutes=5))
+
+    def test_late_and_duplicate_readings(self):
+        aggregate = WindowAggregate(timedelta(minutes=1))
+        readings = [self.reading(0, 200), self.reading(30, 250), self.reading(15, 100)]
+        for reading in readings:
+            self.assertTrue(aggregate.add(reading))
+        self.assertFalse(aggregate.add(self.reading(15, 300)))
+        self.assertFalse(aggregate.add(self.reading(-60, 300)))
+        self.assert_matches(aggregate, readings, self.now + timedelta(seconds=30))
+
+    def test_merge(self):
+        rnd = random.Random(5)
+        aggregate = WindowAggregate(timedelta(minutes=1))
+        merged = WindowAggregates([1])
+        for idx in range(20):
+            batch = sorted(
+                self.reading(idx * 10 - rnd.randint(0, 90), rnd.uniform(100, 300))
+                for _ in range(10)
+            )
+            for reading in batch:
+                aggregate.add(reading)
+            merged.merge(batch)
+            with self.subTest(idx=idx):
+                self.assertEqual(merged[1].readings, aggregate.readings)
+                newest = aggregate.readings[-1].last_updated
+                self.assert_matches(merged[1], aggregate.readings, newest)
+
+    def test_several_windows(self):
+        aggregates = WindowAggregates([5, 1, 60])
+        aggregates.add(self.reading(-120, 100))
+        aggregates.add(self.reading(0, 300))
+        self.assertEqual(aggregates.longest, timedelta(minutes=60))
+        self.assertEqual(aggregates[1].minimum, 300)
+        self.assertEqual(aggregates[5].minimum, 100)
+        self.assertNotIn(2, aggregates)
+
+    def test_downsample(self):
+        readings = [
+            self.reading(seconds, altitude)
+            for seconds, altitude in [
+                (-5, 50),
+                (0, 200),
+                (10, 100),
+                (20, 150),
+                (55, 300),
+            ]
+        ]
+        series = downsample(readings, self.now, self.now + timedelta(minutes=1), 4)
+        self.assertEqual(
+            series,
+            [
+                dict(
+                    start="2022-07-27T04:49:37Z", minimum=100, maximum=200, average=150
+                ),
+                dict(
+                    start="2022-07-27T04:49:52Z", minimum=150, maximum=150, average=150
+                ),
+                dict(
+                    start="2022-07-27T04:50:22Z", minimum=300, maximum=300, average=300
+                ),
+            ],
+        )
+        self.assertEqual(len(downsample(readings, self.now, self.now, 1)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Tests for broadcast.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import json
+import unittest
+
+from moon_leasing.broadcast import Broadcaster, Event
+
+
+class TestBroadcast(unittest.IsolatedAsyncioTestCase):
+    def test_event(self):
+        event = Event.create("reading", dict(altitude=200.5))
+        self.assertEqual(
+            json.loads(event.payload), dict(event="reading", altitude=200.5)
+        )
+        self.assertEqual(event.sse, f"event: reading\ndata: {event.payload}\n\n")
+
+    async def test_fan_out(self):
+        broadcaster = Broadcaster(queue_size=10)
+        self.assertIsNone(broadcaster.publish("reading", dict(altitude=1)))
+
+        initial = Event.create("health", dict(state="ok"))
+        first = broadcaster.subscribe(initial)
+        second = broadcaster.subscribe()
+        self.assertEqual(len(broadcaster), 2)
+        event = broadcaster.publish("reading", dict(altitude=2))
+
+        self.assertEqual(await first.get(), initial)
+        self.assertIs(await first.get(), event)
+        self.assertIs(await second.get(), event)
+
+        broadcaster.unsubscribe(second)
+        broadcaster.publish("reading", dict(altitude=3))
+        self.assertEqual(len(broadcaster), 1)
+        self.assertTrue(second.queue.empty())
+
+    async def test_slow_consumer_dropped(self):
+        broadcaster = Broadcaster(queue_size=2)
+        slow = broadcaster.subscribe()
+        fast = broadcaster.subscribe()
+        for altitude in range(3):
+            broadcaster.publish("reading", dict(altitude=altitude))
+            await fast.get()
+
+        self.assertEqual(len(broadcaster), 1)
+        self.assertEqual([event async for event in slow], [])
+        self.assertIsNone(await slow.get())
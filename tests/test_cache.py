@@ -0,0 +1,76 @@
+"""Tests for cache.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from moon_leasing.cache import Reading, ReadingBuffer
+
+
+class TestReadingBuffer(unittest.TestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37)
+
+    def reading(self, seconds, altitude=200.0):
+        return Reading(self.now + timedelta(seconds=seconds), altitude)
+
+    def test_keeps_time_order(self):
+        buffer = ReadingBuffer()
+        for seconds in [0, 30, 15, 45, 5]:
+            buffer.append(self.reading(seconds))
+        times = [item.last_updated for item in buffer]
+        self.assertEqual(times, sorted(times))
+
+    def test_ignores_duplicates(self):
+        buffer = ReadingBuffer()
+        self.assertTrue(buffer.append(self.reading(0, 200)))
+        self.assertTrue(buffer.append(self.reading(10, 210)))
+        self.assertFalse(buffer.append(self.reading(0, 150)))
+        self.assertEqual([item.altitude for item in buffer], [200, 210])
+
+    def test_bounded_by_size(self):
+        buffer = ReadingBuffer(maxlen=3)
+        for seconds in range(5):
+            buffer.append(self.reading(seconds))
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.latest, self.reading(4))
+        self.assertFalse(buffer.append(self.reading(-10)))
+
+    def test_bounded_by_horizon(self):
+        buffer = ReadingBuffer(horizon=timedelta(minutes=1))
+        for seconds in [0, 30, 60, 90]:
+            buffer.append(self.reading(seconds))
+        self.assertEqual(len(buffer), 3)
+        self.assertFalse(buffer.append(self.reading(20)))
+
+    def test_merge(self):
+        rnd = random.Random(3)
+        for maxlen in (5, 50):
+            buffer = ReadingBuffer(maxlen=maxlen, horizon=timedelta(minutes=1))
+            merged = ReadingBuffer(maxlen=maxlen, horizon=timedelta(minutes=1))
+            for _ in range(5):
+                batch = sorted(
+                    self.reading(rnd.randint(0, 120), rnd.uniform(100, 300))
+                    for _ in range(20)
+                )
+                buffer.extend(batch)
+                merged.merge(batch)
+                with self.subTest(maxlen=maxlen):
+                    self.assertEqual(list(merged), list(buffer))
+                    self.assertEqual(
+                        merged.since(self.now + timedelta(seconds=60)),
+                        buffer.since(self.now + timedelta(seconds=60)),
+                    )
+
+    def test_since(self):
+        buffer = ReadingBuffer()
+        buffer.extend(self.reading(seconds) for seconds in [0, 15, 30, 45])
+        self.assertEqual(
+            buffer.since(self.now + timedelta(seconds=15)),
+            [self.reading(15), self.reading(30), self.reading(45)],
+        )
+        self.assertEqual(buffer.since(self.now + timedelta(minutes=1)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
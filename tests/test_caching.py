@@ -0,0 +1,136 @@
+"""Tests for api/caching.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import gzip
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from moon_leasing.api.caching import ResponseCache, Validator, accepts_gzip, dumps
+
+
+class TestValidator(unittest.TestCase):
+    def test_create(self):
+        validator = Validator.create(None, max_age=15, now=1000)
+        self.assertEqual(validator, Validator.create(None, max_age=15, now=1004))
+        self.assertNotEqual(validator, Validator.create(None, max_age=15, now=1005))
+        self.assertEqual(validator.last_modified, datetime.utcfromtimestamp(990))
+
+        latest = datetime.utcfromtimestamp(995.5)
+        validator = Validator.create(latest, max_age=15, now=1000)
+        self.assertEqual(validator.last_modified, datetime.utcfromtimestamp(995))
+        self.assertEqual(validator.etag, 'W/"3b561fe0-66"')  # The same in any process
+        other = Validator.create(latest.replace(microsecond=1), max_age=15, now=1000)
+        self.assertNotEqual(validator.etag, other.etag)
+
+    def test_matches(self):
+        validator = Validator.create(None, max_age=15, now=1000)
+        headers = validator.headers(15)
+        self.assertEqual(headers["Cache-Control"], "max-age=15")
+        self.assertEqual(headers["Last-Modified"], "Thu, 01 Jan 1970 00:16:30 GMT")
+
+        self.assertFalse(validator.matches({}))
+        self.assertTrue(validator.matches({"if-none-match": headers["ETag"]}))
+        self.assertTrue(
+            validator.matches({"if-none-match": f'"x", {headers["ETag"][2:]}'})
+        )
+        self.assertTrue(validator.matches({"if-none-match": "*"}))
+        self.assertFalse(
+            validator.matches(
+                {"if-none-match": '"x"', "if-modified-since": headers["Last-Modified"]}
+            )
+        )
+        self.assertTrue(
+            validator.matches({"if-modified-since": headers["Last-Modified"]})
+        )
+        self.assertFalse(
+            validator.matches({"if-modified-since": "Thu, 01 Jan 1970 00:16:29 GMT"})
+        )
+        self.assertFalse(validator.matches({"if-modified-since": "yesterday"}))
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    def test_bucket_end(self):
+        cache = ResponseCache(max_age=15)
+        self.assertEqual(cache.bucket_end(now=990), datetime.utcfromtimestamp(1005))
+        self.assertEqual(cache.bucket_end(now=1004.9), datetime.utcfromtimestamp(1005))
+        self.assertEqual(cache.bucket_end(now=1005), datetime.utcfromtimestamp(1020))
+
+    async def test_respond(self):
+        cache = ResponseCache(max_age=3600, maxsize=2)
+        sequence, latest = 1, datetime(2022, 7, 27, 4, 49, 37)
+        compute = mock.AsyncMock(return_value={"data": "Altitude is A-OK"})
+
+        async def version():
+            return sequence, latest
+
+        response = await cache.respond({}, "health", version, compute)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b'{"data":"Altitude is A-OK"}')
+        etag = response.headers["etag"]
+
+        response = await cache.respond({}, "health", version, compute)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(compute.await_count, 1)
+
+        response = await cache.respond(
+            {"if-none-match": etag}, "health", version, compute
+        )
+        self.assertEqual((response.status_code, response.body), (304, b""))
+        self.assertEqual(compute.await_count, 1)
+
+        sequence = 2  # A late reading: recomputed, with the same validator
+        response = await cache.respond({}, "health", version, compute)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(compute.await_count, 2)
+
+        sequence, latest = 3, datetime(2022, 7, 27, 4, 49, 52)
+        response = await cache.respond(
+            {"if-none-match": etag}, "health", version, compute
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], etag)
+        self.assertEqual(compute.await_count, 3)
+
+        for key in ("stats", "other"):
+            await cache.respond({}, key, version, compute)
+        self.assertEqual(len(cache), 2)
+
+    async def test_gzip(self):
+        cache = ResponseCache(max_age=3600, gzip_min_size=100)
+        data = {"data": {"altitudes": [200.5] * 100}}
+
+        async def version():
+            return 1, None
+
+        async def compute():
+            return data
+
+        response = await cache.respond(
+            {"accept-encoding": "gzip, deflate"}, "stats", version, compute
+        )
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(response.body), dumps(data))
+
+        response = await cache.respond({}, "stats", version, compute)
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.body, dumps(data))
+
+        self.assertTrue(accepts_gzip({"accept-encoding": "br;q=1.0, gzip;q=0.5"}))
+        self.assertFalse(accepts_gzip({"accept-encoding": "gzip;q=0"}))
+        self.assertFalse(accepts_gzip({"accept-encoding": "identity"}))
+
+    async def test_ingested_while_computing(self):
+        cache = ResponseCache(max_age=3600)
+        versions = iter([(1, None), (2, None)])
+
+        async def version():
+            return next(versions)
+
+        response = await cache.respond(
+            {}, "health", version, mock.AsyncMock(return_value={})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("etag", response.headers)
+        self.assertEqual(len(cache), 0)
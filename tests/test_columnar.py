@@ -0,0 +1,129 @@
+"""Tests for columnar.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import random
+import statistics
+import unittest
+from datetime import datetime, timedelta
+
+from moon_leasing.aggregates import downsample
+from moon_leasing.cache import Reading
+from moon_leasing.columnar import ColumnarHistory, analyze, series
+
+start = datetime(2022, 7, 27, 4, 49, 37, 681136)
+
+
+def make_readings(count, seed=7):
+    rnd = random.Random(seed)
+    readings = []
+    last_updated = start
+    for _ in range(count):
+        last_updated += timedelta(seconds=rnd.uniform(1, 30))
+        readings.append(Reading(last_updated, rnd.uniform(100, 300)))
+    return readings
+
+
+class TestColumnarHistory(unittest.TestCase):
+    def test_add(self):
+        readings = make_readings(3000)
+        history = ColumnarHistory(capacity=4)
+        self.assertFalse(history.add(readings[0]))  # Not loaded yet
+        history.load([[tuple(item) for item in readings[:1000]], []])
+        shuffled = readings[1000:]
+        random.Random(1).shuffle(shuffled)
+        for reading in shuffled + readings[:10]:
+            history.add(reading)
+        self.assertEqual(len(history), 3000)
+        self.assertEqual(
+            history.altitudes.tolist(), [item.altitude for item in readings]
+        )
+        self.assertEqual(
+            history.times.astype(datetime).tolist(),
+            [item.last_updated for item in readings],
+        )
+
+        times, altitudes = history.range(
+            readings[10].last_updated, readings[20].last_updated
+        )
+        self.assertEqual(
+            altitudes.tolist(), [item.altitude for item in readings[10:20]]
+        )
+        self.assertEqual(len(times), 10)
+
+        history.clear()
+        self.assertEqual((len(history), history.loaded), (0, False))
+
+    def test_merge(self):
+        readings = make_readings(3000)
+        history = ColumnarHistory(capacity=4)
+        self.assertEqual(history.merge(readings), 0)  # Not loaded yet
+        history.load([[tuple(item) for item in readings[1000:2000:2]]])
+        shuffled = readings[::3] + readings[1000:2000]
+        random.Random(1).shuffle(shuffled)
+        self.assertEqual(history.merge(shuffled), 1167)  # Not the duplicates
+        self.assertEqual(history.merge(readings[2000:]), 667)  # A third already in
+        expected = sorted(set(readings[::3] + readings[1000:]))
+        self.assertEqual(
+            history.altitudes.tolist(), [item.altitude for item in expected]
+        )
+        self.assertEqual(
+            history.times.astype(datetime).tolist(),
+            [item.last_updated for item in expected],
+        )
+
+    def test_max_readings(self):
+        readings = make_readings(250)
+        history = ColumnarHistory(max_readings=100)
+        history.load([[tuple(item) for item in readings[:200]]])
+        self.assertEqual(len(history), 90)
+        for reading in readings[200:]:
+            history.add(reading)
+        self.assertLessEqual(len(history), 100)
+        self.assertEqual(history.altitudes[-1], readings[-1].altitude)
+
+
+class TestAnalyze(unittest.TestCase):
+    def test_analyze(self):
+        readings = make_readings(1000)
+        history = ColumnarHistory()
+        history.load([[tuple(item) for item in readings]])
+        since, until = readings[0].last_updated, readings[-1].last_updated
+        data = analyze(*history.range(), since, until, percentiles=(5, 50, 95))
+
+        altitudes = [item.altitude for item in readings]
+        self.assertEqual(data["count"], 1000)
+        self.assertEqual(data["minimum"], min(altitudes))
+        self.assertEqual(data["maximum"], max(altitudes))
+        self.assertAlmostEqual(data["average"], statistics.mean(altitudes))
+        self.assertAlmostEqual(data["stddev"], statistics.pstdev(altitudes))
+        self.assertEqual(list(data["percentiles"]), ["p5", "p50", "p95"])
+        self.assertAlmostEqual(data["percentiles"]["p50"], statistics.median(altitudes))
+        rates = [
+            (later.altitude - earlier.altitude)
+            / (later.last_updated - earlier.last_updated).total_seconds()
+            for earlier, later in zip(readings, readings[1:])
+        ]
+        self.assertAlmostEqual(data["rate_of_change"]["minimum"], min(rates))
+        self.assertAlmostEqual(data["rate_of_change"]["maximum"], max(rates))
+        self.assertNotIn("series", data)
+
+        self.assertEqual(
+            analyze(*history.range(until, until), until, until),
+            dict(since=until.isoformat() + "Z", until=until.isoformat() + "Z", count=0),
+        )
+
+    def test_series(self):
+        readings = make_readings(1000)
+        history = ColumnarHistory()
+        history.load([[tuple(item) for item in readings]])
+        since = readings[100].last_updated - timedelta(seconds=1)
+        until = readings[-1].last_updated
+        for points in (1, 7, 60, 5000):
+            with self.subTest(points=points):
+                actual = series(*history.range(since, until), since, until, points)
+                expected = downsample(readings[:-1], since, until, points)
+                self.assertEqual(len(actual), len(expected))
+                for item, other in zip(actual, expected):
+                    self.assertEqual(item["start"], other["start"])
+                    self.assertEqual(item["minimum"], other["minimum"])
+                    self.assertAlmostEqual(item["average"], other["average"])
@@ -0,0 +1,230 @@
+"""Tests for db/crud.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import os
+import random
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+from sqlalchemy import delete, inspect, text
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import (
+    async_session,
+    Base,
+    create_tables,
+    dispose_engines,
+    engine,
+)
+from moon_leasing.db.crud import SatelliteDB, ceil_time, floor_time
+from moon_leasing.db.models.satellite import SatelliteRollupTable, SatelliteSketchTable
+
+
+class TestRollups(unittest.IsolatedAsyncioTestCase):
+    start = datetime(2022, 7, 27, 4, 49, 37, 681136)
+
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+        rnd = random.Random(7)
+        self.readings = []
+        last_updated = self.start
+        for _ in range(1000):
+            last_updated += timedelta(seconds=rnd.uniform(1, 30))
+            self.readings.append(Reading(last_updated, rnd.uniform(100, 300)))
+        self.end = last_updated
+
+    @staticmethod
+    async def insert(readings):
+        async with async_session() as session:
+            async with session.begin():
+                return await SatelliteDB(db_session=session).insert_many(readings)
+
+    @staticmethod
+    async def get_stats(since):
+        async with async_session() as session:
+            return await SatelliteDB(db_session=session).get_stats(since=since)
+
+    async def assert_stats(self, since):
+        altitudes = [
+            item.altitude for item in self.readings if item.last_updated >= since
+        ]
+        minimum, maximum, total, count = await self.get_stats(since)
+        self.assertEqual(count, len(altitudes))
+        self.assertEqual(minimum, min(altitudes))
+        self.assertEqual(maximum, max(altitudes))
+        self.assertAlmostEqual(total, sum(altitudes), 6)
+
+    async def test_get_stats(self):
+        await self.insert(self.readings[:400])
+        await self.insert(self.readings[300:])
+        for minutes in [1, 5, 59, 60, 61, 90, 200, 24 * 60]:
+            with self.subTest(minutes=minutes):
+                await self.assert_stats(self.end - timedelta(minutes=minutes))
+        await self.assert_stats(self.start - timedelta(seconds=1))
+
+    async def test_duplicates_not_counted(self):
+        inserted = await self.insert(self.readings[:10] + self.readings[:5])
+        self.assertEqual(inserted, self.readings[:10])
+        self.assertEqual(await self.insert(self.readings[5:10]), [])
+        _minimum, _maximum, _total, count = await self.get_stats(self.start)
+        self.assertEqual(count, 10)
+
+    async def test_insert_locks_readings(self):
+        await self.insert(self.readings[:10])
+        async with async_session() as session:
+            async with session.begin():
+                db = SatelliteDB(db_session=session)
+                self.assertEqual(await db.insert_many(self.readings[:10]), [])
+                # Until committed, no other writer can insert what was found missing
+                other = sqlite3.connect("temp_test_satellite.db", timeout=0)
+                self.addCleanup(other.close)
+                with self.assertRaises(sqlite3.OperationalError):
+                    other.execute(
+                        "INSERT INTO satellite_status (satellite_id, last_updated,"
+                        " altitude) VALUES ('default', '2022-07-27 04:49:38', 200)"
+                    )
+        _minimum, _maximum, _total, count = await self.get_stats(self.start)
+        self.assertEqual(count, 10)
+
+    async def test_backfill_rollups(self):
+        await self.insert(self.readings)
+        async with async_session() as session:
+            async with session.begin():
+                await session.execute(delete(SatelliteRollupTable))
+                await SatelliteDB(db_session=session).backfill_rollups(chunk_size=64)
+        await self.assert_stats(self.end - timedelta(minutes=100))
+
+    async def assert_percentiles(self, since):
+        altitudes = sorted(
+            item.altitude for item in self.readings if item.last_updated >= since
+        )
+        async with async_session() as session:
+            sketch = await SatelliteDB(db_session=session).get_sketch(since=since)
+        self.assertEqual(len(sketch), len(altitudes))
+        for percentile, value in sketch.percentiles((1, 50, 90, 99)).items():
+            expected = altitudes[
+                int(float(percentile[1:]) / 100 * (len(altitudes) - 1))
+            ]
+            self.assertLessEqual(abs(value - expected), sketch.alpha * expected)
+
+    async def test_get_sketch(self):
+        await self.insert(self.readings[:400])
+        await self.insert(self.readings[300:])
+        for minutes in [1, 59, 61, 200, 24 * 60]:
+            with self.subTest(minutes=minutes):
+                await self.assert_percentiles(self.end - timedelta(minutes=minutes))
+
+        async with async_session() as session:
+            async with session.begin():
+                await session.execute(delete(SatelliteSketchTable))
+                await SatelliteDB(db_session=session).backfill_sketches(chunk_size=64)
+        await self.assert_percentiles(self.start)
+
+    def test_bucket_bounds(self):
+        self.assertEqual(floor_time(self.start, 60), datetime(2022, 7, 27, 4, 49))
+        self.assertEqual(ceil_time(self.start, 3600), datetime(2022, 7, 27, 5))
+        self.assertEqual(
+            ceil_time(datetime(2022, 7, 27, 5), 3600), datetime(2022, 7, 27, 5)
+        )
+
+
+class TestReads(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        self.now = datetime.utcnow()
+        self.readings = [
+            Reading(self.now - timedelta(seconds=seconds), altitude)
+            for seconds, altitude in [(10, 200.0), (70, 150.0), (400, 100.0)]
+        ]
+        async with async_session() as session:
+            async with session.begin():
+                await SatelliteDB(db_session=session).insert_many(self.readings)
+
+    async def test_get_latest_readings(self):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session)
+            self.assertEqual(await db.get_latest_readings(minutes=5), self.readings[:2])
+            self.assertEqual(await db.get_latest_readings(minutes=None), self.readings)
+            self.assertEqual(await db.get_last_reading(), self.readings[0])
+            times = [item.last_updated for item in self.readings]
+            for count, expected in zip(range(1, 5), times + [None]):
+                self.assertEqual(await db.get_nth_latest_time(count), expected)
+
+    async def test_get_raw_stats(self):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session)
+            since = self.now - timedelta(minutes=5)
+            self.assertEqual(await db.get_raw_stats(since), (150.0, 200.0, 350.0, 2))
+            self.assertEqual(
+                await db.get_raw_stats(since, until=self.now - timedelta(minutes=1)),
+                (150.0, 150.0, 150.0, 1),
+            )
+            self.assertEqual(await db.get_raw_stats(self.now), (None, None, None, 0))
+
+    async def test_any_below(self):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session)
+            since = self.now - timedelta(minutes=2)
+            self.assertTrue(await db.any_below(160, since=since))
+            self.assertFalse(await db.any_below(150, since=since))
+            self.assertFalse(
+                await db.any_below(160, since=self.now - timedelta(minutes=1))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class TestMigration(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            for statement in [  # As created before satellite_id
+                "CREATE TABLE satellite_status (id INTEGER NOT NULL, last_updated"
+                " DATETIME NOT NULL, altitude FLOAT NOT NULL, retrieved DATETIME,"
+                " PRIMARY KEY (id))",
+                "CREATE UNIQUE INDEX ix_satellite_status_last_updated"
+                " ON satellite_status (last_updated)",
+                "INSERT INTO satellite_status (last_updated, altitude)"
+                " VALUES ('2022-07-27 04:49:37.681136', 213.0)",
+            ]:
+                await conn.execute(text(statement))
+
+    async def test_add_satellite_id(self):
+        for _ in range(2):  # Once migrated, left as is
+            await create_tables()
+
+        async with engine.connect() as conn:
+            indexes = await conn.run_sync(
+                lambda sync_conn: inspect(sync_conn).get_indexes("satellite_status")
+            )
+        self.assertEqual(
+            [index["column_names"] for index in indexes],
+            [["satellite_id", "last_updated"]],
+        )
+        async with async_session() as session:
+            async with session.begin():
+                db = SatelliteDB(db_session=session)
+                self.assertEqual([item.altitude for item in await db.get_all()], [213])
+                other = SatelliteDB(db_session=session, satellite_id="moon-2")
+                last_updated = datetime(2022, 7, 27, 4, 49, 37, 681136)
+                inserted = await other.insert_many([Reading(last_updated, 300)])
+                self.assertEqual(len(inserted), 1)  # Unique per satellite only
@@ -0,0 +1,53 @@
+"""Tests for diagnostics.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import logging
+import unittest
+
+from moon_leasing.diagnostics import (
+    RingBufferHandler,
+    level_number,
+    start_queue_logging,
+)
+
+
+class TestDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(f"test_diagnostics.{self.id()}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def test_ring_buffer(self):
+        handler = RingBufferHandler(capacity=3, level="INFO")
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        for idx in range(5):
+            self.logger.info("reading %s", idx)
+        self.logger.debug("not kept")
+        self.logger.warning("low altitude")
+
+        records = handler.get_records()
+        self.assertEqual(
+            [item["message"] for item in records],
+            ["reading 3", "reading 4", "low altitude"],
+        )
+        self.assertEqual(records[-1]["level"], "WARNING")
+        self.assertEqual(len(handler.get_records(limit=1)), 1)
+        self.assertEqual(len(handler.get_records(level="WARNING")), 1)
+
+    def test_queue_logging(self):
+        handler = RingBufferHandler()
+        listener = start_queue_logging(self.logger, handler)
+        self.logger.debug("queued %s", "message")
+        listener.stop()  # Handles the queued records
+        self.assertEqual(handler.get_records()[0]["message"], "queued message")
+
+    def test_level_number(self):
+        self.assertEqual(level_number("warning"), logging.WARNING)
+        self.assertEqual(level_number(15), 15)
+        with self.assertRaises(ValueError):
+            level_number("LOUD")
+
+
+if __name__ == "__main__":
+    unittest.main()
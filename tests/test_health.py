@@ -0,0 +1,88 @@
+"""Tests for health.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from moon_leasing.cache import Reading
+from moon_leasing.health import HealthMonitor
+
+
+class TestHealthMonitor(unittest.TestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37)
+
+    def reading(self, seconds, altitude):
+        return Reading(self.now - timedelta(seconds=seconds), altitude)
+
+    def expected_state(self, readings, monitor):
+        def altitudes(window):
+            return [
+                item.altitude
+                for item in readings
+                if item.last_updated >= self.now - window
+            ]
+
+        if not altitudes(monitor.critical_window):
+            return "missing"
+        if min(altitudes(monitor.critical_window)) < monitor.critical_altitude:
+            return "critical"
+        if min(altitudes(monitor.recovery_window)) < monitor.critical_altitude:
+            return "warning"
+        return "ok"
+
+    def test_transitions(self):
+        monitor = HealthMonitor(critical_altitude=160)
+        self.assertEqual(monitor.state(self.now), "missing")
+        monitor.add(self.reading(90, 150))
+        self.assertEqual(monitor.state(self.now), "missing")
+        monitor.add(self.reading(30, 200))
+        self.assertEqual(monitor.state(self.now), "warning")
+        monitor.add(self.reading(10, 159.99))
+        self.assertEqual(monitor.state(self.now), "critical")
+        self.assertEqual(monitor.state(self.now + timedelta(seconds=75)), "missing")
+        monitor.add(self.reading(-50, 300))
+        self.assertEqual(monitor.state(self.now + timedelta(seconds=75)), "warning")
+        monitor.add(self.reading(-100, 300))
+        self.assertEqual(monitor.state(self.now + timedelta(seconds=111)), "ok")
+
+        monitor.clear()
+        self.assertEqual(monitor.state(self.now), "missing")
+
+    def test_next_transition(self):
+        monitor = HealthMonitor(critical_altitude=160)
+        self.assertIsNone(monitor.next_transition(self.now))
+        monitor.add(self.reading(10, 150))
+        monitor.add(self.reading(0, 200))
+        transitions = []
+        now = self.now
+        while now is not None:
+            transitions.append(monitor.state(now))
+            now = monitor.next_transition(now)
+            if now is not None:
+                self.assertEqual(monitor.state(now), transitions[-1])
+                now += timedelta(microseconds=1)
+        self.assertEqual(transitions, ["critical", "warning", "missing"])
+
+        later = self.now + timedelta(seconds=200)
+        monitor.add(Reading(later, 200))
+        self.assertEqual(monitor.state(later), "ok")
+        self.assertEqual(monitor.next_transition(later), later + timedelta(seconds=60))
+
+    def test_matches_window_scan(self):
+        rnd = random.Random(16)
+        for _ in range(200):
+            monitor = HealthMonitor(
+                critical_altitude=160,
+                critical_window=timedelta(seconds=rnd.choice([30, 60])),
+                recovery_window=timedelta(seconds=rnd.choice([60, 120])),
+            )
+            readings = [
+                self.reading(rnd.uniform(0, 180), rnd.uniform(150, 200))
+                for _ in range(rnd.randint(0, 8))
+            ]
+            for reading in readings:  # Not in time order
+                monitor.add(reading)
+            self.assertEqual(
+                monitor.state(self.now), self.expected_state(readings, monitor)
+            )
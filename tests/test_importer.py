@@ -0,0 +1,145 @@
+"""Tests for importer.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session, Base, dispose_engines, engine
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.importer import ReadingImporter, parse_readings
+
+start = datetime(2022, 7, 27, 4, 49, 37, 681136)
+
+
+def csv_lines(count, first=0):
+    return [
+        f"{(start + timedelta(seconds=10 * index)).isoformat()}Z,{200 + index}\n"
+        for index in range(first, first + count)
+    ]
+
+
+class TestParseReadings(unittest.TestCase):
+    def test_parse(self):
+        rows = [
+            ("2022-07-27T04:49:37.681136Z", "213.5"),
+            ("2022-07-27T06:49:37+02:00", 150),
+            ("27 Jul 2022 04:49:38 UTC", "1e2"),  # Parsed by dateutil
+        ]
+        self.assertEqual(
+            parse_readings(rows),
+            (
+                [
+                    Reading(start, 213.5),
+                    Reading(start.replace(microsecond=0), 150.0),
+                    Reading(start.replace(second=38, microsecond=0), 100.0),
+                ],
+                0,
+            ),
+        )
+
+    def test_vectorized(self):
+        rows = [
+            ("2022-07-27T04:49:37.681136Z", "200"),
+            ("2022-07-27T04:49:47.681136", "201"),  # UTC, with or without a "Z"
+            ("2022-07-27 04:49:57.681136", 202.0),
+            ("2022-07-27T04:50:07Z", 150),
+        ]
+        with mock.patch.object(SatelliteDB, "to_naive_datetime") as to_datetime:
+            readings, rejected = parse_readings(rows)
+        to_datetime.assert_not_called()
+        self.assertEqual(
+            readings,
+            [
+                Reading(start, 200.0),
+                Reading(start + timedelta(seconds=10), 201.0),
+                Reading(start + timedelta(seconds=20), 202.0),
+                Reading(start.replace(second=7, minute=50, microsecond=0), 150.0),
+            ],
+        )
+        self.assertEqual(rejected, 0)
+        for invalid in ["now", "today", "NaT", "", None, 1658897377]:
+            with self.subTest(invalid=invalid):
+                self.assertEqual(parse_readings([(invalid, 150)]), ([], 1))
+
+    def test_invalid(self):
+        rows = [
+            ("2022-07-27T04:49:37.681136Z", "213.5"),
+            ("yesterday-ish", "213.5"),
+            ("2022-07-27T04:49:38Z", "high"),
+            ("2022-07-27T04:49:39Z", "nan"),
+            (None, None),
+        ]
+        self.assertEqual(parse_readings(rows), ([Reading(start, 213.5)], 4))
+
+
+class TestReadingImporter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    @staticmethod
+    async def stored(satellite_id="default"):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+            return sorted(
+                (item.last_updated, item.altitude) for item in await db.get_all()
+            )
+
+    async def test_csv(self):
+        inserted = []
+        importer = ReadingImporter(batch_size=7, on_insert=inserted.extend)
+        await importer.feed(["altitude,last_updated\n"])
+        for first in range(0, 20, 5):  # Any line may be the last one of a part
+            lines = csv_lines(5, first)
+            await importer.feed(
+                [",".join(reversed(line.strip().split(","))) for line in lines]
+            )
+        self.assertEqual(importer.read, 14)
+        self.assertEqual(
+            await importer.close(), dict(read=20, inserted=20, duplicates=0, rejected=0)
+        )
+        self.assertEqual(len(inserted), 20)
+
+        importer = ReadingImporter(batch_size=7)  # No header, overlapping
+        await importer.feed(csv_lines(10, 15) + ["garbage\n", "\n"])
+        self.assertEqual(
+            await importer.close(), dict(read=11, inserted=5, duplicates=5, rejected=1)
+        )
+        stored = await self.stored()
+        self.assertEqual(len(stored), 25)
+        self.assertEqual(stored[0], (start, 200))
+
+    async def test_ndjson(self):
+        lines = [
+            json.dumps(
+                dict(
+                    last_updated=f"{(start + timedelta(seconds=index)).isoformat()}Z",
+                    altitude=index,
+                )
+            )
+            for index in range(3)
+        ]
+        importer = ReadingImporter("moon-2", fmt="ndjson")
+        await importer.feed(lines + lines[:1] + ["[1, 2]"])
+        self.assertEqual(
+            await importer.close(), dict(read=5, inserted=3, duplicates=1, rejected=1)
+        )
+        self.assertEqual(len(await self.stored("moon-2")), 3)
+        self.assertEqual(await self.stored(), [])
+
+        with self.assertRaises(ValueError):
+            ReadingImporter(fmt="xml")
@@ -0,0 +1,65 @@
+"""Tests for db/leadership.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+from moon_leasing.db.config import Base, dispose_engines, engine
+from moon_leasing.db.leadership import LeaderElection
+
+
+class TestLeaderElection(unittest.IsolatedAsyncioTestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37)
+
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        self.changes = []
+
+    def election(self, holder):
+        async def on_change(is_leader):
+            self.changes.append((holder, is_leader))
+
+        return LeaderElection(lease_seconds=15, on_change=on_change, holder=holder)
+
+    async def test_failover(self):
+        first, second = self.election("first"), self.election("second")
+        self.assertTrue(await first.campaign(self.now))
+        self.assertFalse(await second.campaign(self.now))
+        self.assertTrue(await first.campaign(self.now + timedelta(seconds=10)))
+        self.assertFalse(await second.campaign(self.now + timedelta(seconds=20)))
+
+        # The first one stalls: the second one takes over once the lease expired
+        self.assertTrue(await second.campaign(self.now + timedelta(seconds=26)))
+        self.assertFalse(await first.campaign(self.now + timedelta(seconds=30)))
+        self.assertEqual(
+            self.changes, [("first", True), ("second", True), ("first", False)]
+        )
+
+    async def test_resign(self):
+        first, second = self.election("first"), self.election("second")
+        await first.campaign()
+        await first.resign()
+        self.assertFalse(first.is_leader)
+        self.assertTrue(await second.campaign())
+        self.assertFalse(await first.campaign())
+
+    async def test_db_unavailable(self):
+        election = self.election("first")
+        await election.campaign(self.now)
+        with mock.patch.object(election, "_acquire", side_effect=OSError("DB down")):
+            self.assertTrue(await election.campaign(self.now + timedelta(seconds=10)))
+            self.assertFalse(await election.campaign(self.now + timedelta(seconds=15)))
+        self.assertEqual(self.changes, [("first", True), ("first", False)])
@@ -0,0 +1,404 @@
+"""Tests for api/main.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import gzip
+import json
+import os
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+import httpx
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from moon_leasing.api import main
+from moon_leasing.api.main import app, responses
+from moon_leasing.db.config import async_session, Base, dispose_engines, engine
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.settings import Settings
+from moon_leasing.space import SatelliteData, Satellites
+
+start = datetime(2022, 7, 27, 4, 49, 37, 681136)
+
+
+class TestImport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        for satellite in Satellites.registry.values():
+            satellite.reset()
+        responses.clear()
+        # Unlike TestClient, streams the request body in the chunks given
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        )
+        self.addAsyncCleanup(self.client.aclose)
+
+    @staticmethod
+    async def stored(satellite_id="default"):
+        async with async_session() as session:
+            db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+            return sorted(
+                (item.last_updated, item.altitude) for item in await db.get_all()
+            )
+
+    async def test_chunked_utf8(self):
+        body = "altitude,last_updated,note\n" + "".join(
+            f"{200 + index},{(start + timedelta(seconds=index)).isoformat()}Z,été\n"
+            for index in range(50)
+        )
+        data = body.encode("utf-8")
+
+        async def chunks(size=7):  # Splitting lines and multi-byte characters
+            for offset in range(0, len(data), size):
+                yield data[offset : offset + size]
+
+        response = await self.client.post(
+            "/satellites/default/import", content=chunks()
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), dict(read=50, inserted=50, duplicates=0, rejected=0)
+        )
+        stored = await self.stored()
+        self.assertEqual(stored[0], (start, 200))
+        self.assertEqual(stored[-1][1], 249)
+
+    async def test_format(self):
+        lines = [
+            json.dumps(
+                dict(
+                    last_updated=f"{(start + timedelta(seconds=index)).isoformat()}Z",
+                    altitude=index,
+                )
+            )
+            for index in range(3)
+        ]
+        body = "\n".join(lines)  # No final newline
+        for headers, params, status in [
+            ({"content-type": "application/x-ndjson"}, {}, 200),
+            ({"content-type": "text/csv"}, {"format": "ndjson"}, 200),
+            ({}, {"format": "xml"}, 400),
+        ]:
+            with self.subTest(headers=headers, params=params):
+                response = await self.client.post(
+                    "/import", content=body, headers=headers, params=params
+                )
+                self.assertEqual(response.status_code, status)
+        self.assertEqual(len(await self.stored()), 3)
+
+        response = await self.client.post("/import", content=body)  # CSV by default
+        self.assertEqual(
+            response.json(), dict(read=3, inserted=0, duplicates=0, rejected=3)
+        )
+
+        response = await self.client.post("/satellites/unknown/import", content=body)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestApi(unittest.TestCase):
+    """Through the HTTP layer, with the app started up once for all the tests (without
+    polling nor leader election: the requests refresh from the mocked upstream)."""
+
+    client: TestClient
+    patchers: list
+    upstream = mock.AsyncMock()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patchers = [
+            mock.patch.object(
+                SatelliteData,
+                "upstream",
+                mock.Mock(get=cls.upstream, aclose=mock.AsyncMock()),
+            ),
+            mock.patch.object(main, "election", None),
+            mock.patch.object(Satellites, "start_polling"),
+        ]
+        for patcher in cls.patchers:
+            patcher.start()
+        client = TestClient(app)
+        cls.client = client.__enter__()  # pylint: disable=unnecessary-dunder-call
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+        for patcher in reversed(cls.patchers):
+            patcher.stop()
+
+    def setUp(self):
+        self.upstream.reset_mock(return_value=True, side_effect=True)
+        self.client.portal.call(self.reset)
+
+    @staticmethod
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        for satellite in Satellites.registry.values():
+            satellite.reset()
+        responses.clear()
+
+    def add_readings(self, count=300):
+        """Import `count` readings of the last 4 minutes, the newest also upstream's."""
+        now = datetime.utcnow()
+        times = [
+            now - timedelta(seconds=0.8 * (count - index)) for index in range(count)
+        ]
+        body = "last_updated,altitude\n" + "".join(
+            f"{moment.isoformat()}Z,{200 + index % 10}.5\n"
+            for index, moment in enumerate(times)
+        )
+        response = self.client.post("/import", content=body)
+        self.assertEqual(response.json()["inserted"], count)
+        self.upstream.side_effect = lambda url: SimpleNamespace(
+            json=lambda: dict(
+                last_updated=f"{times[-1].isoformat()}Z",
+                altitude=200 + (count - 1) % 10,
+            )
+        )
+
+    def drop_subscribers(self):
+        """Publish more events than the subscribers' queues hold, at once in the app's
+        event loop: the subscribers are dropped as slow consumers."""
+
+        def publish():
+            for _ in range(SatelliteData.broadcaster.queue_size + 1):
+                SatelliteData.broadcaster.publish("reading", {})
+
+        self.client.portal.call(publish)
+
+    def test_include(self):
+        self.add_readings()
+        response = self.client.get("/stats", params=dict(include=""))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["dlen"], 300)
+        self.assertEqual((data["minimum"], data["maximum"]), (200.5, 209.5))
+        self.assertFalse({"altitudes", "series", "percentiles"} & set(data))
+
+        response = self.client.get(
+            "/satellites/default/stats",
+            params=dict(include=" altitudes, series,,percentiles ", points=4),
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(len(data["altitudes"]), 300)
+        self.assertEqual(len(data["series"]), 4)
+        self.assertEqual(set(data["percentiles"]), {"p50", "p90", "p99"})
+
+        for include, detail in [
+            ("altitudes,foo", "Unknown include: foo"),
+            ("series,bar,foo", "Unknown include: bar, foo"),
+            ("Altitudes", "Unknown include: Altitudes"),
+        ]:
+            with self.subTest(include=include):
+                response = self.client.get("/stats", params=dict(include=include))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), dict(detail=detail))
+
+        response = self.client.get("/stats", params=dict(window=0))
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_readings(self):
+        self.upstream.side_effect = httpx.ConnectError("Unreachable")
+        for path in ["/stats", "/health", "/satellites/default/health"]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(
+                    response.json(), dict(detail="No altitude information available")
+                )
+
+        self.add_readings()  # Served from memory while upstream fails
+        self.upstream.side_effect = httpx.ConnectError("Unreachable")
+        self.assertEqual(self.client.get("/stats").status_code, 200)
+
+    def test_gzip(self):
+        self.add_readings()
+        path = "/stats?include=altitudes"
+        plain = self.client.get(path, headers={"Accept-Encoding": "identity"})
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(plain.headers["vary"], "Accept-Encoding")
+        self.assertGreaterEqual(len(plain.content), Settings.GZIP_MIN_SIZE)
+
+        with self.client.stream(
+            "GET", path, headers={"Accept-Encoding": "br;q=1.0, gzip;q=0.5"}
+        ) as zipped:
+            raw = b"".join(zipped.iter_raw())
+        self.assertEqual(zipped.headers["content-encoding"], "gzip")
+        self.assertEqual(zipped.headers["vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(raw), plain.content)
+
+        refused = self.client.get(path, headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("content-encoding", refused.headers)
+
+        small = self.client.get("/health", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", small.headers)
+        self.assertEqual(small.headers["vary"], "Accept-Encoding")
+
+    def test_not_modified(self):
+        self.add_readings()
+        # A single time bucket for all the requests, not to depend on the time they take
+        with mock.patch.object(responses, "max_age", 10**9):
+            for path in ["/health", "/stats", "/satellites/default/analytics"]:
+                with self.subTest(path=path):
+                    response = self.client.get(path)
+                    self.assertEqual(response.status_code, 200)
+                    etag = response.headers["etag"]
+                    last_modified = response.headers["last-modified"]
+                    for headers in [
+                        {"If-None-Match": etag},
+                        {"If-None-Match": f'"other", {etag[2:]}'},
+                        {"If-None-Match": "*"},
+                        {"If-Modified-Since": last_modified},
+                    ]:
+                        response = self.client.get(path, headers=headers)
+                        self.assertEqual(response.status_code, 304, headers)
+                        self.assertEqual(response.content, b"")
+                        self.assertEqual(response.headers["etag"], etag)
+                    for headers in [
+                        {"If-None-Match": '"other"'},
+                        {
+                            "If-None-Match": '"other"',
+                            "If-Modified-Since": last_modified,
+                        },
+                        {"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"},
+                        {"If-Modified-Since": "yesterday"},
+                    ]:
+                        response = self.client.get(path, headers=headers)
+                        self.assertEqual(response.status_code, 200, headers)
+
+            etag = self.client.get("/health").headers["etag"]
+            self.add_readings(count=1)  # A new reading: a new version
+            response = self.client.get("/health", headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers["etag"], etag)
+
+    def test_unknown_satellite(self):
+        for path in ["stats", "health", "history", "analytics", "events"]:
+            with self.subTest(path=path):
+                response = self.client.get(f"/satellites/unknown/{path}")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(
+                    response.json(), dict(detail="Unknown satellite: unknown")
+                )
+        self.assertEqual(self.client.get("/satellites").json(), dict(data=["default"]))
+
+    def test_events(self):
+        self.add_readings(count=1)
+        self.client.get("/health")
+        broadcaster = SatelliteData.broadcaster
+
+        def end_stream():  # Once both current events are sent, and a keep-alive
+            while not broadcaster._subscribers or any(  # pylint: disable=protected-access
+                not subscription.queue.empty()
+                for subscription in broadcaster._subscribers  # pylint: disable=protected-access
+            ):
+                time.sleep(0.01)
+            time.sleep(0.1)
+            self.drop_subscribers()
+
+        thread = threading.Thread(target=end_stream)
+        thread.start()
+        with mock.patch.object(Settings, "EVENTS_KEEPALIVE_SECONDS", 0.02):
+            response = self.client.get("/events")
+        thread.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.headers["content-type"].startswith("text/event-stream")
+        )
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        self.assertEqual(response.headers["x-accel-buffering"], "no")
+        *messages, end = response.text.split("\n\n")
+        self.assertEqual(end, "")
+        events = []
+        for message in messages:
+            if message.startswith(":"):
+                self.assertEqual(message, ": keep-alive")
+                continue
+            name, data = message.split("\n")
+            self.assertTrue(name.startswith("event: ") and data.startswith("data: "))
+            payload = json.loads(data[len("data: ") :])
+            self.assertEqual(payload["event"], name[len("event: ") :])
+            events.append(payload)
+        self.assertEqual([event["event"] for event in events], ["reading", "health"])
+        self.assertEqual(events[0]["satellite"], "default")
+        self.assertEqual(events[1]["state"], "ok")
+        self.assertEqual(messages[-1], ": keep-alive")
+        self.assertEqual(len(broadcaster), 0)
+
+    def test_websocket(self):
+        self.add_readings(count=1)
+        self.client.get("/health")
+        with self.client.websocket_connect("/satellites/default/ws") as websocket:
+            self.assertEqual(websocket.receive_json()["event"], "reading")
+            self.assertEqual(websocket.receive_json()["event"], "health")
+            self.drop_subscribers()
+            with self.assertRaises(WebSocketDisconnect) as context:
+                websocket.receive_json()
+            self.assertEqual(context.exception.code, 1013)
+        self.assertEqual(len(SatelliteData.broadcaster), 0)
+
+        with self.client.websocket_connect("/ws") as websocket:  # Unsubscribed on close
+            websocket.receive_json()
+            self.assertEqual(len(SatelliteData.broadcaster), 1)
+        self.client.get("/health")  # Handled once the disconnect is
+        self.assertEqual(len(SatelliteData.broadcaster), 0)
+
+    def test_metrics(self):
+        self.client.get("/satellites/unknown/health")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"],
+            "text/plain; version=0.0.4; charset=utf-8",
+        )
+        self.assertIn(
+            "moon_leasing_http_request_seconds_count{"
+            'method="GET",route="/satellites/{satellite_id}/health",status="404"}',
+            response.text,
+        )
+        self.assertIn(
+            "# TYPE moon_leasing_http_request_seconds histogram", response.text
+        )
+
+    def test_diagnostics(self):
+        response = self.client.get("/debug/diagnostics")
+        self.assertEqual(response.status_code, 404)
+
+        with mock.patch.object(Settings, "DIAGNOSTICS_ENDPOINT", True):
+            Settings.get_logger(__name__).warning("Diagnosed")
+            for _ in range(100):  # Logged through a queue, in a listener thread
+                data = self.client.get(
+                    "/debug/diagnostics", params=dict(level="WARNING", limit=1)
+                ).json()["data"]
+                if data and data[-1]["message"] == "Diagnosed":
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(data), 1)
+            self.assertEqual(data[0]["message"], "Diagnosed")
+            self.assertEqual(data[0]["level"], "WARNING")
+
+            response = self.client.get("/debug/diagnostics", params=dict(level="LOUD"))
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests for metrics.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import unittest
+
+from moon_leasing.metrics import Counter, Histogram, render
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = []
+
+    def test_counter(self):
+        counter = Counter("requests_total", "Requests", registry=self.registry)
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(
+            render(self.registry),
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            "requests_total 3\n",
+        )
+
+    def test_labels(self):
+        counter = Counter("errors_total", "Errors", ["reason"], registry=self.registry)
+        counter.labels("503").inc()
+        counter.labels('say "hi"\n').inc()
+        counter.labels("503").inc()
+        self.assertIs(counter.labels("503"), counter.labels("503"))
+        self.assertEqual(
+            render(self.registry).splitlines()[2:],
+            ['errors_total{reason="503"} 2', r'errors_total{reason="say \"hi\"\n"} 1'],
+        )
+        with self.assertRaises(ValueError):
+            counter.labels("503", "extra")
+
+    def test_histogram(self):
+        histogram = Histogram(
+            "latency_seconds",
+            "Latency",
+            ["route"],
+            buckets=[0.5, 0.1],
+            registry=self.registry,
+        )
+        for value in [0.05, 0.1, 0.3, 2]:
+            histogram.labels("/stats").observe(value)
+        self.assertEqual(
+            render(self.registry).splitlines()[2:],
+            [
+                'latency_seconds_bucket{route="/stats",le="0.1"} 2',
+                'latency_seconds_bucket{route="/stats",le="0.5"} 3',
+                'latency_seconds_bucket{route="/stats",le="+Inf"} 4',
+                'latency_seconds_sum{route="/stats"} 2.45',
+                'latency_seconds_count{route="/stats"} 4',
+            ],
+        )
+
+    def test_timer(self):
+        histogram = Histogram("took_seconds", "Took", registry=self.registry)
+        with histogram.time():
+            pass
+        lines = render(self.registry).splitlines()
+        self.assertIn('took_seconds_bucket{le="0.0005"} 1', lines)
+        self.assertIn("took_seconds_count 1", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
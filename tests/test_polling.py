@@ -0,0 +1,90 @@
+"""Tests for polling.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from moon_leasing.cache import Reading
+from moon_leasing.polling import AdaptivePoller, PublishCadence
+
+start = datetime(2022, 7, 27, 4, 49, 37)
+
+
+def at(seconds):
+    return start + timedelta(seconds=seconds)
+
+
+class TestPublishCadence(unittest.TestCase):
+    def test_cadence(self):
+        cadence = PublishCadence(samples=4)
+        self.assertIsNone(cadence.interval)
+        self.assertIsNone(cadence.next_update())
+
+        self.assertTrue(cadence.observe(at(0), at(3)))
+        self.assertIsNone(cadence.next_update())
+        self.assertFalse(cadence.observe(at(0), at(8)))  # Unchanged
+        self.assertTrue(cadence.observe(at(10), at(11.5)))
+        self.assertEqual(cadence.interval, 10)
+        self.assertEqual(cadence.lag, 1.5)
+        self.assertEqual(cadence.next_update(), at(21.5))
+
+        # A missed update doesn't throw the median off
+        for seconds in (20, 40, 50):
+            cadence.observe(at(seconds), at(seconds + 2))
+        self.assertEqual(cadence.interval, 10)
+        self.assertEqual(cadence.next_update(), at(61.5))
+
+        self.assertFalse(cadence.observe(at(45), at(62)))  # Out of order
+
+
+class TestAdaptivePoller(unittest.IsolatedAsyncioTestCase):
+    def poller(self, readings):
+        poll = mock.AsyncMock(side_effect=readings)
+        return AdaptivePoller(
+            "test", poll, interval=15, min_interval=2, max_interval=60, margin=0.5
+        )
+
+    async def test_schedule(self):
+        poller = self.poller(
+            [Reading(at(seconds), 213) for seconds in (0, 10, 10, 10, 10, 20)]
+            + [RuntimeError("down")] * 2
+            + [Reading(at(30), 213)]
+        )
+        self.assertEqual(await poller.poll_once(now=at(1)), 15)  # Cadence unknown
+        self.assertEqual(await poller.poll_once(now=at(11)), 10.5)  # At 21.5
+        self.assertEqual(await poller.poll_once(now=at(21.5)), 2.5)  # Late: retry soon
+        self.assertEqual(await poller.poll_once(now=at(24)), 5)  # Then less often
+        self.assertEqual(await poller.poll_once(now=at(29)), 10)
+        self.assertEqual(await poller.poll_once(now=at(30)), 2)  # At least min_interval
+
+        with mock.patch("random.uniform", return_value=1.0):
+            self.assertEqual(await poller.poll_once(), 15)
+            self.assertEqual(await poller.poll_once(), 30)
+        self.assertEqual(poller.failures, 2)
+        await poller.poll_once(now=at(31))
+        self.assertEqual(poller.failures, 0)
+
+    def test_backoff(self):
+        poller = self.poller([])
+        poller.max_backoff = 100
+        for failures, expected in [(1, 15), (2, 30), (3, 60), (4, 100), (10, 100)]:
+            poller.failures = failures
+            delays = [poller.backoff() for _ in range(100)]
+            self.assertLessEqual(max(delays), expected)
+            self.assertGreaterEqual(min(delays), expected / 2)
+            self.assertGreater(len(set(delays)), 1)  # Jittered
+
+    async def test_start_stop(self):
+        poller = self.poller(None)
+        poller.poll.side_effect = None
+        poller.poll.return_value = None
+        poller.interval = poller.min_interval = 0.01
+        poller.start()
+        await asyncio.sleep(0.05)
+        await poller.stop()
+        count = poller.poll.await_count
+        self.assertGreater(count, 1)
+        await asyncio.sleep(0.03)
+        self.assertEqual(poller.poll.await_count, count)
@@ -0,0 +1,97 @@
+"""Tests for db/retention.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+from sqlalchemy import select
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session, Base, dispose_engines, engine
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.models.satellite import SatelliteRollupTable
+from moon_leasing.db.retention import RetentionPolicy
+
+
+class TestRetentionPolicy(unittest.IsolatedAsyncioTestCase):
+    start = datetime(2022, 7, 24)
+    now = datetime(2022, 7, 27)
+
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+        self.readings = []
+        last_updated = self.start
+        while last_updated < self.now:
+            self.readings.append(Reading(last_updated, 200.0))
+            last_updated += timedelta(minutes=10)
+        async with async_session() as session:
+            async with session.begin():
+                for satellite_id in ["default", "moon-2"]:
+                    db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+                    await db.insert_many(self.readings)
+
+    @staticmethod
+    async def rollup_starts(resolution):
+        async with async_session() as session:
+            query = await session.execute(
+                select(SatelliteRollupTable.bucket_start).where(
+                    SatelliteRollupTable.resolution == resolution
+                )
+            )
+            return query.scalars().all()
+
+    async def test_run(self):
+        policy = RetentionPolicy(raw_days=1, minute_rollup_days=2, chunk_size=7)
+        deleted = await policy.run(now=self.now)
+        per_satellite = len(self.readings) * 2 // 3
+        self.assertEqual(deleted, dict(readings=2 * per_satellite, rollups=2 * 144))
+
+        async with async_session() as session:
+            for satellite_id in ["default", "moon-2"]:
+                db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+                readings = await db.get_latest_readings(minutes=None)
+                self.assertEqual(len(readings), len(self.readings) - per_satellite)
+                self.assertGreaterEqual(
+                    readings[-1].last_updated, self.now - timedelta(days=1)
+                )
+
+                # Whole hours are still counted, from the per-hour rollups
+                _minimum, _maximum, total, count = await db.get_stats(self.start)
+                self.assertEqual(count, len(self.readings))
+                self.assertEqual(total, 200.0 * len(self.readings))
+
+        minute_starts = await self.rollup_starts(60)
+        self.assertEqual(min(minute_starts), self.now - timedelta(days=2))
+        self.assertEqual(len(await self.rollup_starts(3600)), 2 * 72)
+
+        self.assertEqual(await policy.run(now=self.now), dict(readings=0, rollups=0))
+
+    async def test_keeps_min_raw_minutes(self):
+        policy = RetentionPolicy(
+            raw_days=0.5, minute_rollup_days=0, min_raw_minutes=1440
+        )
+        deleted = await policy.run(now=self.now)
+        self.assertEqual(
+            deleted, dict(readings=2 * len(self.readings) * 2 // 3, rollups=0)
+        )
+
+    async def test_disabled(self):
+        policy = RetentionPolicy(raw_days=0, minute_rollup_days=0)
+        self.assertEqual(await policy.run(now=self.now), dict(readings=0, rollups=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for shared.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from moon_leasing.cache import Reading
+from moon_leasing.shared import SharedReadings
+
+
+class TestSharedReadings(unittest.TestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37, 681136)
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "shared.shm"
+
+    def open(self, **kwargs):
+        shared = SharedReadings(self.path, **kwargs)
+        self.addCleanup(shared.close)
+        return shared
+
+    def reading(self, seconds, altitude=200.5):
+        return Reading(self.now + timedelta(seconds=seconds), altitude)
+
+    def test_publish_and_read(self):
+        writer = self.open(slots=2, capacity=4)
+        reader = self.open(slots=2, capacity=4)
+        self.assertEqual(reader.read_since(0, 0), (0, [], True))
+
+        readings = [self.reading(idx, 200 + idx) for idx in range(3)]
+        for reading in readings:
+            writer.publish(0, reading)
+        writer.publish(1, self.reading(10))
+        self.assertEqual(reader.published(0), 3)
+        self.assertEqual(reader.read_since(0, 0), (3, readings, True))
+        self.assertEqual(reader.read_since(0, 2), (3, readings[2:], True))
+        self.assertEqual(reader.read_since(1, 0), (1, [self.reading(10)], True))
+
+    def test_ring_wraps_around(self):
+        writer = self.open(slots=1, capacity=4)
+        readings = [self.reading(idx) for idx in range(6)]
+        for reading in readings:
+            writer.publish(0, reading)
+        self.assertEqual(writer.read_since(0, 3), (6, readings[3:], True))
+        # The first two were overwritten
+        self.assertEqual(writer.read_since(0, 1), (6, readings[2:], False))
+        # Reset (e.g. a new file) since the last read
+        self.assertEqual(writer.read_since(0, 10), (6, [], False))
+
+    def test_layout_changed(self):
+        first = SharedReadings(self.path, slots=1, capacity=4)
+        first.publish(0, self.reading(0))
+        second = SharedReadings(self.path, slots=1, capacity=4)
+        self.assertEqual(second.published(0), 1)
+        first.close()
+        with self.assertRaises(ValueError):  # Still in use by the second: not reset
+            SharedReadings(self.path, slots=2, capacity=8)
+        self.assertIsNone(SharedReadings.open(self.path, slots=2, capacity=8))
+        self.assertEqual(second.published(0), 1)
+
+        second.close()
+        self.assertEqual(self.open(slots=2, capacity=8).published(0), 0)  # Once unused
+        self.assertIsNone(SharedReadings.open("", slots=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
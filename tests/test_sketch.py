@@ -0,0 +1,73 @@
+"""Tests for sketch.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import random
+import unittest
+
+from moon_leasing.sketch import QuantileSketch
+
+QUANTILES = (0, 0.01, 0.1, 0.5, 0.9, 0.99, 1)
+
+
+def exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def assert_accurate(self, sketch, values):
+        self.assertEqual(len(sketch), len(values))
+        for q in QUANTILES:
+            with self.subTest(q=q):
+                expected = exact_quantile(values, q)
+                self.assertLessEqual(
+                    abs(sketch.quantile(q) - expected),
+                    sketch.alpha * abs(expected) + 1e-9,
+                )
+
+    def test_accuracy(self):
+        rnd = random.Random(7)
+        for alpha in (0.005, 0.01):  # Within max_bins
+            values = [rnd.lognormvariate(5, 1) for _ in range(10000)]
+            values += [-value for value in values[:1000]] + [0.0] * 10
+            sketch = QuantileSketch(alpha=alpha)
+            sketch.update(values)
+            self.assert_accurate(sketch, values)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+    def test_merge(self):
+        rnd = random.Random(1)
+        parts = [[rnd.uniform(140, 300) for _ in range(500)] for _ in range(24)]
+        merged = QuantileSketch()
+        for part in parts:
+            sketch = QuantileSketch()
+            sketch.update(part)
+            merged.merge(QuantileSketch.from_json(sketch.to_json()))
+        values = [value for part in parts for value in part]
+        self.assert_accurate(merged, values)
+        self.assertLess(len(merged.to_json()), 8000)  # Bounded by the range of values
+
+        whole = QuantileSketch()
+        whole.update(values)
+        self.assertEqual(whole.percentiles((50, 99)), merged.percentiles((50, 99)))
+
+        coarse = QuantileSketch(alpha=0.01)  # Re-binned, within both errors
+        coarse.merge(merged)
+        self.assertAlmostEqual(
+            coarse.quantile(0.5), exact_quantile(values, 0.5), delta=0.011 * 300
+        )
+
+    def test_max_bins(self):
+        sketch = QuantileSketch(alpha=0.01, max_bins=50)
+        values = [1.1**exponent for exponent in range(200)]
+        sketch.update(values)
+        self.assertLessEqual(len(sketch.to_json()), 50 * 12 + 200)
+        self.assertEqual(sketch.quantile(0), 1.0)  # The extremes are exact
+        self.assertEqual(sketch.quantile(1), values[-1])
+        self.assertGreater(
+            sketch.quantile(0.01), 2
+        )  # Collapsed: the bound doesn't hold
+        for q in (0.9, 1):  # Above the collapsed bins
+            expected = exact_quantile(values, q)
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), 0.01 * expected)
@@ -1,7 +1,10 @@
 """Tests for space.py"""
 # pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position,protected-access
 
+import asyncio
+import json
 import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -19,14 +22,21 @@ os.environ.update(  # Setup env before importing moon_leasing
     )
 )
 
+from moon_leasing.cache import Reading
+from moon_leasing.columnar import ColumnarHistory
 from moon_leasing.db.config import (
     async_session,
     Base,
+    dispose_engines,
     engine,
 )
 from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.writer import WriteBehindQueue
+from moon_leasing.health import HealthMonitor
 from moon_leasing.settings import Settings
-from moon_leasing.space import SatelliteData
+from moon_leasing.polling import AdaptivePoller
+from moon_leasing.shared import SharedReadings
+from moon_leasing.space import NoReadingsError, SatelliteData
 
 logger = Settings.get_logger(__name__)
 
@@ -56,7 +66,7 @@ class MockResponse:  # pylint: disable=too-few-public-methods
 
 
 class TestSatellite(unittest.IsolatedAsyncioTestCase):
-    mock_requests = None
+    mock_upstream = None
 
     @classmethod
     def setUpClass(cls) -> None:
@@ -64,25 +74,30 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
         os.environ["SATELLITE_REALTIME_URL"] = "https://foo.baz/api/data"
 
     def setUp(self) -> None:
-        requests_patcher = mock.patch("moon_leasing.space.requests")
-        self.mock_requests = requests_patcher.start()
-        self.addCleanup(requests_patcher.stop)
+        upstream_patcher = mock.patch.object(
+            SatelliteData, "upstream", mock.Mock(get=mock.AsyncMock())
+        )
+        self.mock_upstream = upstream_patcher.start()
+        self.addCleanup(upstream_patcher.stop)
 
-        self.mock_requests.get.return_value = MockResponse(
+        self.mock_upstream.get.return_value = MockResponse(
             last_updated="2022-07-27T04:49:37.681136Z", altitude=213
         )
 
+    async def asyncTearDown(self):
+        await dispose_engines()
+
     @staticmethod
     async def reset_db() -> None:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
             await conn.run_sync(Base.metadata.create_all)
             print("DB table created")
-        SatelliteData._last_retrieved = None
+        SatelliteData.reset()
 
     async def test_get_last_update(self):
         sample_data = {"last_updated": "2017-04-07T02:53:10.000Z", "altitude": "200"}
-        self.mock_requests.get.return_value = MockResponse(
+        self.mock_upstream.get.return_value = MockResponse(
             json_data=sample_data, status_code=200
         )
 
@@ -99,11 +114,12 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
                 db = SatelliteDB(db_session=session)
                 print(db)
                 for idx in range(3):
-                    self.mock_requests.get.return_value = MockResponse(
+                    self.mock_upstream.get.return_value = MockResponse(
                         last_updated="2022-07-27T04:49:37.681136Z", altitude=213
                     )
                     with self.subTest(f"db-empty-{idx}"):
                         health = await SatelliteData.health()
+                        await SatelliteData.writer.flush()
                         print(health)
                         logger.error(health)
                         self.assertEqual(
@@ -174,6 +190,7 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
                         records = await db.get_all()
                         print(records)
                         print("Done Inserting")
+                await SatelliteData.warm_up()  # As done at server startup
 
                 health = await SatelliteData.health()
 
@@ -195,7 +212,7 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
             os.environ[
                 "last_upd"
             ] = f"{os.environ.get('last_upd')}, {last_updated.minute%10}:{last_updated.second}-{record['altitude']}"
-            self.mock_requests.get.return_value = MockResponse(
+            self.mock_upstream.get.return_value = MockResponse(
                 json_data={
                     "last_updated": last_updated.isoformat(sep="T") + "Z",
                     "altitude": str(record["altitude"]),
@@ -206,6 +223,7 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
             )
             await SatelliteData.refresh()
             stats = await SatelliteData.stats()
+            await SatelliteData.writer.flush()
             name = f"{idx:2}-[{record.get('row')}]-{record.get('minutes')}:{record.get('seconds')}"
             with self.subTest(f"min-{name}"):
                 if record["min"] != stats["minimum"]:
@@ -254,6 +272,450 @@ class TestSatellite(unittest.IsolatedAsyncioTestCase):
         # print(data)
         # self.assertEqual(data, [42])
 
+    async def test_stats_opt_in_fields(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        for seconds, altitude in [(95, 180), (25, 200), (5, 220)]:
+            self.mock_upstream.get.return_value = MockResponse(
+                last_updated=now - timedelta(seconds=seconds), altitude=altitude
+            )
+            await SatelliteData.refresh()
+        await SatelliteData.writer.flush()
+
+        for window in (5, 3):  # In memory, from the DB
+            with self.subTest(window=window):
+                stats = await SatelliteData.stats(window=window)
+                self.assertNotIn("altitudes", stats)
+                self.assertNotIn("series", stats)
+                self.assertNotIn("percentiles", stats)
+                stats = await SatelliteData.stats(
+                    window=window,
+                    altitudes=True,
+                    points=window * 2,  # 30s buckets
+                    percentiles=(0, 50, 100),
+                )
+                self.assertEqual(stats["altitudes"], [180, 200, 220])
+                self.assertEqual(
+                    [point["average"] for point in stats["series"]], [180, 210]
+                )
+                self.assertEqual(list(stats["percentiles"]), ["p0", "p50", "p100"])
+                self.assertEqual(stats["percentiles"]["p0"], 180)
+                self.assertAlmostEqual(stats["percentiles"]["p50"], 200, delta=0.2)
+
+    async def test_stats_unwritten(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        for seconds, altitude in [(95, 180), (25, 200), (5, 220)]:
+            self.mock_upstream.get.return_value = MockResponse(
+                last_updated=now - timedelta(seconds=seconds), altitude=altitude
+            )
+            await SatelliteData.refresh()
+            if seconds == 95:
+                await SatelliteData.writer.flush()
+
+        for flushed in (False, True):  # From the DB and the writer, then the DB only
+            with self.subTest(flushed=flushed):
+                stats = await SatelliteData.stats(
+                    window=3, altitudes=True, percentiles=(100,)
+                )
+                self.assertEqual(stats["dlen"], 3)
+                self.assertEqual((stats["minimum"], stats["maximum"]), (180, 220))
+                self.assertEqual(stats["altitudes"], [180, 200, 220])
+                self.assertEqual(stats["percentiles"], dict(p100=220))
+                await SatelliteData.writer.flush()
+
+        self.mock_upstream.get.reset_mock()
+        stats = await SatelliteData.stats(window=1 / 60)  # No reading in the window
+        self.assertEqual((stats["average"], stats["dlen"]), (220, 0))
+        self.mock_upstream.get.assert_not_awaited()  # The latest in memory is used
+
+    async def test_follower_sync(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        async with async_session() as session:
+            async with session.begin():
+                await SatelliteDB(db_session=session).insert_many(
+                    [Reading(now - timedelta(seconds=20), 150), Reading(now, 200)]
+                )
+
+        with mock.patch.object(SatelliteData, "is_leader", False), mock.patch.object(
+            SatelliteData, "shared", None
+        ):
+            latest = await SatelliteData.refresh()
+            self.assertEqual(latest, Reading(now, 200))
+            self.assertEqual(len(SatelliteData.buffer), 2)
+            self.assertEqual(
+                await SatelliteData.health(), SatelliteData.messages["critical"]
+            )
+            await SatelliteData.refresh()  # Nothing new
+            self.assertEqual(len(SatelliteData.buffer), 2)
+        self.mock_upstream.get.assert_not_awaited()
+
+    async def test_follower_shared_sync(self):
+        await self.reset_db()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            leader = SharedReadings(Path(tmp_dir) / "shared.shm", slots=1, capacity=4)
+            follower = SharedReadings(Path(tmp_dir) / "shared.shm", slots=1, capacity=4)
+            self.addCleanup(follower.close)
+            self.addCleanup(leader.close)
+            now = datetime.utcnow()
+            readings = [Reading(now - timedelta(seconds=idx), 200) for idx in (2, 1, 0)]
+            for reading in readings[:2]:
+                leader.publish(0, reading)
+
+            with mock.patch.object(
+                SatelliteData, "is_leader", False
+            ), mock.patch.object(SatelliteData, "shared", follower):
+                self.assertEqual(await SatelliteData.refresh(), readings[1])
+                leader.publish(0, readings[2])
+                await SatelliteData.health()  # Picks up the new reading
+                self.assertEqual(SatelliteData.buffer.latest, readings[2])
+                self.assertEqual(len(SatelliteData.buffer), 3)
+        self.mock_upstream.get.assert_not_awaited()
+
+    async def test_refresh_single_flight(self):
+        await self.reset_db()
+        release = asyncio.Event()
+
+        async def slow_get(_url):
+            await release.wait()
+            return MockResponse(last_updated=datetime.utcnow(), altitude=213)
+
+        self.mock_upstream.get.side_effect = slow_get
+        waiters = [asyncio.ensure_future(SatelliteData.refresh()) for _ in range(50)]
+        await asyncio.sleep(0)
+        release.set()
+        entries = await asyncio.gather(*waiters)
+
+        self.assertEqual(self.mock_upstream.get.await_count, 1)
+        self.assertEqual(len({id(entry) for entry in entries}), 1)
+
+        await SatelliteData.refresh()
+        self.assertEqual(self.mock_upstream.get.await_count, 2)
+
+    async def test_refresh_unchanged(self):
+        await self.reset_db()
+        first = await SatelliteData.refresh()
+        version = await SatelliteData.version()
+        self.assertIs(await SatelliteData.refresh(), first)  # Upstream didn't update
+        self.assertEqual(await SatelliteData.version(), version)
+        self.assertEqual(len(SatelliteData.buffer), 1)
+
+        await SatelliteData.writer.flush()
+        async with async_session() as session:
+            records = await SatelliteData._db(session).get_all()
+        self.assertEqual(len(records), 1)
+
+    async def test_refresh_db_down(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        with mock.patch.object(SatelliteData, "writer", WriteBehindQueue(batch_size=3)):
+            with mock.patch(
+                "moon_leasing.db.writer.async_session", side_effect=OSError("DB down")
+            ):
+                for seconds in range(5, 0, -1):
+                    self.mock_upstream.get.return_value = MockResponse(
+                        last_updated=now - timedelta(seconds=seconds), altitude=200
+                    )
+                    await SatelliteData.refresh()
+            self.assertEqual(len(SatelliteData.buffer), 5)
+            self.assertEqual(len(SatelliteData.writer), 5)
+
+    async def test_refresh_fails(self):
+        await self.reset_db()
+        self.mock_upstream.get.side_effect = OSError("Upstream down")
+        with self.assertRaises(NoReadingsError):
+            await SatelliteData.health()
+
+        self.mock_upstream.get.side_effect = None
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow(), altitude=213
+        )
+        await SatelliteData.refresh()
+        SatelliteData._last_retrieved -= timedelta(minutes=1)
+        self.mock_upstream.get.side_effect = OSError("Upstream down")
+        self.mock_upstream.get.reset_mock()
+        self.assertEqual(await SatelliteData.health(), "Altitude is A-OK")
+        self.assertEqual((await SatelliteData.stats())["minimum"], 213)
+        # Retried in the background once STALE_AFTER_SECONDS after the failure only
+        self.assertEqual(self.mock_upstream.get.await_count, 1)
+        SatelliteData._failed_at -= timedelta(minutes=1)
+        await SatelliteData.version()
+        await asyncio.sleep(0)
+        self.assertEqual(self.mock_upstream.get.await_count, 2)
+
+    async def test_fresh_until_next_update(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        poller = AdaptivePoller("default", SatelliteData.refresh, margin=0.5)
+        for seconds in (120, 60, 0):
+            poller.cadence.observe(now - timedelta(seconds=seconds), now)
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=now, altitude=213
+        )
+        await SatelliteData.refresh()
+        SatelliteData._last_retrieved -= timedelta(seconds=30)
+        self.mock_upstream.get.reset_mock()
+        with mock.patch.object(SatelliteData, "poller", poller):
+            await SatelliteData.health()  # Next update expected in 60s
+            self.mock_upstream.get.assert_not_awaited()
+
+            poller.cadence.last_updated -= timedelta(seconds=90)  # Expected by now
+            await SatelliteData.health()
+            self.assertEqual(self.mock_upstream.get.await_count, 1)
+
+    async def test_add_imported(self):
+        await self.reset_db()
+        now = datetime.utcnow()
+        SatelliteData.add_imported(
+            [
+                Reading(now - timedelta(seconds=5), 150),
+                Reading(now - timedelta(days=30), 300),  # Too old to be kept in memory
+                Reading(now - timedelta(seconds=10), 200),
+            ]
+        )
+        self.assertEqual([item.altitude for item in SatelliteData.buffer], [200, 150])
+        self.assertEqual(SatelliteData._health_state(), "critical")
+
+        subscription = SatelliteData.subscribe()
+        self.addCleanup(SatelliteData.broadcaster.unsubscribe, subscription)
+        await subscription.get(), await subscription.get()  # The current ones
+        SatelliteData.add_imported(
+            Reading(now - timedelta(seconds=seconds), 300) for seconds in range(6, 10)
+        )
+        self.assertEqual(len(SatelliteData.buffer), 6)
+        SatelliteData.add_imported(
+            [Reading(now, 300), Reading(now - timedelta(1), 300)]
+        )
+        event = await asyncio.wait_for(subscription.get(), 1)  # Only the new latest
+        self.assertEqual(
+            json.loads(event.payload)["last_updated"], now.isoformat() + "Z"
+        )
+        self.assertEqual(len(SatelliteData.buffer), 7)
+
+    async def test_stale_while_revalidate(self):
+        await self.reset_db()
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow(), altitude=213
+        )
+        await SatelliteData.refresh()
+        SatelliteData._last_retrieved -= timedelta(minutes=1)
+
+        release = asyncio.Event()
+
+        async def slow_get(_url):
+            await release.wait()
+            return MockResponse(last_updated=datetime.utcnow(), altitude=150)
+
+        self.mock_upstream.get.side_effect = slow_get
+        with mock.patch.object(SatelliteData, "STALE_WHILE_REVALIDATE", True):
+            health = await asyncio.wait_for(SatelliteData.health(), timeout=1)
+            self.assertEqual(health, "Altitude is A-OK")
+            health = await asyncio.wait_for(SatelliteData.health(), timeout=1)
+            self.assertEqual(self.mock_upstream.get.await_count, 2)
+
+            release.set()
+            await SatelliteData.refresh()
+            health = await SatelliteData.health()
+            self.assertEqual(health, "WARNING: RAPID ORBITAL DECAY IMMINENT")
+
+    async def test_subscribe(self):
+        await self.reset_db()
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow(), altitude=213
+        )
+        await SatelliteData.refresh()
+        subscription = SatelliteData.subscribe()
+        self.addCleanup(SatelliteData.broadcaster.unsubscribe, subscription)
+        self.assertEqual(
+            [(await subscription.get()).name for _ in range(2)], ["reading", "health"]
+        )
+
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow() + timedelta(seconds=10), altitude=150
+        )
+        await SatelliteData.refresh()
+        reading = json.loads((await subscription.get()).payload)
+        self.assertEqual(reading["altitude"], 150)
+        health = json.loads((await subscription.get()).payload)
+        self.assertEqual((health["previous"], health["state"]), ("ok", "critical"))
+
+    async def test_health_transitions_published(self):
+        await self.reset_db()
+        monitor = HealthMonitor(
+            critical_window=timedelta(seconds=0.05),
+            recovery_window=timedelta(seconds=0.1),
+        )
+        with mock.patch.object(SatelliteData, "health_monitor", monitor):
+            subscription = SatelliteData.subscribe()
+            self.addCleanup(SatelliteData.broadcaster.unsubscribe, subscription)
+            now = datetime.utcnow()
+            SatelliteData._ingest(Reading(now - timedelta(seconds=0.03), 150))
+            SatelliteData._ingest(Reading(now, 200))
+            events = [await asyncio.wait_for(subscription.get(), 1) for _ in range(5)]
+            SatelliteData.reset()
+        self.assertEqual(
+            [
+                (data["previous"], data["state"])
+                for data in (json.loads(event.payload) for event in events)
+                if "state" in data
+            ],
+            [(None, "critical"), ("critical", "warning"), ("warning", "missing")],
+        )
+
+    async def test_history(self):
+        await self.reset_db()
+        now = datetime(2022, 7, 27, 4, 49, 37, 681136)
+        async with async_session() as session:
+            async with session.begin():
+                db = SatelliteDB(db_session=session)
+                await db.insert_many(
+                    Reading(now + timedelta(seconds=15 * idx), 200.0 + idx)
+                    for idx in range(2500)
+                )
+
+        chunks = [chunk async for chunk in SatelliteData.history()]
+        lines = "".join(chunks).splitlines()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(len(lines), 2500)
+        self.assertEqual(
+            json.loads(lines[1]),
+            {"last_updated": "2022-07-27T04:49:52.681136Z", "altitude": 201.0},
+        )
+
+        csv = "".join(
+            [
+                chunk
+                async for chunk in SatelliteData.history(
+                    since=now + timedelta(seconds=15),
+                    until="2022-07-27T04:50:22.681136+00:00",
+                    fmt="csv",
+                )
+            ]
+        )
+        self.assertEqual(
+            csv.splitlines(),
+            [
+                "last_updated,altitude",
+                "2022-07-27T04:49:52.681136Z,201.0",
+                "2022-07-27T04:50:07.681136Z,202.0",
+            ],
+        )
+
+    async def test_analytics(self):
+        await self.reset_db()
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow(), altitude=100
+        )
+        since = datetime(2022, 7, 27, 4, 49, 37, 681136)
+        async with async_session() as session:
+            async with session.begin():
+                await SatelliteDB(db_session=session).insert_many(
+                    Reading(since + timedelta(seconds=10 * idx), 200.0 + idx)
+                    for idx in range(101)
+                )
+
+        data = await SatelliteData.analytics(
+            since, since + timedelta(seconds=1000), percentiles=(5, 95), points=2
+        )
+        self.assertEqual(data["count"], 100)  # Up to `until`, excluded
+        self.assertEqual((data["minimum"], data["maximum"]), (200, 299))
+        self.assertAlmostEqual(data["percentiles"]["p95"], 294.05)
+        self.assertEqual(data["rate_of_change"]["average"], 0.1)
+        self.assertEqual([item["minimum"] for item in data["series"]], [200, 250])
+
+        # Loaded once, with the unwritten readings, and kept up to date on ingest
+        self.assertEqual(len(SatelliteData.columns), 102)
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=datetime.utcnow() + timedelta(seconds=10), altitude=90
+        )
+        await SatelliteData.refresh()
+        data = await SatelliteData.analytics(since, datetime.utcnow() + timedelta(1))
+        self.assertEqual((data["count"], data["minimum"]), (103, 90))
+
+        backfill = since - timedelta(days=10)
+        SatelliteData.add_imported(
+            Reading(backfill + timedelta(seconds=idx), 150.0) for idx in range(100)
+        )
+        data = await SatelliteData.analytics(backfill, since)
+        self.assertEqual((data["count"], data["minimum"]), (100, 150))
+
+    async def test_analytics_max_readings(self):
+        await self.reset_db()
+        since = datetime(2022, 7, 27, 4, 49, 37, 681136)
+        async with async_session() as session:
+            async with session.begin():
+                await SatelliteDB(db_session=session).insert_many(
+                    Reading(since + timedelta(seconds=10 * idx), 200.0 + idx)
+                    for idx in range(101)
+                )
+
+        self.mock_upstream.get.return_value = MockResponse(
+            last_updated=since + timedelta(seconds=1000), altitude=300  # Stored
+        )
+        columns = ColumnarHistory(max_readings=80)
+        with mock.patch.object(SatelliteData, "columns", columns):
+            data = await SatelliteData.analytics(since, since + timedelta(days=1))
+        self.assertEqual(len(columns), 80)  # The latest stored, read only
+        self.assertEqual((data["minimum"], data["maximum"]), (221, 300))
+
+    async def test_multiple_satellites(self):
+        await self.reset_db()
+        moon_2 = SatelliteData.for_satellite("moon-2", "https://foo.bar/api/moon-2")
+        self.addCleanup(moon_2.reset)
+        now = datetime.utcnow()
+
+        async def get(url):
+            altitude = 300 if url.endswith("moon-2") else 150
+            return MockResponse(last_updated=now, altitude=altitude)
+
+        self.mock_upstream.get.side_effect = get
+        await SatelliteData.refresh()
+        await moon_2.refresh()
+        await SatelliteData.writer.flush()
+
+        self.assertEqual((await SatelliteData.stats())["average"], 150)
+        self.assertEqual((await moon_2.stats())["average"], 300)
+        self.assertEqual(await moon_2.health(), "Altitude is A-OK")
+        self.assertEqual(
+            await SatelliteData.health(), "WARNING: RAPID ORBITAL DECAY IMMINENT"
+        )
+
+        async with async_session() as session:
+            for satellite_id, altitude in [("default", 150), ("moon-2", 300)]:
+                db = SatelliteDB(db_session=session, satellite_id=satellite_id)
+                records = await db.get_all()
+                self.assertEqual([item.altitude for item in records], [altitude])
+
+    async def test_refresh_slow_feed(self):
+        await self.reset_db()
+        slow = SatelliteData.for_satellite("slow", "https://foo.bar/api/slow")
+        fast = SatelliteData.for_satellite("fast", "https://foo.bar/api/fast")
+        self.addCleanup(slow.reset)
+        self.addCleanup(fast.reset)
+        release = asyncio.Event()
+
+        async def get(url):
+            if url.endswith("slow"):
+                await release.wait()
+            return MockResponse(last_updated=datetime.utcnow(), altitude=213)
+
+        self.mock_upstream.get.side_effect = get
+        pending = asyncio.ensure_future(slow.refresh())
+        await fast.refresh()
+        self.assertEqual(len(fast.buffer), 1)
+        self.assertEqual(len(slow.buffer), 0)
+
+        await fast.refresh()
+        again = asyncio.ensure_future(
+            slow.refresh()
+        )  # The slow feed is not fetched again
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.mock_upstream.get.await_count, 3)
+        release.set()
+        await asyncio.gather(pending, again)
+        self.assertEqual(len(slow.buffer), 1)
+
     def test_d(self):
         naive = datetime(2022, 7, 27, 4, 49, 37, 681136)
         utc = datetime(2022, 7, 27, 4, 49, 37, 681136, tzinfo=timezone.utc)
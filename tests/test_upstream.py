@@ -0,0 +1,84 @@
+"""Tests for upstream.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import asyncio
+import unittest
+
+import httpx
+
+from moon_leasing.upstream import UpstreamClient
+
+URL = "https://foo.bar/api/data"
+
+
+class TestUpstreamClient(unittest.IsolatedAsyncioTestCase):
+    def client(self, responses, retries=2):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            result = responses[min(len(calls), len(responses)) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return httpx.Response(result, json={"altitude": "200"})
+
+        upstream = UpstreamClient(
+            retries=retries, backoff=0, transport=httpx.MockTransport(handler)
+        )
+        self.addAsyncCleanup(upstream.aclose)
+        return upstream, calls
+
+    async def test_get(self):
+        upstream, calls = self.client([200])
+        response = await upstream.get(URL)
+        self.assertEqual(response.json(), {"altitude": "200"})
+        self.assertEqual(len(calls), 1)
+
+    async def test_retries_transient_failures(self):
+        upstream, calls = self.client([httpx.ConnectTimeout("slow"), 503, 200])
+        response = await upstream.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 3)
+
+    async def test_gives_up(self):
+        upstream, calls = self.client([503], retries=1)
+        with self.assertRaises(httpx.HTTPStatusError):
+            await upstream.get(URL)
+        self.assertEqual(len(calls), 2)
+
+        upstream, calls = self.client([httpx.ReadTimeout("slow")], retries=1)
+        with self.assertRaises(httpx.ReadTimeout):
+            await upstream.get(URL)
+        self.assertEqual(len(calls), 2)
+
+    async def test_no_retry_on_client_error(self):
+        upstream, calls = self.client([404, 200])
+        with self.assertRaises(httpx.HTTPStatusError):
+            await upstream.get(URL)
+        self.assertEqual(len(calls), 1)
+
+    async def test_bounded_concurrency(self):
+        running, max_running = 0, 0
+
+        async def handler(_request):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return httpx.Response(200, json={})
+
+        upstream = UpstreamClient(
+            max_connections=3, transport=httpx.MockTransport(handler)
+        )
+        self.addAsyncCleanup(upstream.aclose)
+        await asyncio.gather(*(upstream.get(URL) for _ in range(20)))
+        self.assertEqual(max_running, 3)
+
+    async def test_reuses_client(self):
+        upstream, _calls = self.client([200])
+        self.assertIs(upstream.client, upstream.client)
+
+
+if __name__ == "__main__":
+    unittest.main()
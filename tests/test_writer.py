@@ -0,0 +1,106 @@
+"""Tests for db/writer.py"""
+# pylint: disable=missing-function-docstring,missing-class-docstring,wrong-import-position
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+os.environ.update(  # Setup env before importing moon_leasing
+    dict(
+        TEST_DATABASE_URL="sqlite+aiosqlite:///./temp_test_satellite.db",
+        TEST_SATELLITE_REALTIME_URL="https://foo.bar/api/data",
+        TEST="true",
+    )
+)
+
+from moon_leasing.cache import Reading
+from moon_leasing.db.config import async_session, Base, dispose_engines, engine
+from moon_leasing.db.crud import SatelliteDB
+from moon_leasing.db.writer import WriteBehindQueue
+
+
+class TestWriteBehindQueue(unittest.IsolatedAsyncioTestCase):
+    now = datetime(2022, 7, 27, 4, 49, 37)
+
+    async def asyncSetUp(self):
+        self.addAsyncCleanup(dispose_engines)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    def reading(self, seconds, altitude=200.0):
+        return Reading(self.now + timedelta(seconds=seconds), altitude)
+
+    @staticmethod
+    async def stored():
+        async with async_session() as session:
+            return [
+                (item.last_updated, item.altitude)
+                for item in await SatelliteDB(db_session=session).get_all()
+            ]
+
+    async def test_flushes_on_batch_size(self):
+        writer = WriteBehindQueue(batch_size=3)
+        await writer.put(self.reading(0))
+        await writer.put(self.reading(15))
+        self.assertEqual(await self.stored(), [])
+        await writer.put(self.reading(30))
+        self.assertEqual(len(await self.stored()), 3)
+        self.assertEqual(len(writer), 0)
+
+    async def test_ignores_duplicates(self):
+        async with async_session() as session:
+            async with session.begin():
+                db = SatelliteDB(db_session=session)
+                await db.create_entry(last_updated=self.now, altitude=150)
+
+        writer = WriteBehindQueue(batch_size=10)
+        for seconds in [0, 15, 15, 30, 0]:
+            await writer.put(self.reading(seconds))
+        self.assertEqual(await writer.flush(), 5)
+
+        stored = await self.stored()
+        self.assertEqual(
+            stored,
+            [
+                (self.now + timedelta(seconds=30), 200),
+                (self.now + timedelta(seconds=15), 200),
+                (self.now, 150),
+            ],
+        )
+
+    async def test_flushes_on_stop(self):
+        writer = WriteBehindQueue(batch_size=10, flush_interval=60)
+        writer.start()
+        await writer.put(self.reading(0))
+        await writer.stop()
+        self.assertEqual(len(await self.stored()), 1)
+
+    async def test_keeps_batch_on_error(self):
+        writer = WriteBehindQueue(batch_size=10)
+        await writer.put(self.reading(0))
+        await writer.put(Reading(self.now + timedelta(seconds=15), None))
+        with self.assertRaises(Exception):
+            await writer.flush()
+        self.assertEqual(len(writer), 2)
+
+    async def test_db_down(self):
+        writer = WriteBehindQueue(batch_size=3, max_pending=5)
+        with mock.patch(
+            "moon_leasing.db.writer.async_session", side_effect=OSError("DB down")
+        ) as session:
+            for seconds in range(8):
+                await writer.put(self.reading(seconds))  # Doesn't raise
+            self.assertTrue(writer.failing)
+            self.assertEqual(session.call_count, 1)  # Left to the periodic flush
+        self.assertEqual(len(writer), 5)  # The oldest dropped
+
+        self.assertEqual(await writer.flush(), 5)
+        self.assertFalse(writer.failing)
+        stored = await self.stored()
+        self.assertEqual(stored[-1][0], self.reading(3).last_updated)
+
+
+if __name__ == "__main__":
+    unittest.main()